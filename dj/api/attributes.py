@@ -3,9 +3,12 @@ Attributes related APIs.
 """
 
 import logging
-from typing import List
+import threading
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, Depends
+from sqlalchemy import func
+from sqlalchemy.orm import make_transient_to_detached
 from sqlmodel import Session, select
 
 from dj.errors import DJAlreadyExistsException, DJException
@@ -26,7 +29,7 @@ def list_attributes(*, session: Session = Depends(get_session)) -> List[Attribut
     """
     List all available attribute types.
     """
-    return session.exec(select(AttributeType)).all()
+    return attribute_type_registry.all(session)
 
 
 @router.post("/attributes/", response_model=AttributeType, status_code=201)
@@ -50,15 +53,15 @@ def add_an_attribute_type(
     session.add(attribute_type)
     session.commit()
     session.refresh(attribute_type)
+    attribute_type_registry.invalidate()
     return attribute_type
 
 
-def default_attribute_types(session: Session = Depends(get_session)):
+def get_default_attribute_types() -> List[AttributeType]:
     """
-    Loads all the column attribute types that are supported by the system
-    by default into the database.
+    The column attribute types that are supported by the system by default.
     """
-    defaults = [
+    return [
         AttributeType(
             namespace=RESERVED_ATTRIBUTE_NAMESPACE,
             name="primary_key",
@@ -105,6 +108,14 @@ def default_attribute_types(session: Session = Depends(get_session)):
             allowed_node_types=[NodeType.SOURCE, NodeType.TRANSFORM],
         ),
     ]
+
+
+def default_attribute_types(session: Session):
+    """
+    Loads all the column attribute types that are supported by the system
+    by default into the database.
+    """
+    defaults = get_default_attribute_types()
     default_attribute_type_names = {type_.name: type_ for type_ in defaults}
 
     # Update existing default attribute types
@@ -129,3 +140,131 @@ def default_attribute_types(session: Session = Depends(get_session)):
     for name in new_types:
         session.add(default_attribute_type_names[name])
     session.commit()
+
+
+class AttributeTypeRegistry:
+    """
+    In-process registry of attribute types, keyed by namespace and name.
+
+    The registry is loaded once per metadata database and reloaded whenever it is
+    invalidated, i.e., when this process adds an attribute type. Attribute types
+    are only ever added, so the number of types and their largest id stamp the
+    version of the table: lookups that miss and listings compare the stamp of the
+    loaded types with the database, to pick up types added by other processes.
+    Missing default attribute types are seeded into the database on load.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types: Dict[Tuple[str, str], AttributeType] = {}
+        self._stamp: Tuple[int, Optional[int]] = (0, None)
+        self._bind = None
+        self._version = 0
+        self._loaded_version = -1
+
+    def invalidate(self) -> None:
+        """
+        Bump the version stamp so that the registry is reloaded on next use.
+        """
+        with self._lock:
+            self._version += 1
+
+    @staticmethod
+    def _database_stamp(session: Session) -> Tuple[int, Optional[int]]:
+        """
+        The version stamp of the attribute types in the database.
+        """
+        count, max_id = session.exec(
+            select(  # type: ignore
+                func.count(AttributeType.id),
+                func.max(AttributeType.id),
+            ),
+        ).one()
+        return count, max_id
+
+    def _refresh(self, session: Session) -> None:
+        """
+        Reload the registry if it is stale, or if types were added to the database.
+        """
+        self._load(session)
+        if self._database_stamp(session) != self._stamp:
+            self._load(session, force=True)
+
+    def _load(self, session: Session, force: bool = False) -> None:
+        """
+        (Re)load the registry from the database if it is stale, or if forced to.
+        """
+        bind = session.get_bind()
+        with self._lock:
+            if (
+                not force
+                and bind is self._bind
+                and self._loaded_version == self._version
+            ):
+                return
+            version = self._version
+
+        attribute_types = session.exec(select(AttributeType)).all()
+        existing_names = {
+            type_.name
+            for type_ in attribute_types
+            if type_.namespace == RESERVED_ATTRIBUTE_NAMESPACE
+        }
+        if any(
+            type_.name not in existing_names for type_ in get_default_attribute_types()
+        ):
+            # Seed the defaults in a session of their own, so that the caller's
+            # session is never committed
+            with Session(bind, autoflush=False) as seed_session:
+                default_attribute_types(seed_session)
+            attribute_types = session.exec(select(AttributeType)).all()
+
+        types = {}
+        for type_ in attribute_types:
+            # Keep detached copies so that they can be merged into any session
+            detached = AttributeType(**type_.dict())
+            make_transient_to_detached(detached)
+            types[(type_.namespace, type_.name)] = detached
+        stamp = (
+            len(attribute_types),
+            max((type_.id for type_ in attribute_types), default=None),
+        )
+
+        with self._lock:
+            if bind is self._bind and self._loaded_version > version:
+                return  # a concurrent load has read a newer version
+            self._types = types
+            self._stamp = stamp
+            self._bind = bind
+            self._loaded_version = version
+
+    def get(
+        self,
+        session: Session,
+        name: str,
+        namespace: Optional[str] = RESERVED_ATTRIBUTE_NAMESPACE,
+    ) -> Optional[AttributeType]:
+        """
+        Gets an attribute type by name, attached to the given session.
+        """
+        self._load(session)
+        key = (namespace, name)
+        if key not in self._types:
+            self._refresh(session)
+        attribute_type = self._types.get(key)  # type: ignore
+        if attribute_type is None:
+            return None
+        return session.merge(attribute_type, load=False)
+
+    def all(self, session: Session) -> List[AttributeType]:
+        """
+        All attribute types, attached to the given session.
+        """
+        self._refresh(session)
+        return [
+            session.merge(attribute_type, load=False)
+            for attribute_type in self._types.values()
+        ]
+
+
+attribute_type_registry = AttributeTypeRegistry()
@@ -9,13 +9,19 @@ from fastapi import APIRouter, Depends, Query
 from fastapi.responses import JSONResponse
 from sqlmodel import Session
 
-from dj.api.helpers import get_engine, get_node_by_name, get_query, validate_cube
-from dj.construction.build import build_metric_nodes
+from dj.api.helpers import (
+    get_engine,
+    get_metrics_sql,
+    get_node_by_name,
+    get_node_sql,
+    validate_cube,
+)
+from dj.construction.cache import BuildCache, get_build_cache
 from dj.errors import DJException, DJInvalidInputException
-from dj.models.metric import TranslatedSQL
 from dj.models.node import AvailabilityState, AvailabilityStateBase, NodeType
-from dj.models.query import ColumnMetadata, QueryCreate, QueryWithResults
+from dj.models.query import QueryCreate, QueryWithResults
 from dj.service_clients import QueryServiceClient
+from dj.sql.parsing.codegen import SQLLayout
 from dj.utils import get_query_service_client, get_session
 
 _logger = logging.getLogger(__name__)
@@ -99,8 +105,10 @@ def get_data(  # pylint: disable=too-many-locals
     async_: bool = False,
     session: Session = Depends(get_session),
     query_service_client: QueryServiceClient = Depends(get_query_service_client),
+    build_cache: BuildCache = Depends(get_build_cache),
     engine_name: Optional[str] = None,
     engine_version: Optional[str] = None,
+    layout: SQLLayout = SQLLayout.DEFAULT,
 ) -> QueryWithResults:
     """
     Gets data for a node
@@ -119,20 +127,14 @@ def get_data(  # pylint: disable=too-many-locals
             f"Available engines include: {', '.join(engine.name for engine in available_engines)}",
         )
 
-    query_ast = get_query(
+    query = get_node_sql(
         session=session,
         node_name=node_name,
         dimensions=dimensions,
         filters=filters,
         engine=engine,
-    )
-    columns = [
-        ColumnMetadata(name=col.alias_or_name.name, type=str(col.type))  # type: ignore
-        for col in query_ast.select.projection
-    ]
-    query = TranslatedSQL(
-        sql=str(query_ast),
-        columns=columns,
+        build_cache=build_cache,
+        layout=layout,
     )
 
     query_create = QueryCreate(
@@ -145,7 +147,7 @@ def get_data(  # pylint: disable=too-many-locals
     result = query_service_client.submit_query(query_create)
     # Inject column info if there are results
     if result.results.__root__:  # pragma: no cover
-        result.results.__root__[0].columns = columns
+        result.results.__root__[0].columns = query.columns
     return result
 
 
@@ -158,8 +160,10 @@ def get_data_for_metrics(  # pylint: disable=R0914
     *,
     session: Session = Depends(get_session),
     query_service_client: QueryServiceClient = Depends(get_query_service_client),
+    build_cache: BuildCache = Depends(get_build_cache),
     engine_name: Optional[str] = None,
     engine_version: Optional[str] = None,
+    layout: SQLLayout = SQLLayout.DEFAULT,
 ) -> QueryWithResults:
     """
     Return data for a set of metrics with dimensions and filters
@@ -182,20 +186,14 @@ def get_data_for_metrics(  # pylint: disable=R0914
         metrics,
         dimensions,
     )
-    query_ast = build_metric_nodes(
-        session,
-        metric_nodes,
-        filters=filters or [],
+    query = get_metrics_sql(
+        session=session,
+        metric_nodes=metric_nodes,
         dimensions=dimensions or [],
-    )
-    columns = [
-        ColumnMetadata(name=col.alias_or_name.name, type=str(col.type))  # type: ignore
-        for col in query_ast.select.projection
-    ]
-    query = TranslatedSQL(
-        sql=str(query_ast),
-        columns=columns,
-        dialect=engine.dialect if engine else None,
+        filters=filters or [],
+        engine=engine,
+        build_cache=build_cache,
+        layout=layout,
     )
 
     query_create = QueryCreate(
@@ -208,5 +206,5 @@ def get_data_for_metrics(  # pylint: disable=R0914
     result = query_service_client.submit_query(query_create)
     # Inject column info if there are results
     if result.results.__root__:  # pragma: no cover
-        result.results.__root__[0].columns = columns
+        result.results.__root__[0].columns = query.columns
     return result
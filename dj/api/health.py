@@ -3,13 +3,14 @@ Application healthchecks.
 """
 
 import enum
-from typing import List
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends
 from sqlalchemy import select
 from sqlmodel import Session, SQLModel
 
-from dj.utils import get_session
+from dj.sql.parsing.backends.antlr4 import parse_cache
+from dj.utils import get_pool_statistics, get_session
 
 router = APIRouter()
 
@@ -32,6 +33,37 @@ class HealthCheck(SQLModel):
     status: HealthcheckStatus
 
 
+class PoolStatus(SQLModel):
+    """
+    Connection pool statistics for the metadata database.
+    """
+
+    pool: str
+    connects: int
+    checkouts: int
+    checkins: int
+    wait_time: float
+    max_wait_time: float
+    size: Optional[int] = None
+    checked_in: Optional[int] = None
+    checked_out: Optional[int] = None
+    overflow: Optional[int] = None
+
+
+class ParseCacheStatus(SQLModel):
+    """
+    Statistics for the cache of parsed queries.
+    """
+
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size: int
+    max_entries: int
+    max_size: int
+
+
 async def database_health(session: Session) -> HealthcheckStatus:
     """
     The status of the database.
@@ -57,3 +89,19 @@ async def health_check(session: Session = Depends(get_session)) -> List[HealthCh
             status=await database_health(session),
         ),
     ]
+
+
+@router.get("/health/pool/", response_model=PoolStatus)
+def pool_status() -> PoolStatus:
+    """
+    Checkout and wait statistics for the metadata database connection pool.
+    """
+    return PoolStatus(**get_pool_statistics())
+
+
+@router.get("/health/parse-cache/", response_model=ParseCacheStatus)
+def parse_cache_status() -> ParseCacheStatus:
+    """
+    Hit, miss and eviction counters for the cache of parsed queries.
+    """
+    return ParseCacheStatus(**parse_cache.info())
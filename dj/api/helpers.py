@@ -7,16 +7,20 @@ from http import HTTPStatus
 from typing import Dict, List, Optional, Tuple, Union
 
 from fastapi import HTTPException
+from sqlalchemy import func, or_
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.orm import joinedload
 from sqlmodel import Session, select
 
-from dj.construction.build import build_node
+from dj.api.attributes import attribute_type_registry
+from dj.construction.build import build_metric_nodes, build_node
+from dj.construction.cache import BuildCache
 from dj.construction.dj_query import build_dj_metric_query
 from dj.errors import DJError, DJException, DJInvalidInputException, ErrorCode
 from dj.models import AttributeType, Catalog, Column, Engine
 from dj.models.attribute import RESERVED_ATTRIBUTE_NAMESPACE
 from dj.models.engine import Dialect
+from dj.models.metric import TranslatedSQL
 from dj.models.node import (
     BuildCriteria,
     MissingParent,
@@ -30,9 +34,16 @@ from dj.models.node import (
     NodeStatus,
     NodeType,
 )
+from dj.models.query import ColumnMetadata
 from dj.sql.parsing import ast
-from dj.sql.parsing.backends.antlr4 import SqlSyntaxError, parse
+from dj.sql.parsing.backends.antlr4 import (
+    PARSER_VERSION,
+    SqlSyntaxError,
+    dump_query_ast,
+    parse_many,
+)
 from dj.sql.parsing.backends.exceptions import DJParseException
+from dj.sql.parsing.codegen import SQLLayout, render
 
 
 def get_node_namespace(  # pylint: disable=too-many-arguments
@@ -122,12 +133,7 @@ def get_attribute_type(
     """
     Gets an attribute type by name.
     """
-    statement = (
-        select(AttributeType)
-        .where(AttributeType.name == name)
-        .where(AttributeType.namespace == namespace)
-    )
-    return session.exec(statement).one_or_none()
+    return attribute_type_registry.get(session, name, namespace)
 
 
 def get_catalog(session: Session, name: str) -> Catalog:
@@ -184,6 +190,91 @@ def get_query(  # pylint: disable=too-many-arguments
     return query_ast
 
 
+def translate_query(
+    query_ast: ast.Query,
+    dialect: Optional[Dialect],
+    layout: SQLLayout = SQLLayout.DEFAULT,
+) -> TranslatedSQL:
+    """
+    Render a built query in a dialect, along with the names and types of its columns
+    """
+    columns = [
+        ColumnMetadata(name=col.alias_or_name.name, type=str(col.type))  # type: ignore
+        for col in query_ast.select.projection
+    ]
+    return TranslatedSQL(
+        sql=render(query_ast, dialect=dialect, layout=layout),
+        columns=columns,
+        dialect=dialect,
+    )
+
+
+def get_node_sql(  # pylint: disable=too-many-arguments
+    session: Session,
+    node_name: str,
+    dimensions: List[str],
+    filters: List[str],
+    engine: Optional[Engine],
+    build_cache: BuildCache,
+    layout: SQLLayout = SQLLayout.DEFAULT,
+) -> TranslatedSQL:
+    """
+    Get the SQL for a node, dimensions, and filters from the build cache, or build it
+    """
+    node = get_node_by_name(session=session, name=node_name)
+    dialect = engine.dialect if engine else None
+    return build_cache.get_or_build(
+        build_cache.key(
+            session,
+            [node.current],
+            filters,
+            dimensions,
+            extra=(dialect, layout),
+        ),
+        lambda: translate_query(
+            get_query(session, node_name, dimensions, filters, engine),
+            dialect,
+            layout,
+        ),
+    )
+
+
+def get_metrics_sql(  # pylint: disable=too-many-arguments
+    session: Session,
+    metric_nodes: List[Node],
+    dimensions: List[str],
+    filters: List[str],
+    engine: Optional[Engine],
+    build_cache: BuildCache,
+    layout: SQLLayout = SQLLayout.DEFAULT,
+) -> TranslatedSQL:
+    """
+    Get the SQL for a set of metrics, dimensions, and filters from the build cache,
+    or build it
+    """
+    dialect = engine.dialect if engine else None
+    revisions = [node.current for node in metric_nodes]
+    return build_cache.get_or_build(
+        build_cache.key(
+            session,
+            revisions,
+            filters,
+            dimensions,
+            extra=(dialect, layout),
+        ),
+        lambda: translate_query(
+            build_metric_nodes(
+                session,
+                metric_nodes,
+                filters=filters,
+                dimensions=dimensions,
+            ),
+            dialect,
+            layout,
+        ),
+    )
+
+
 def get_dj_query(
     session: Session,
     query: str,
@@ -199,6 +290,44 @@ def get_dj_query(
     return query_ast
 
 
+def store_query_asts(session: Session, secret: str, batch_size: int = 100) -> int:
+    """
+    Store the parsed queries of node revisions whose stored AST is missing or was
+    built by another version of the parser, signed with the secret. Reading a
+    revision never writes its AST, so this is what replaces the stale ASTs after the
+    parser changes. Returns the number of revisions whose AST was stored.
+    """
+    statement = select(NodeRevision.id).where(
+        NodeRevision.query.isnot(None),  # type: ignore  # pylint: disable=no-member
+        or_(
+            NodeRevision.query_ast.is_(None),  # type: ignore  # pylint: disable=no-member
+            func.substr(NodeRevision.query_ast, 1, len(PARSER_VERSION))
+            != PARSER_VERSION,
+        ),
+    )
+    revision_ids = session.exec(statement).all()
+    stored = 0
+    for start in range(0, len(revision_ids), batch_size):
+        revisions = session.exec(
+            select(NodeRevision).where(
+                NodeRevision.id.in_(  # type: ignore  # pylint: disable=no-member
+                    revision_ids[start : start + batch_size],
+                ),
+            ),
+        ).unique()
+        for revision in revisions:
+            try:
+                query = revision.parsed_query()
+            except Exception:  # pylint: disable=broad-except
+                # draft nodes may have queries that don't parse
+                continue
+            revision.query_ast = dump_query_ast(query, revision.query, secret)
+            session.add(revision)
+            stored += 1
+        session.commit()
+    return stored
+
+
 def get_engine(session: Session, name: str, version: str) -> Engine:
     """
     Return an Engine instance given an engine name and version
@@ -290,6 +419,7 @@ def get_upstream_nodes(
 def validate_node_data(
     data: Union[NodeRevisionBase, NodeRevision],
     session: Session,
+    query_ast: Optional[ast.Query] = None,
 ) -> Tuple[
     NodeRevision,
     Dict[NodeRevision, List[ast.Table]],
@@ -297,7 +427,8 @@ def validate_node_data(
     List[str],
 ]:
     """
-    Validate a node.
+    Validate a node. The parsed query of the node can be passed in if it was
+    already parsed, otherwise it is parsed here.
     """
 
     if isinstance(data, NodeRevision):
@@ -310,7 +441,8 @@ def validate_node_data(
 
     # Try to parse the node's query and extract dependencies
     try:
-        query_ast = parse(validated_node.query)  # type: ignore
+        if query_ast is None:
+            query_ast = validated_node.parsed_query()
         exc = DJException()
         ctx = ast.CompileContext(session=session, exception=exc)
         dependencies_map, missing_parents_map = query_ast.extract_dependencies(ctx)
@@ -452,14 +584,24 @@ def propagate_valid_status(
                 session=session,
                 node_name=node_revision.name,
             )
+            # Parse all the downstream queries up front, in parallel for large
+            # batches. Queries that fail to parse are parsed again when validated,
+            # so that the error is raised the same way as for a single node.
+            parsed_queries = parse_many(node.current.query for node in downstream_nodes)
             newly_valid_nodes = []
-            for node in downstream_nodes:
+            for node, parsed_query in zip(downstream_nodes, parsed_queries):
                 (
                     validated_node,
                     _,
                     missing_parents_map,
                     type_inference_failed_columns,
-                ) = validate_node_data(data=node.current, session=session)
+                ) = validate_node_data(
+                    data=node.current,
+                    session=session,
+                    query_ast=parsed_query
+                    if isinstance(parsed_query, ast.Query)
+                    else None,
+                )
                 if not missing_parents_map and not type_inference_failed_columns:
                     node.current.columns = validated_node.columns or []
                     node.current.status = NodeStatus.VALID
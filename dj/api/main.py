@@ -8,11 +8,14 @@ Main DJ server app.
 # pylint: disable=unused-import
 
 import logging
+import threading
 from typing import TYPE_CHECKING, Optional
 
-from fastapi import Depends, FastAPI, Request
+from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session
 from starlette.middleware.cors import CORSMiddleware
 
 from dj import __version__
@@ -31,13 +34,16 @@ from dj.api import (
     tags,
 )
 from dj.api.attributes import default_attribute_types
+from dj.api.helpers import store_query_asts
 from dj.errors import DJException
 from dj.models.catalog import Catalog
 from dj.models.column import Column
 from dj.models.engine import Engine
 from dj.models.node import NodeRevision
 from dj.models.table import Table
-from dj.utils import get_settings
+from dj.sql.parsing.ast import count_type_inferences
+from dj.sql.parsing.backends.antlr4 import shutdown_parse_executor
+from dj.utils import get_engine, get_settings
 
 if TYPE_CHECKING:  # pragma: no cover
     from opentelemetry import trace
@@ -60,7 +66,6 @@ def get_dj_app(
             "name": "MIT License",
             "url": "https://mit-license.org/",
         },
-        dependencies=[Depends(default_attribute_types)],
     )
     application.add_middleware(
         CORSMiddleware,
@@ -83,6 +88,60 @@ def get_dj_app(
     application.include_router(attributes.router)
     application.include_router(sql.router)
 
+    @application.on_event("startup")
+    def seed_default_attribute_types() -> None:
+        """
+        Load the default attribute types into the database once per process.
+        """
+        try:
+            with Session(get_engine(), autoflush=False) as session:
+                default_attribute_types(session)
+        except SQLAlchemyError:
+            _logger.warning(
+                "Could not seed default attribute types, they will be "
+                "loaded on first use instead",
+                exc_info=True,
+            )
+
+    @application.on_event("startup")
+    def refresh_stored_query_asts() -> None:
+        """
+        Replace the stored query ASTs of node revisions that an earlier version of
+        the parser built, in a background thread so that startup isn't held up.
+        """
+        secret = get_settings().secret
+        if not secret:
+            return
+
+        def store() -> None:
+            try:
+                with Session(get_engine(), autoflush=False) as session:
+                    stored = store_query_asts(session, secret)
+            except SQLAlchemyError:
+                _logger.warning("Could not store query ASTs", exc_info=True)
+            else:
+                _logger.info("Stored the query ASTs of %d node revisions", stored)
+
+        threading.Thread(target=store, name="store-query-asts", daemon=True).start()
+
+    @application.on_event("shutdown")
+    def stop_parse_workers() -> None:
+        """
+        Stop the worker processes that parse batches of node queries, which are
+        started on first use and shared by all requests.
+        """
+        shutdown_parse_executor()
+
+    @application.middleware("http")
+    async def add_type_inferences_header(request: Request, call_next):
+        """
+        Report the number of types inferred for SQL expressions by the request.
+        """
+        with count_type_inferences() as inferences:
+            response = await call_next(request)
+        response.headers["X-DJ-Type-Inferences"] = str(inferences.count)
+        return response
+
     @application.exception_handler(DJException)
     async def dj_exception_handler(  # pylint: disable=unused-argument
         request: Request,
@@ -2,6 +2,7 @@
 """
 Node related APIs.
 """
+import heapq
 import logging
 import os
 from collections import defaultdict
@@ -10,6 +11,7 @@ from typing import Dict, List, Optional, Set, Union
 
 from fastapi import APIRouter, Depends
 from fastapi.responses import JSONResponse
+from sqlalchemy import and_, func
 from sqlalchemy.orm import joinedload
 from sqlmodel import Session, select
 from starlette.requests import Request
@@ -34,7 +36,7 @@ from dj.api.tags import get_tag_by_name
 from dj.construction.build import build_metric_nodes
 from dj.errors import DJDoesNotExistException, DJException, DJInvalidInputException
 from dj.models import ColumnAttribute
-from dj.models.attribute import AttributeType, UniquenessScope
+from dj.models.attribute import UniquenessScope
 from dj.models.base import generate_display_name
 from dj.models.column import Column, ColumnAttributeInput
 from dj.models.cube import Measure
@@ -56,13 +58,21 @@ from dj.models.node import (
     NodeStatus,
     NodeType,
     NodeValidation,
+    QueryFingerprint,
+    SimilarNode,
     UpdateNode,
     UpsertMaterializationConfig,
 )
 from dj.service_clients import QueryServiceClient
 from dj.sql.parsing import ast
-from dj.sql.parsing.backends.antlr4 import parse
 from dj.sql.parsing.backends.exceptions import DJParseException
+from dj.sql.similarity import (
+    CANDIDATES_PER_RESULT,
+    estimate_similarity,
+    fingerprint_key,
+    query_signature,
+    unpack_signature,
+)
 from dj.utils import (
     Version,
     VersionUpgrade,
@@ -293,7 +303,7 @@ def cube_materialization_config(cube_node: NodeRevision, config: Dict):
     The query directly on the cube node is meant for direct querying of the cube
     without materialization to an OLAP database.
     """
-    combined_ast = parse(cube_node.query)
+    combined_ast = cube_node.parsed_query()
     dimensions_set = {
         dim.name for dim in cube_node.columns if dim.has_dimension_attribute()
     }
@@ -570,9 +580,7 @@ def create_cube_node_revision(  # pylint: disable=too-many-locals
         filters=data.filters or [],
         dimensions=data.dimensions or [],
     )
-    dimension_attribute = session.exec(
-        select(AttributeType).where(AttributeType.name == "dimension"),
-    ).one()
+    dimension_attribute = get_attribute_type(session, "dimension")
     dimensions_set = {dim.rsplit(".", 1)[1] for dim in data.dimensions}
 
     node_columns = []
@@ -1068,12 +1076,76 @@ def calculate_node_similarity(
             message="Cannot determine similarity of source nodes",
             http_status_code=HTTPStatus.CONFLICT,
         )
-    node1_ast = parse(node1.current.query)  # type: ignore
-    node2_ast = parse(node2.current.query)  # type: ignore
+    node1_ast = node1.current.parsed_query()
+    node2_ast = node2.current.parsed_query()
     similarity = node1_ast.similarity_score(node2_ast)
     return JSONResponse(status_code=200, content={"similarity": similarity})
 
 
+@router.get("/nodes/{name}/similar/", response_model=List[SimilarNode])
+def list_similar_nodes(
+    name: str, *, limit: int = 10, session: Session = Depends(get_session)
+) -> List[SimilarNode]:
+    """
+    List the transforms and metrics whose queries are most similar to the query of
+    the given node, most similar first. The similarity is estimated from the query
+    signatures stored on the current revisions.
+    """
+    node = get_node_by_name(session=session, name=name)
+    if node.type == NodeType.SOURCE:
+        raise DJException(
+            message="Cannot determine similarity of source nodes",
+            http_status_code=HTTPStatus.CONFLICT,
+        )
+    signature = unpack_signature(
+        node.current.query_signature or query_signature(node.current.parsed_query()),
+    )
+    # only revisions sharing fingerprints with the query can have a similarity above
+    # zero, and those sharing the most are the likeliest to be the most similar
+    candidates = session.exec(
+        select(Node.name, Node.type, NodeRevision.query_signature)
+        .join(
+            NodeRevision,
+            and_(
+                NodeRevision.node_id == Node.id,
+                NodeRevision.version == Node.current_version,
+            ),
+        )
+        .join(
+            QueryFingerprint,
+            QueryFingerprint.node_revision_id == NodeRevision.id,
+        )
+        .where(
+            QueryFingerprint.fingerprint.in_(  # type: ignore  # pylint: disable=no-member
+                [fingerprint_key(fingerprint) for fingerprint in signature],
+            ),
+            Node.type.in_(  # type: ignore  # pylint: disable=no-member
+                [NodeType.TRANSFORM, NodeType.METRIC],
+            ),
+            Node.id != node.id,
+        )
+        .group_by(Node.id, NodeRevision.id)
+        .order_by(func.count().desc(), Node.name)
+        .limit(limit * CANDIDATES_PER_RESULT),
+    ).all()
+    scores = (
+        (
+            estimate_similarity(signature, unpack_signature(candidate_signature)),
+            candidate_name,
+            candidate_type,
+        )
+        for candidate_name, candidate_type, candidate_signature in candidates
+    )
+    return [
+        SimilarNode(name=candidate_name, type=candidate_type, similarity=similarity)
+        for similarity, candidate_name, candidate_type in heapq.nlargest(
+            limit,
+            scores,
+            key=lambda score: score[0],
+        )
+    ]
+
+
 @router.get("/nodes/{name}/downstream/", response_model=List[NodeOutput])
 def list_downstream_nodes(
     name: str, *, node_type: NodeType = None, session: Session = Depends(get_session)
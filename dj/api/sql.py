@@ -8,10 +8,10 @@ from typing import List, Optional
 from fastapi import APIRouter, Depends, Query
 from sqlmodel import Session
 
-from dj.api.helpers import get_engine, get_query, validate_cube
-from dj.construction.build import build_metric_nodes
+from dj.api.helpers import get_engine, get_metrics_sql, get_node_sql, validate_cube
+from dj.construction.cache import BuildCache, get_build_cache
 from dj.models.metric import TranslatedSQL
-from dj.models.query import ColumnMetadata
+from dj.sql.parsing.codegen import SQLLayout
 from dj.utils import get_session
 
 _logger = logging.getLogger(__name__)
@@ -25,8 +25,10 @@ def get_sql(
     filters: List[str] = Query([]),
     *,
     session: Session = Depends(get_session),
+    build_cache: BuildCache = Depends(get_build_cache),
     engine_name: Optional[str] = None,
     engine_version: Optional[str] = None,
+    layout: SQLLayout = SQLLayout.DEFAULT,
 ) -> TranslatedSQL:
     """
     Return SQL for a node.
@@ -36,21 +38,14 @@ def get_sql(
         if engine_name
         else None
     )
-    query_ast = get_query(
+    return get_node_sql(
         session=session,
         node_name=node_name,
         dimensions=dimensions,
         filters=filters,
         engine=engine,
-    )
-    columns = [
-        ColumnMetadata(name=col.alias_or_name.name, type=str(col.type))  # type: ignore
-        for col in query_ast.select.projection
-    ]
-    return TranslatedSQL(
-        sql=str(query_ast),
-        columns=columns,
-        dialect=engine.dialect if engine else None,
+        build_cache=build_cache,
+        layout=layout,
     )
 
 
@@ -61,8 +56,10 @@ def get_sql_for_metrics(
     filters: List[str] = Query([]),
     *,
     session: Session = Depends(get_session),
+    build_cache: BuildCache = Depends(get_build_cache),
     engine_name: Optional[str] = None,
     engine_version: Optional[str] = None,
+    layout: SQLLayout = SQLLayout.DEFAULT,
 ) -> TranslatedSQL:
     """
     Return SQL for a set of metrics with dimensions and filters
@@ -77,18 +74,12 @@ def get_sql_for_metrics(
         metrics,
         dimensions,
     )
-    query_ast = build_metric_nodes(
-        session,
-        metric_nodes,
-        filters=filters or [],
+    return get_metrics_sql(
+        session=session,
+        metric_nodes=metric_nodes,
         dimensions=dimensions or [],
-    )
-    columns = [
-        ColumnMetadata(name=col.alias_or_name.name, type=str(col.type))  # type: ignore
-        for col in query_ast.select.projection
-    ]
-    return TranslatedSQL(
-        sql=str(query_ast),
-        columns=columns,
-        dialect=engine.dialect if engine else None,
+        filters=filters or [],
+        engine=engine,
+        build_cache=build_cache,
+        layout=layout,
     )
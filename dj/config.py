@@ -30,6 +30,23 @@ class Settings(
     # SQLAlchemy URI for the metadata database.
     index: str = "sqlite:///dj.db?check_same_thread=False"
 
+    # Connection pool for the metadata database. A single engine is created per process
+    # and shared across requests. The pool size and overflow are ignored for SQLite,
+    # which manages its own connections, and the statement timeout is only applied
+    # to PostgreSQL.
+    index_pool_size: int = 20
+    index_max_overflow: int = 10
+    index_pool_timeout: timedelta = timedelta(seconds=30)
+    index_pool_pre_ping: bool = True
+    index_pool_recycle: Optional[timedelta] = timedelta(minutes=30)
+    index_statement_timeout: Optional[timedelta] = None
+
+    # Key for signing data that the server stores and loads again, like the parsed
+    # query ASTs of node revisions, which are pickled. Stored ASTs are only loaded if
+    # their signature matches, and aren't stored at all if this isn't set. It should be
+    # the same for all servers sharing a metadata database.
+    secret: Optional[str] = None
+
     # Directory where the repository lives. This should have 2 subdirectories, "nodes" and
     # "databases".
     repository: Path = Path(".")
@@ -41,6 +58,12 @@ class Settings(
     redis_cache: Optional[str] = None
     paginating_timeout: timedelta = timedelta(minutes=5)
 
+    # Cache for the SQL built for nodes and metrics. It's stored in the Redis cache if
+    # one is configured, where entries expire after the timeout, and in an in-process
+    # LRU cache of up to `build_cache_size` entries otherwise.
+    build_cache_size: int = 1024
+    build_cache_timeout: timedelta = timedelta(hours=12)
+
     # Configure Celery for async requests. If not configured async queries will be
     # executed using FastAPI's ``BackgroundTasks``.
     celery_broker: Optional[str] = None
@@ -98,12 +98,14 @@ def _get_or_build_join_table(
         _get_node_table(table_node, build_criteria),
     )
     if not join_table:  # pragma: no cover
-        join_query = parse(cast(str, table_node.query))
+        join_query = table_node.parsed_query()
         join_table = build_ast(session, join_query)  # type: ignore
         join_table.parenthesized = True  # type: ignore
 
     for col in join_table.columns:
-        col._table = join_table  # pylint: disable=protected-access
+        # aliased expressions in the projection don't reference a table
+        if isinstance(col, (ast.Column, ast.Wildcard)):
+            col._table = join_table  # pylint: disable=protected-access
 
     join_table = cast(ast.TableExpression, join_table)  # type: ignore
     right_alias = ast.Name(table_node_alias)
@@ -256,10 +258,9 @@ def join_tables_for_dimensions(
                     build_criteria,
                     required_dimension_columns,
                 )
-                if join_asts and select.from_:
-                    select.from_.relations[-1].extensions.extend(  # pragma: no cover
-                        join_asts,
-                    )
+                if join_asts and select.from_:  # pragma: no cover
+                    relation = select.from_.relations[-1]
+                    relation.extensions = [*relation.extensions, *join_asts]
 
 
 def _build_tables_on_select(
@@ -271,13 +272,14 @@ def _build_tables_on_select(
     """
     Add all nodes not agg or filter dimensions to the select
     """
+    replacements = []
     for node, tbls in tables.items():
         node_table = cast(
             Optional[ast.Table],
             _get_node_table(node, build_criteria),
         )  # got a materialization
         if node_table is None:  # no materialization - recurse to node first
-            node_query = parse(cast(str, node.query))
+            node_query = node.parsed_query()
             node_table = build_ast(  # type: ignore
                 session,
                 node_query,
@@ -289,7 +291,7 @@ def _build_tables_on_select(
         context = CompileContext(session=session, exception=DJException())
 
         node_ast = ast.Alias(ast.Name(alias), child=node_table, as_=True)  # type: ignore
-        for tbl in tbls:
+        for i, tbl in enumerate(tbls, 1):
             if isinstance(node_ast.child, ast.Select) and isinstance(tbl, ast.Alias):
                 node_ast.child.projection = [
                     col
@@ -297,7 +299,9 @@ def _build_tables_on_select(
                     if col in set(tbl.child.select.projection)
                 ]
             node_ast.compile(context)
-            select.replace(tbl, node_ast)
+            # only the last reference can use the node's AST without copying it
+            replacements.append((tbl, node_ast if i == len(tbls) else node_ast.copy()))
+    select.replace_all(replacements, copy=False)
 
 
 def dimension_columns_mapping(
@@ -420,6 +424,19 @@ def _get_node_table(
     return table
 
 
+def default_build_criteria(node: NodeRevision) -> BuildCriteria:
+    """
+    Set the dialect by finding available engines for this node, or default to Spark
+    """
+    return BuildCriteria(
+        dialect=(
+            node.catalog.engines[0].dialect
+            if node.catalog and node.catalog.engines and node.catalog.engines[0].dialect
+            else Dialect.SPARK
+        ),
+    )
+
+
 def build_node(  # pylint: disable=too-many-arguments
     session: Session,
     node: NodeRevision,
@@ -430,17 +447,8 @@ def build_node(  # pylint: disable=too-many-arguments
     """
     Determines the optimal way to build the Node and does so
     """
-    # Set the dialect by finding available engines for this node, or default to Spark
     if not build_criteria:
-        build_criteria = BuildCriteria(
-            dialect=(
-                node.catalog.engines[0].dialect
-                if node.catalog
-                and node.catalog.engines
-                and node.catalog.engines[0].dialect
-                else Dialect.SPARK
-            ),
-        )
+        build_criteria = default_build_criteria(node)
 
     # if no dimensions need to be added then we can see if the node is directly materialized
     if not (filters or dimensions):
@@ -451,7 +459,7 @@ def build_node(  # pylint: disable=too-many-arguments
             return ast.Query(select=select)  # pragma: no cover
 
     if node.query:
-        query = parse(node.query)
+        query = node.parsed_query()
     else:
         query = build_source_node_query(node)
 
@@ -516,10 +524,10 @@ def build_metric_nodes(
             metric_ast.select.projection,
         )
         if all(tbl in built_source_tables for tbl in metric_dependencies):
-            metric_ast.select.projection.extend(diff_columns)
+            metric_ast.select.projection += diff_columns
             combined_ast = metric_ast
         else:
-            combined_ast.select.projection.extend(diff_columns)  # pragma: no cover
+            combined_ast.select.projection += diff_columns  # pragma: no cover
 
     built_source_tables = {
         tbl.alias_or_name.name for tbl in combined_ast.find_all(ast.Table)
@@ -0,0 +1,335 @@
+"""
+Cache of the results of building nodes.
+
+Building the SQL of a node parses, compiles and builds the ASTs of the node and
+of everything upstream of it, so the SQL built for a node (or a set of metrics)
+with a set of filters and dimensions is cached. The cache is keyed by the state
+of the part of the DAG that a build reads: the revisions upstream of the nodes,
+the dimension nodes linked to their columns and their availability states. Any
+change to those gives a new key, so stale results are never read and age out of
+the store instead.
+
+Reading that state walks the DAG, so the state read for a set of revisions is kept
+with the version of the DAG it was read at (see `DAGVersion`), and read again only
+once a write bumps the version.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar
+
+from cachelib.base import BaseCache
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import Session, select
+
+from dj.construction.build import default_build_criteria
+from dj.models.attribute import AttributeType, ColumnAttribute
+from dj.models.column import Column
+from dj.models.node import (
+    AvailabilityState,
+    BuildCriteria,
+    DAGVersion,
+    Node,
+    NodeRevision,
+)
+from dj.sql.parsing.backends.antlr4 import normalize_sql
+from dj.utils import get_settings
+
+T = TypeVar("T")  # pylint: disable=invalid-name
+
+# the models whose rows are part of the state of the DAG that builds read
+DAG_MODELS = (
+    AttributeType,
+    AvailabilityState,
+    Column,
+    ColumnAttribute,
+    Node,
+    NodeRevision,
+)
+
+# key of `Session.info` marking sessions that wrote to the DAG in their transaction
+DAG_WRITTEN = "dj_dag_written"
+
+
+class LRUCache(BaseCache):
+    """
+    An in-process store for the build cache, which evicts the least recently used
+    entries when it holds more than `max_entries`. Entries don't expire, since the
+    build cache never reads stale entries.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        super().__init__()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def add(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        with self._lock:
+            if key in self._entries:
+                return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def clear(self) -> bool:
+        with self._lock:
+            self._entries.clear()
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def dag_state(
+    session: Session,
+    revisions: Iterable[NodeRevision],
+) -> List[Tuple[Any, ...]]:
+    """
+    The state of the revisions and of everything upstream of them that building
+    them reads: their queries and columns, the dimension links and attributes of
+    the columns, and the availability states. Parents and linked dimension nodes
+    are followed to their current revisions.
+
+    The DAG is walked one level at a time, and each level is loaded with its
+    columns, parents and availability in a fixed number of queries, rather than
+    lazily loading the relationships of every revision.
+    """
+    state: Dict[int, Tuple[Any, ...]] = {}
+    level = {revision.id for revision in revisions if revision is not None}
+    while level:
+        upstream: Set[int] = set()
+        statement = (
+            select(NodeRevision)
+            .where(NodeRevision.id.in_(level))  # type: ignore  # pylint: disable=no-member
+            .options(
+                selectinload(NodeRevision.columns).options(
+                    joinedload(Column.attributes).joinedload(
+                        ColumnAttribute.attribute_type,
+                    ),
+                    joinedload(Column.dimension).joinedload(Node.current),
+                ),
+                selectinload(NodeRevision.parents).joinedload(Node.current),
+                joinedload(NodeRevision.availability),
+            )
+        )
+        for revision in session.exec(statement).unique():
+            availability = revision.availability
+            state[revision.id] = (  # type: ignore
+                revision.id,
+                revision.name,
+                revision.version,
+                revision.type,
+                revision.query,
+                revision.schema_,
+                revision.table,
+                revision.updated_at,
+                tuple(
+                    (
+                        column.name,
+                        str(column.type),
+                        column.dimension_id,
+                        column.dimension_column,
+                        tuple(
+                            sorted(
+                                attr.attribute_type.name for attr in column.attributes
+                            ),
+                        ),
+                    )
+                    for column in revision.columns
+                ),
+                availability
+                and (
+                    availability.id,
+                    availability.catalog,
+                    availability.schema_,
+                    availability.table,
+                    availability.valid_through_ts,
+                    availability.updated_at,
+                ),
+            )
+            upstream.update(
+                parent.current.id
+                for parent in revision.parents
+                if parent.current is not None
+            )
+            upstream.update(
+                column.dimension.current.id
+                for column in revision.columns
+                if column.dimension is not None and column.dimension.current is not None
+            )
+        level = upstream - state.keys()
+    return [state[id_] for id_ in sorted(state)]
+
+
+def has_dag_changes(session: Session) -> bool:
+    """
+    Whether the session has changes to the DAG that are not flushed yet.
+    """
+    return any(
+        isinstance(instance, DAG_MODELS)
+        for instance in chain(session.new, session.dirty, session.deleted)
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def bump_dag_version(
+    session: Session,
+    flush_context,  # pylint: disable=unused-argument
+) -> None:
+    """
+    Bump the version of the DAG in the transaction of a flush that changes it.
+    """
+    if not has_dag_changes(session):
+        return
+    table = DAGVersion.__table__  # type: ignore  # pylint: disable=no-member
+    connection = session.connection()
+    result = connection.execute(
+        table.update().where(table.c.id == 1).values(version=table.c.version + 1),
+    )
+    if not result.rowcount:
+        connection.execute(table.insert().values(id=1, version=1))
+    session.info[DAG_WRITTEN] = True
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def end_dag_writes(session: Session) -> None:
+    """
+    Forget the writes to the DAG of a transaction once it ends.
+    """
+    session.info.pop(DAG_WRITTEN, None)
+
+
+def dag_version(session: Session) -> int:
+    """
+    The version of the DAG, which changes whenever the DAG does.
+    """
+    version = session.exec(
+        select(DAGVersion.version).where(DAGVersion.id == 1),
+    ).first()
+    return version or 0
+
+
+class BuildCache:
+    """
+    Caches the results of building nodes in a `cachelib` store, like the
+    in-process `LRUCache` or the Redis cache of the settings.
+    """
+
+    prefix = "dj:build:"
+
+    def __init__(self, store: BaseCache, timeout: Optional[int] = None):
+        self.store = store
+        self.timeout = timeout
+        # the DAG states read for sets of revisions, with the version they were read at
+        self.states = LRUCache()
+        # the number of reads that hit and missed the store, counted under the lock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(  # pylint: disable=too-many-arguments
+        self,
+        session: Session,
+        revisions: List[NodeRevision],
+        filters: Optional[List[str]] = None,
+        dimensions: Optional[List[str]] = None,
+        *,
+        build_criteria: Optional[BuildCriteria] = None,
+        extra: Tuple[Any, ...] = (),
+    ) -> str:
+        """
+        The key of the result of building the revisions with the filters and
+        dimensions. Whitespace in the filters and dimensions doesn't matter, but
+        their order does, since it's the order of the generated SQL. `extra` holds
+        anything else the result depends on, like the layout of the SQL.
+        """
+        payload = (
+            self.dag_state(session, revisions),
+            [normalize_sql(filter_) for filter_ in filters or []],
+            [normalize_sql(dimension) for dimension in dimensions or []],
+            build_criteria or [default_build_criteria(rev) for rev in revisions],
+            extra,
+        )
+        digest = hashlib.blake2b(repr(payload).encode("utf-8"), digest_size=16)
+        return self.prefix + digest.hexdigest()
+
+    def dag_state(
+        self,
+        session: Session,
+        revisions: List[NodeRevision],
+    ) -> List[Tuple[Any, ...]]:
+        """
+        The state of the DAG upstream of the revisions, which is only read again
+        once the version of the DAG changes. Sessions that change the DAG read it
+        every time, since their changes may not be committed.
+        """
+        if session.info.get(DAG_WRITTEN) or has_dag_changes(session):
+            return dag_state(session, revisions)
+        version = dag_version(session)
+        key = repr(
+            sorted(revision.id for revision in revisions if revision is not None)
+        )
+        cached = self.states.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        state = dag_state(session, revisions)
+        self.states.set(key, (version, state))
+        return state
+
+    def get_or_build(self, key: str, build: Callable[[], T]) -> T:
+        """
+        The cached result for the key, or the result of `build`, which is cached.
+        Builds that raise are not cached.
+        """
+        result = self.store.get(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if result is None:
+            result = build()
+            self.store.set(key, result, timeout=self.timeout)
+        return result
+
+
+@lru_cache
+def get_build_cache() -> BuildCache:
+    """
+    The build cache of the process, stored in the cache of the settings if one is
+    configured, and in memory otherwise.
+    """
+    settings = get_settings()
+    store = settings.cache
+    if store is None:
+        return BuildCache(LRUCache(settings.build_cache_size))
+    return BuildCache(
+        store,
+        timeout=int(settings.build_cache_timeout.total_seconds()),
+    )
@@ -10,6 +10,7 @@ from sqlalchemy.types import Text
 from sqlmodel import Field, Relationship
 
 from dj.models.base import BaseSQLModel, NodeColumns
+from dj.sql.parsing.type_parser import parse_column_type
 from dj.sql.parsing.types import ColumnType
 
 if TYPE_CHECKING:
@@ -37,13 +38,9 @@ class ColumnTypeDecorator(TypeDecorator):  # pylint: disable=abstract-method
         return str(value)
 
     def process_result_value(self, value, dialect):
-        from dj.sql.parsing.backends.antlr4 import (  # pylint: disable=import-outside-toplevel
-            parse_rule,
-        )
-
         if not value:
             return value
-        return parse_rule(value, "dataType")
+        return parse_column_type(value)
 
 
 class Column(BaseSQLModel, table=True):  # type: ignore
@@ -6,12 +6,12 @@ import enum
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from functools import partial
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
 
 from pydantic import BaseModel, Extra
 from pydantic import Field as PydanticField
 from pydantic import root_validator
-from sqlalchemy import JSON, DateTime, String
+from sqlalchemy import JSON, BigInteger, DateTime, LargeBinary, String, event, inspect
 from sqlalchemy.sql.schema import Column as SqlaColumn
 from sqlalchemy.sql.schema import UniqueConstraint
 from sqlalchemy.types import Enum
@@ -30,6 +30,9 @@ from dj.sql.parsing.types import ColumnType
 from dj.typing import UTCDatetime
 from dj.utils import Version
 
+if TYPE_CHECKING:
+    from dj.sql.parsing import ast
+
 DEFAULT_DRAFT_VERSION = Version(major=0, minor=1)
 DEFAULT_PUBLISHED_VERSION = Version(major=1, minor=0)
 
@@ -89,6 +92,35 @@ class CubeRelationship(BaseSQLModel, table=True):  # type: ignore
     )
 
 
+class QueryFingerprint(BaseSQLModel, table=True):  # type: ignore
+    """
+    Index of the fingerprints in the similarity signatures of node revisions, to
+    look up the revisions whose queries share subtrees with a query.
+    """
+
+    node_revision_id: Optional[int] = Field(
+        default=None,
+        foreign_key="noderevision.id",
+        primary_key=True,
+    )
+
+    # See `dj.sql.similarity.fingerprint_key`
+    fingerprint: int = Field(
+        sa_column=SqlaColumn(BigInteger, primary_key=True, index=True),
+    )
+
+
+class DAGVersion(BaseSQLModel, table=True):  # type: ignore
+    """
+    A counter of the writes to the DAG, bumped by the flushes that change nodes,
+    their revisions, columns or availability states. It stamps the state of the DAG
+    cheaply, so that the state doesn't need to be read again until it changes.
+    """
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    version: int = 0
+
+
 class NodeType(str, enum.Enum):
     """
     Node type.
@@ -383,6 +415,20 @@ class NodeRevision(NodeRevisionBase, table=True):  # type: ignore
         default_factory=partial(datetime.now, timezone.utc),
     )
 
+    # The parsed query, stamped with the version of the parser that produced it
+    query_ast: Optional[bytes] = Field(
+        default=None,
+        sa_column=SqlaColumn("query_ast", LargeBinary),
+        exclude=True,
+    )
+
+    # A MinHash signature of the query, used to find similar nodes
+    query_signature: Optional[bytes] = Field(
+        default=None,
+        sa_column=SqlaColumn("query_signature", LargeBinary),
+        exclude=True,
+    )
+
     parents: List["Node"] = Relationship(
         back_populates="children",
         link_model=NodeRelationship,
@@ -444,6 +490,21 @@ class NodeRevision(NodeRevisionBase, table=True):  # type: ignore
                 primary_key_columns.append(col)
         return primary_key_columns
 
+    def parsed_query(self) -> "ast.Query":
+        """
+        The parsed query of this revision. Parsed queries are cached in memory, and on
+        a cache miss the stored AST is used if it was built from the current query by
+        the current parser, and signed with the secret of the settings. The stored AST
+        is only written when the revision is saved (see `store_query_ast`), or when
+        stale ASTs are replaced (see `dj.api.helpers.store_query_asts`).
+        """
+        from dj.sql.parsing.backends.antlr4 import (  # pylint: disable=C0415
+            load_or_parse,
+        )
+        from dj.utils import get_settings  # pylint: disable=C0415
+
+        return load_or_parse(self.query, self.query_ast, get_settings().secret)
+
     def extra_validation(self) -> None:
         """
         Extra validation for node data.
@@ -477,6 +538,113 @@ class NodeRevision(NodeRevisionBase, table=True):  # type: ignore
         extra = Extra.allow
 
 
+@event.listens_for(NodeRevision, "before_insert")
+@event.listens_for(NodeRevision, "before_update")
+def store_query_ast(
+    mapper,  # pylint: disable=unused-argument
+    connection,  # pylint: disable=unused-argument
+    node_revision: NodeRevision,
+) -> None:
+    """
+    Store the parsed query and its similarity signature when a node revision is
+    saved, so that the query doesn't need to be parsed again when the node is built
+    or compared with other nodes. The parsed query is only stored if the settings
+    have a secret to sign it with.
+    """
+    from dj.sql.parsing.backends.antlr4 import (  # pylint: disable=C0415
+        dump_query_ast,
+        is_query_ast_current,
+        parse,
+    )
+    from dj.sql.similarity import query_signature  # pylint: disable=C0415
+    from dj.utils import get_settings  # pylint: disable=C0415
+
+    secret = get_settings().secret
+    if not node_revision.query:
+        node_revision.query_ast = None
+        node_revision.query_signature = None
+    elif (
+        not secret
+        or not is_query_ast_current(
+            node_revision.query_ast,
+            node_revision.query,
+            secret,
+        )
+        or node_revision.query_signature is None
+    ):
+        try:
+            query = parse(node_revision.query)
+        except Exception:  # pylint: disable=broad-except
+            # draft nodes may have queries that don't parse
+            node_revision.query_ast = None
+            node_revision.query_signature = None
+        else:
+            node_revision.query_ast = (
+                dump_query_ast(query, node_revision.query, secret) if secret else None
+            )
+            node_revision.query_signature = query_signature(query)
+
+
+def index_query_signature(
+    connection,
+    node_revision_id: int,
+    signature: Optional[bytes],
+) -> None:
+    """
+    Replace the indexed fingerprints of a node revision with those in its signature.
+    """
+    from dj.sql.similarity import (  # pylint: disable=C0415
+        fingerprint_key,
+        unpack_signature,
+    )
+
+    table = QueryFingerprint.__table__  # type: ignore  # pylint: disable=no-member
+    connection.execute(
+        table.delete().where(table.c.node_revision_id == node_revision_id),
+    )
+    if signature:
+        connection.execute(
+            table.insert(),
+            [
+                {
+                    "node_revision_id": node_revision_id,
+                    "fingerprint": fingerprint_key(fingerprint),
+                }
+                for fingerprint in unpack_signature(signature)
+            ],
+        )
+
+
+@event.listens_for(NodeRevision, "after_insert")
+@event.listens_for(NodeRevision, "after_update")
+def index_stored_query_signature(
+    mapper,  # pylint: disable=unused-argument
+    connection,
+    node_revision: NodeRevision,
+) -> None:
+    """
+    Index the fingerprints of the similarity signature stored with a node revision.
+    """
+    if inspect(node_revision).attrs.query_signature.history.has_changes():
+        index_query_signature(
+            connection,
+            node_revision.id,  # type: ignore
+            node_revision.query_signature,
+        )
+
+
+@event.listens_for(NodeRevision, "before_delete")
+def unindex_query_signature(
+    mapper,  # pylint: disable=unused-argument
+    connection,
+    node_revision: NodeRevision,
+) -> None:
+    """
+    Remove the indexed fingerprints of a node revision that is deleted.
+    """
+    index_query_signature(connection, node_revision.id, None)  # type: ignore
+
+
 class ImmutableNodeFields(BaseSQLModel):
     """
     Node fields that cannot be changed
@@ -763,6 +931,16 @@ class NodeOutput(OutputModel):
     tags: List["Tag"] = []
 
 
+class SimilarNode(SQLModel):
+    """
+    A node with a query similar to that of another node
+    """
+
+    name: str
+    type: NodeType
+    similarity: float
+
+
 class NodeValidation(SQLModel):
     """
     A validation of a provided node definition
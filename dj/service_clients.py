@@ -92,7 +92,7 @@ class QueryServiceClient:  # pylint: disable=too-few-public-methods
         )
         table_columns = response.json()["columns"]
         return [
-            Column(name=column["name"], type=ColumnType(column["type"]))
+            Column(name=column["name"], type=ColumnType.validate(column["type"]))
             for column in table_columns
         ]
 
@@ -69,27 +69,18 @@ def compare_registers(types, register) -> bool:
     return True
 
 
-class DispatchMeta(type):
+class Dispatch:
     """
-    Dispatch abstract class for function registry
-    """
-
-    def __getattribute__(cls, func_name):  # pylint: disable=redefined-outer-name
-        if func_name in type.__getattribute__(cls, "registry").get(cls, {}):
-
-            def dynamic_dispatch(*args: "Expression"):
-                return cls.dispatch(func_name, *args)(*args)
+    Function registry.
 
-            return dynamic_dispatch
-        return type.__getattribute__(cls, func_name)
-
-
-class Dispatch(metaclass=DispatchMeta):
-    """
-    Function registry
+    Registering an overload of a function on a class makes the function an attribute
+    of the class that dispatches calls on the types of their arguments.
     """
 
     registry: ClassVar[Dict[str, Dict[Tuple[Tuple[int, Type]], Callable]]] = {}
+    # the overloads of each function of each class by the argument types they were
+    # called with, starting with those that have a fixed number of arguments
+    resolved: ClassVar[Dict[Tuple[Type, str], Dict[Tuple[Type, ...], Callable]]] = {}
 
     @classmethod
     def register(cls, func):  # pylint: disable=redefined-outer-name
@@ -125,27 +116,39 @@ class Dispatch(metaclass=DispatchMeta):
         for types in spread_types:
             cls.registry[cls][func_name][tuple(types)] = func  # type: ignore
 
+        # a new overload can change how calls resolve, so the resolved overloads
+        # start over from those with a fixed number of arguments
+        cls.resolved[(cls, func_name)] = {
+            tuple(type_ for _, type_ in register): overload
+            for register, overload in cls.registry[cls][func_name].items()
+            if all(index >= 0 for index, _ in register)
+        }
+
+        def dynamic_dispatch(*args: "Expression"):
+            return cls.dispatch(func_name, *args)(*args)
+
+        setattr(cls, func_name, staticmethod(dynamic_dispatch))
+
     @classmethod
     def dispatch(  # pylint: disable=redefined-outer-name
         cls, func_name, *args: "Expression"
     ):
-        type_registry = cls.registry[cls].get(func_name)  # type: ignore
-        if not type_registry:
+        resolved = cls.resolved.get((cls, func_name))
+        if resolved is None:
             raise ValueError(
                 f"No function registered on {cls.__name__}`{func_name}`.",
             )  # pragma: no cover
 
-        type_list = []
-        for i, arg in enumerate(args):
-            type_list.append((i, type(arg.type) if hasattr(arg, "type") else type(arg)))
-
-        types = tuple(type_list)
-
-        if types in type_registry:  # type: ignore
-            return type_registry[types]  # type: ignore
+        arg_types = tuple(
+            type(arg.type) if hasattr(arg, "type") else type(arg) for arg in args
+        )
+        if (func := resolved.get(arg_types)) is not None:
+            return func
 
-        for register, func in type_registry.items():  # type: ignore
+        types = tuple(enumerate(arg_types))
+        for register, func in cls.registry[cls][func_name].items():  # type: ignore
             if compare_registers(types, register):
+                resolved[arg_types] = func
                 return func
 
         raise TypeError(
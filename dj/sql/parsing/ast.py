@@ -4,16 +4,21 @@
 import collections
 import decimal
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
 from copy import deepcopy
-from dataclasses import dataclass, field, fields
+from dataclasses import MISSING, dataclass, field, fields
 from enum import Enum
-from functools import reduce
+from functools import lru_cache, reduce, wraps
 from itertools import chain, zip_longest
 from typing import (
     Any,
     Callable,
+    ClassVar,
     Dict,
+    FrozenSet,
     Generic,
+    Iterable,
     Iterator,
     List,
     Optional,
@@ -36,6 +41,8 @@ from dj.models.node import NodeType
 from dj.models.node import NodeType as DJNodeType
 from dj.sql.functions import function_registry, table_function_registry
 from dj.sql.parsing.backends.exceptions import DJParseException
+from dj.sql.parsing.codegen import SQLWriter, render
+from dj.sql.parsing.type_lattice import promote_types
 from dj.sql.parsing.types import (
     BigIntType,
     BooleanType,
@@ -58,6 +65,69 @@ from dj.sql.parsing.types import (
 
 PRIMITIVES = {int, float, str, bool, type(None)}
 
+# private attributes that the `is_compiled` checks of nodes depend on
+COMPILATION_STATE = {"_is_compiled", "_table", "_type", "_columns", "_dj_node"}
+
+
+def write_list(out: SQLWriter, nodes: Iterable["Node"], separator: str = ", "):
+    """
+    Write the SQL of nodes separated by `separator`
+    """
+    for i, node in enumerate(nodes):
+        if i:
+            out.write(separator)
+        node.write_sql(out)
+
+
+@dataclass
+class TypeInferences:
+    """
+    Counts the types inferred for expressions, instead of read from their caches
+    """
+
+    count: int = 0
+
+
+_type_inferences: ContextVar[Optional[TypeInferences]] = ContextVar(
+    "type_inferences",
+    default=None,
+)
+
+
+@contextmanager
+def count_type_inferences() -> Iterator[TypeInferences]:
+    """
+    Count the types inferred in the block, like those of a single API request
+    """
+    inferences = TypeInferences()
+    token = _type_inferences.set(inferences)
+    try:
+        yield inferences
+    finally:
+        _type_inferences.reset(token)
+
+
+def inferred_type(func: Callable[[Any], Any]) -> property:
+    """
+    A `type` property of an expression that infers its type from the types of its
+    children. The type is cached on the expression once its sub-ast is compiled,
+    and reset when a child is replaced or a descendant's compilation state changes.
+    """
+
+    @wraps(func)
+    def type_(self):
+        if self._inferred_type is not None:
+            return self._inferred_type
+        inferences = _type_inferences.get()
+        if inferences is not None:
+            inferences.count += 1
+        result = func(self)
+        if result is not None and not self.uncompiled_descendants:
+            object.__setattr__(self, "_inferred_type", result)
+        return result
+
+    return property(type_)
+
 
 def flatten(maybe_iterables: Any) -> Iterator:
     """
@@ -92,22 +162,107 @@ class Node(ABC):
             - Enum
             - descendant of `Node`
         - Attributes starting with '_' are "obfuscated" and are not included in `children`
+        - Attributes are stored in `__slots__` (see `slotted`), so nodes have no `__dict__`
 
     """
 
-    parent: Optional["Node"] = None
-    parent_key: Optional[str] = None
+    __slots__ = (
+        "parent",
+        "parent_key",
+        "_is_compiled",
+        "_subtree_types",
+        "_hash",
+        "_uncompiled",
+        "_ancestry",
+    )
 
-    _is_compiled: bool = False
+    parent: Optional["Node"]
+    parent_key: Optional[str]
+
+    _is_compiled: bool
+    _subtree_types: Optional[FrozenSet[type]]
+    _hash: Optional[int]
+    _uncompiled: Optional[int]
+    _ancestry: Optional[Tuple[Any, ...]]
+
+    # values of slots that are not set by `__init__`
+    _slot_defaults: ClassVar[Tuple[Tuple[str, Any], ...]] = (
+        ("parent", None),
+        ("parent_key", None),
+        ("_is_compiled", False),
+        ("_subtree_types", None),
+        ("_hash", None),
+        ("_uncompiled", None),
+        ("_ancestry", None),
+    )
+    # slots caching state derived from the sub-ast, reset when it changes
+    _subtree_caches: ClassVar[Tuple[str, ...]] = (
+        "_subtree_types",
+        "_hash",
+        "_uncompiled",
+    )
+
+    def __new__(cls, *args, **kwargs):  # pylint: disable=unused-argument
+        node = super().__new__(cls)
+        for key, value in cls._slot_defaults:
+            object.__setattr__(node, key, value)
+        return node
 
     def __post_init__(self):
         self.add_self_as_parent()
 
     @property
     def depth(self) -> int:
-        if self.parent is None:
-            return 0
-        return self.parent.depth + 1
+        return self.ancestry[0]
+
+    @property
+    def ancestry(self) -> Tuple[Any, ...]:
+        """
+        The depth of the node, followed by its nearest ancestors of each of the
+        `CACHED_ANCESTOR_TYPES` (or None).
+
+        This lets `depth` and `get_nearest_parent_of_type` answer in constant time
+        when they are called for many nodes. It is computed on first use for the
+        node and the ancestors it is derived from, and reset on the node and its
+        descendants whenever the node is given another parent.
+        """
+        if self._ancestry is None:
+            path = []
+            node: Optional[Node] = self
+            while node is not None and node._ancestry is None:
+                path.append(node)
+                node = node.parent
+            ancestry = None if node is None else node._ancestry
+            for child in reversed(path):
+                parent = child.parent
+                if parent is None:
+                    ancestry = (0,) + (None,) * len(CACHED_ANCESTOR_TYPES)
+                else:
+                    parent_types = node_types(type(parent))
+                    ancestry = (
+                        ancestry[0] + 1,  # type: ignore
+                        *(
+                            parent if type_ in parent_types else nearest
+                            for type_, nearest in zip(
+                                CACHED_ANCESTOR_TYPES,
+                                ancestry[1:],  # type: ignore
+                            )
+                        ),
+                    )
+                object.__setattr__(child, "_ancestry", ancestry)
+        return self._ancestry  # type: ignore
+
+    def reset_ancestry(self):
+        """
+        Mark the ancestry cached by the node and its descendants as out of date,
+        after the node was given another parent
+        """
+        stack: List[Node] = [self]
+        while stack:
+            node = stack.pop()
+            if node._ancestry is not None:
+                object.__setattr__(node, "_ancestry", None)
+                stack.extend(node.children)
 
     def clear_parent(self: TNode) -> TNode:
         """
@@ -142,14 +297,22 @@ class Node(ABC):
         """
         Facilitates setting children using `.` syntax ensuring parent is attributed
         """
-        if key == "parent":
+        if key in ("parent", "parent_key"):
+            reparented = key == "parent" and value is not self.parent
             object.__setattr__(self, key, value)
+            if reparented and self._ancestry is not None:
+                self.reset_ancestry()
             return
 
         object.__setattr__(self, key, value)
+        if key.startswith("_"):
+            if key in COMPILATION_STATE:
+                self.reset_compilation_state()
+            return
         for child in flatten(value):
-            if isinstance(child, Node) and not key.startswith("_"):
+            if isinstance(child, Node):
                 child.set_parent(self, key)
+        self.reset_subtree_caches()
 
     def swap(self: TNode, other: "Node") -> TNode:
         """
@@ -179,8 +342,67 @@ class Node(ABC):
     def copy(self: TNode) -> TNode:
         """
         Create a deep copy of the `self`
-        """
-        return deepcopy(self)
+
+        Only the nodes of the sub-ast are copied, along with the detached nodes that
+        compiling it created, like the columns of its tables. References to nodes
+        that are copied, like the tables of its columns, point to their copies, while
+        references to other nodes are shared with the original. The copy is
+        detached: it has no parent, so it can be swapped into a tree without touching
+        the original's. Unlike `deepcopy`, this doesn't copy the rest of the tree
+        through `parent`, nor the DJ nodes and types that the AST refers to.
+        """
+        ancestors = set()
+        node: Optional[Node] = self.parent
+        while node is not None:
+            ancestors.add(id(node))
+            node = node.parent
+
+        originals: List[Node] = []
+        clones: Dict[int, Node] = {}
+        stack: List[Node] = [self]
+        while stack:
+            node = stack.pop()
+            if id(node) in clones:
+                continue
+            originals.append(node)
+            clones[id(node)] = object.__new__(type(node))
+            for name in child_field_names(type(node)):
+                stack.extend(
+                    child
+                    for child in flatten(getattr(node, name, None))
+                    if is_node_type(type(child))
+                )
+            # the nodes that compiling created, which aren't part of any tree
+            for name in slot_names(type(node)):
+                if name.startswith("_") and name != "_ancestry":
+                    stack.extend(
+                        child
+                        for child in flatten(getattr(node, name, None))
+                        if is_node_type(type(child))
+                        and child.parent is None
+                        and id(child) not in ancestors
+                    )
+
+        for node in originals:
+            clone = clones[id(node)]
+            for key in slot_names(type(node)):
+                if hasattr(node, key):
+                    object.__setattr__(
+                        clone,
+                        key,
+                        _clone_value(getattr(node, key), clones),
+                    )
+            # caches other than the structural ones, like the scope of a select,
+            # refer to the original nodes
+            for key in type(node)._subtree_caches:
+                if key not in Node._subtree_caches:
+                    object.__setattr__(clone, key, None)
+            # the depth and ancestors change with the root
+            object.__setattr__(clone, "_ancestry", None)
+        root = clones[id(self)]
+        object.__setattr__(root, "parent", None)
+        object.__setattr__(root, "parent_key", None)
+        return cast(TNode, root)
 
     def get_nearest_parent_of_type(
         self: "Node",
@@ -189,6 +411,8 @@ class Node(ABC):
         """
         Traverse up the tree until you find a node of `node_type` or hit the root
         """
+        if (index := _CACHED_ANCESTOR_INDEX.get(node_type)) is not None:
+            return self.ancestry[index]
         if isinstance(self.parent, node_type):
             return self.parent
         if self.parent is None:
@@ -234,8 +458,8 @@ class Node(ABC):
             for self_field in fields(self):
                 if (
                     not self_field.name.startswith("_") if not obfuscated else True
-                ) and (self_field.name in self.__dict__):
-                    value = self.__dict__[self_field.name]
+                ) and hasattr(self, self_field.name):
+                    value = getattr(self, self_field.name)
                     values = [value]
                     if flat:
                         values = flatten(value)
@@ -308,6 +532,39 @@ class Node(ABC):
             if replacements == times:
                 return
 
+    def replace_all(
+        self,
+        replacements: Iterable[Tuple["Node", "Node"]],
+        copy: bool = True,
+    ):
+        """
+        Replace nodes in the subtree with their replacements in a single traversal,
+        given pairs `(from_, to)`. Nodes are matched by identity, and the replaced
+        nodes and replacements are not traversed. The replacements are copied unless
+        `copy` is False, which is only safe if none of them is used more than once
+        """
+        replacements = list(replacements)
+        pending = {id(from_): to for from_, to in replacements}
+        types = {type(from_) for from_, _ in replacements}
+        replaced: Dict[int, Node] = {}
+        stack: List[Node] = [self]
+        while pending and stack:
+            node = stack.pop()
+            if (to := pending.pop(id(node), None)) is not None:
+                replaced[id(node)] = to.copy() if copy else to
+                node.swap(replaced[id(node)])
+                continue
+            stack.extend(
+                child
+                for child in node.children
+                if not types.isdisjoint(child.subtree_types)
+            )
+        # retarget columns in the order of the replacements, like `replace` would
+        for from_, _ in replacements:
+            if isinstance(from_, Table) and id(from_) in replaced:
+                for ref in from_.ref_columns:
+                    ref.add_table(replaced[id(from_)])
+
     def filter(self, func: Callable[["Node"], bool]) -> Iterator["Node"]:
         """
         Find all nodes that `func` returns `True` for
@@ -330,11 +587,85 @@ class Node(ABC):
         """
         return bool(other) and other.contains(self)
 
+    @property
+    def subtree_types(self) -> FrozenSet[type]:
+        """
+        The types of all nodes in the node's sub-ast, including their base classes.
+
+        This is the index `find_all` uses to skip subtrees without any matches. It
+        is computed on first use and reset on the node and its ancestors whenever
+        a child is set, so changes made with `.` syntax, `swap` or `replace` are
+        picked up. Lists of children must be reassigned rather than mutated in place.
+        """
+        if self._subtree_types is None:
+            types = node_types(type(self)).union(
+                *(child.subtree_types for child in self.children)
+            )
+            object.__setattr__(
+                self,
+                "_subtree_types",
+                _SUBTREE_TYPES.setdefault(types, types),
+            )
+        return self._subtree_types  # type: ignore
+
+    def reset_subtree_caches(self):
+        """
+        Mark the state cached about the sub-asts of the node and its ancestors (like
+        the type index) as out of date
+        """
+        node: Optional[Node] = self
+        while node is not None:
+            cached = [
+                key for key in node._subtree_caches if getattr(node, key) is not None
+            ]
+            if not cached:
+                break
+            for key in cached:
+                object.__setattr__(node, key, None)
+            node = node.parent
+
+    @property
+    def uncompiled_descendants(self) -> int:
+        """
+        The number of nodes in the sub-ast of the node, not counting the node itself,
+        that are not compiled.
+
+        This lets `Query.is_compiled` check the whole query in constant time, and
+        `Query.compile` skip subtrees that are already compiled. It is computed on
+        first use and reset on the node and its ancestors whenever a child is set,
+        or when the compilation state of a descendant changes (see
+        `COMPILATION_STATE`).
+        """
+        if self._uncompiled is None:
+            uncompiled = 0
+            for child in self.children:
+                uncompiled += child.uncompiled_descendants
+                uncompiled += not child.is_compiled()
+            object.__setattr__(self, "_uncompiled", uncompiled)
+        return self._uncompiled  # type: ignore
+
+    def reset_compilation_state(self):
+        """
+        Mark the counts of uncompiled descendants of the node's ancestors, and the
+        types inferred for them, as out of date after the node was compiled
+        """
+        node = self.parent
+        while node is not None and node._uncompiled is not None:
+            object.__setattr__(node, "_uncompiled", None)
+            if getattr(node, "_inferred_type", None) is not None:
+                object.__setattr__(node, "_inferred_type", None)
+            node = node.parent
+
     def find_all(self, node_type: Type[TNode]) -> Iterator[TNode]:
         """
         Find all nodes of a particular type in the node's sub-ast
         """
-        return self.filter(lambda n: isinstance(n, node_type))  # type: ignore
+        if node_type not in self.subtree_types:
+            return
+        if isinstance(self, node_type):
+            yield self
+        for child in self.children:
+            yield from child.find_all(node_type)
 
     def apply(self, func: Callable[["Node"], None]):
         """
@@ -355,6 +686,7 @@ class Node(ABC):
             return False
         if id(self) == id(other):
             return True
+        # hashes are cached, so this is only a walk of the sub-asts the first time
         return hash(self) == hash(other)
 
     def diff(self, other: "Node") -> List[Tuple["Node", "Node"]]:
@@ -375,23 +707,41 @@ class Node(ABC):
 
     def similarity_score(self, other: "Node") -> float:
         """
-        Determine how similar two nodes are with a float score
+        Determine how similar two nodes are with a float score: the share of the
+        nodes of both trees that are "top level" equal (see `Node.__eq__`) to a node
+        of the other tree, where equal nodes in both trees are counted once
         """
-        self_nodes = list(self.flatten())
-        other_nodes = list(other.flatten())
-        intersection = [
-            self_node for self_node in self_nodes if self_node in other_nodes
-        ]
+        self_counts = collections.Counter(
+            node.top_level_key() for node in self.flatten()
+        )
+        other_counts = collections.Counter(
+            node.top_level_key() for node in other.flatten()
+        )
+        intersection = sum(
+            count for key, count in self_counts.items() if key in other_counts
+        )
         union = (
-            [self_node for self_node in self_nodes if self_node not in intersection]
-            + [
-                other_node
-                for other_node in other_nodes
-                if other_node not in intersection
-            ]
+            sum(count for key, count in self_counts.items() if key not in other_counts)
+            + sum(
+                count for key, count in other_counts.items() if key not in self_counts
+            )
             + intersection
         )
-        return len(intersection) / len(union)
+        return intersection / union
+
+    def top_level_key(self) -> Tuple:
+        """
+        A hashable key that is equal for nodes that are "top level" equal
+        """
+        return (
+            type(self),
+            *(
+                value
+                if type(value) in PRIMITIVES  # pylint: disable=C0123
+                else type(value)
+                for value in self.fields(False, False, False, True)
+            ),
+        )
 
     def __eq__(self, other) -> bool:
         """
@@ -413,27 +763,47 @@ class Node(ABC):
 
     def __hash__(self) -> int:
         """
-        Hash a node
-        """
-        return hash(
-            tuple(
-                chain(
-                    (type(self),),
-                    self.fields(
-                        flat=True,
-                        nodes_only=False,
-                        obfuscated=False,
-                        nones=True,
-                        named=False,
+        Hash a node. This is a structural hash of the whole sub-ast, which is built
+        from the hashes of the children (like a Merkle tree) and cached until the
+        node or one of its descendants changes.
+        """
+        if self._hash is None:
+            object.__setattr__(
+                self,
+                "_hash",
+                hash(
+                    tuple(
+                        chain(
+                            (type(self),),
+                            self.fields(
+                                flat=True,
+                                nodes_only=False,
+                                obfuscated=False,
+                                nones=True,
+                                named=False,
+                            ),
+                        ),
                     ),
                 ),
-            ),
-        )
+            )
+        return self._hash  # type: ignore
+
+    def __getstate__(self):
+        # hashes of strings differ between processes, so cached hashes can't be
+        # pickled
+        return None, {
+            key: getattr(self, key)
+            for key in slot_names(type(self))
+            if key != "_hash" and hasattr(self, key)
+        }
 
-    @abstractmethod
     def __str__(self) -> str:
+        return render(self)
+
+    @abstractmethod
+    def write_sql(self, out: SQLWriter):
         """
-        Get the string of a node
+        Write the SQL of a node to a code generator
         """
 
     def compile(self, ctx: CompileContext):
@@ -452,6 +822,113 @@ class Node(ABC):
         return self._is_compiled
 
 
+def _rebind_class_cell(value: Any, old: type, new: type):
+    """
+    Point the ``__class__`` cell used by zero-argument ``super()`` at ``new``
+    """
+    if isinstance(value, (classmethod, staticmethod)):
+        value = value.__func__
+    if isinstance(value, property):
+        for accessor in (value.fget, value.fset, value.fdel):
+            _rebind_class_cell(accessor, old, new)
+        return
+    code = getattr(value, "__code__", None)
+    if code is None or not value.__closure__:
+        return
+    for name, cell in zip(code.co_freevars, value.__closure__):
+        if name == "__class__" and cell.cell_contents is old:
+            cell.cell_contents = new
+
+
+def slotted(cls: Type[TNode]) -> Type[TNode]:
+    """
+    Rebuilds a node dataclass with ``__slots__`` for its fields, which is what
+    ``dataclass(slots=True)`` does on python 3.10+. Slotted nodes have no
+    per-instance ``__dict__``, so they take considerably less memory.
+
+    Python does not allow a class to have several bases that add slots, so
+    mixins (``Aliasable``, ``Named``, ``Operation``) declare empty ``__slots__``
+    and the concrete nodes inheriting them store their fields instead.
+    """
+    inherited = set(chain.from_iterable(slot_names(base) for base in cls.__bases__))
+    names = [field_.name for field_ in fields(cls)]  # type: ignore
+    namespace = {
+        key: value
+        for key, value in cls.__dict__.items()
+        if key not in names and key not in ("__dict__", "__weakref__")
+    }
+    namespace["__slots__"] = tuple(name for name in names if name not in inherited)
+    # dataclasses leave fields that are not in `__init__` to the class attribute
+    defaults = dict(cls._slot_defaults)
+    for field_ in fields(cls):  # type: ignore
+        if not field_.init and field_.default is not MISSING:
+            defaults[field_.name] = field_.default
+    namespace["_slot_defaults"] = tuple(defaults.items())
+    new_cls = type(cls)(cls.__name__, cls.__bases__, namespace)
+    new_cls.__qualname__ = cls.__qualname__
+    for value in namespace.values():
+        _rebind_class_cell(value, cls, new_cls)
+    return new_cls
+
+
+# distinct sets of subtree types, so that nodes can share them
+_SUBTREE_TYPES: Dict[FrozenSet[type], FrozenSet[type]] = {}
+
+
+@lru_cache(maxsize=None)
+def node_types(cls: type) -> FrozenSet[type]:
+    """
+    The types an instance of ``cls`` is an instance of
+    """
+    return frozenset(cls.__mro__)
+
+
+@lru_cache(maxsize=None)
+def slot_names(cls: type) -> Tuple[str, ...]:
+    """
+    All slots of instances of ``cls``, including those of its bases
+    """
+    return tuple(
+        chain.from_iterable(
+            vars(klass).get("__slots__", ()) for klass in reversed(cls.__mro__)
+        ),
+    )
+
+
+@lru_cache(maxsize=None)
+def is_node_type(cls: type) -> bool:
+    """
+    Whether ``cls`` is a node class. This is much faster than ``isinstance``
+    checks against the ``Node`` ABC.
+    """
+    return issubclass(cls, Node)
+
+
+@lru_cache(maxsize=None)
+def child_field_names(cls: type) -> Tuple[str, ...]:
+    """
+    The fields of ``cls`` that hold the children of its instances
+    """
+    return tuple(
+        field_.name for field_ in fields(cls) if not field_.name.startswith("_")
+    )
+
+
+def _clone_value(value: Any, clones: Dict[int, "Node"]) -> Any:
+    """
+    Copy the value of a slot for ``Node.copy``: nodes are replaced with their
+    copies if they were copied, and containers of nodes are rebuilt
+    """
+    value_type = type(value)
+    if value_type in PRIMITIVES:
+        return value
+    if value_type in (list, tuple, set):
+        return value_type(_clone_value(element, clones) for element in value)
+    if is_node_type(value_type):
+        return clones.get(id(value), value)
+    return value
+
+
 class DJEnum(Enum):
     """
     A DJ AST enum
@@ -467,6 +944,8 @@ class Aliasable(Node):
     A mixin for Nodes that are aliasable
     """
 
+    __slots__ = ()
+
     alias: Optional["Name"] = None
     as_: Optional[bool] = None
 
@@ -498,6 +977,7 @@ class Aliasable(Node):
 AliasedType = TypeVar("AliasedType", bound=Node)  # pylint: disable=C0103
 
 
+@slotted
 @dataclass(eq=False)
 class Alias(Aliasable, Generic[AliasedType]):
     """
@@ -506,9 +986,10 @@ class Alias(Aliasable, Generic[AliasedType]):
 
     child: AliasedType = field(default_factory=Node)
 
-    def __str__(self) -> str:
-        as_ = " AS " if self.as_ else " "
-        return f"{self.child}{as_}{self.alias}"
+    def write_sql(self, out: SQLWriter):
+        self.child.write_sql(out)
+        out.write(" AS " if self.as_ else " ")
+        self.alias.write_sql(out)
 
     def is_aggregation(self) -> bool:
         return isinstance(self.child, Expression) and self.child.is_aggregation()
@@ -528,6 +1009,7 @@ class Alias(Aliasable, Generic[AliasedType]):
 TExpression = TypeVar("TExpression", bound="Expression")  # pylint: disable=C0103
 
 
+@slotted
 @dataclass(eq=False)
 class Expression(Node):
     """
@@ -535,6 +1017,10 @@ class Expression(Node):
     """
 
     parenthesized: Optional[bool] = field(init=False, default=None)
+    # the type inferred for the expression, see `inferred_type`
+    _inferred_type: Optional[ColumnType] = field(init=False, repr=False, default=None)
+
+    _subtree_caches = (*Node._subtree_caches, "_inferred_type")
 
     @property
     def type(self) -> Union[ColumnType, List[ColumnType]]:
@@ -566,6 +1052,7 @@ class Expression(Node):
         return Alias(child=self).set_alias(alias)
 
 
+@slotted
 @dataclass(eq=False)
 class Name(Node):
     """
@@ -577,8 +1064,15 @@ class Name(Node):
     namespace: Optional["Name"] = None
 
     def __str__(self) -> str:
+        # names are rendered very often, e.g. to compare them
         return self.identifier(True)
 
+    def write_sql(self, out: SQLWriter):
+        if self.namespace:
+            self.namespace.write_sql(out)
+            out.write(".")
+        out.write(out.identifier(self.name, self.quote_style))
+
     def identifier(self, quotes: bool = True) -> str:
         quote_style = "" if not quotes else self.quote_style
         namespace = str(self.namespace) + "." if self.namespace else ""
@@ -586,6 +1080,10 @@ class Name(Node):
             f"{namespace}{quote_style}{self.name}{quote_style}"  # pylint: disable=C0301
         )
 
+    def is_compiled(self) -> bool:
+        # there is nothing to compile in a name
+        return True
+
 
 TNamed = TypeVar("TNamed", bound="Named")  # pylint: disable=C0103
 
@@ -596,6 +1094,8 @@ class Named(Node):
     An Expression that has a name
     """
 
+    __slots__ = ()
+
     name: Name
 
     @property
@@ -630,6 +1130,7 @@ class Named(Node):
         return self.name
 
 
+@slotted
 @dataclass(eq=False)
 class Column(Aliasable, Named, Expression):
     """
@@ -643,6 +1144,7 @@ class Column(Aliasable, Named, Expression):
     _type: Optional["ColumnType"] = field(repr=False, default=None)
     _expression: Optional[Expression] = field(repr=False, default=None)
     _is_compiled: bool = False
+    _api_column: bool = field(repr=False, default=False)
 
     @property
     def type(self):
@@ -714,56 +1216,27 @@ class Column(Aliasable, Named, Expression):
         """
         Find all tables that this column could have originated from.
         """
-        query = cast(
-            Query,
-            self.get_nearest_parent_of_type(Query),
-        )
-        direct_tables = list(
-            filter(
-                lambda tbl: tbl.in_from_or_lateral()
-                and tbl.get_nearest_parent_of_type(Query) is query,
-                query.find_all(TableExpression),
-            ),
-        )
-        for table in direct_tables:
-            if not table.is_compiled():
-                table.compile(ctx)
-
+        select = get_nearest_select(self)
+        if select is None:
+            return []
         namespace = (
             self.name.namespace.identifier(False) if self.name.namespace else ""
         )  # a.x -> a
-        found = []
-
-        # Go through TableExpressions directly on the AST first and collect all
-        # possible origins for this column. There may be more than one if the column
-        # is not namespaced.
-        for table in direct_tables:
-            if not namespace or table.alias_or_name.identifier(False) == namespace:
-                if table.add_ref_column(self, ctx):
-                    found.append(table)
 
-        if found:
-            return found
-
-        if not query.in_from_or_lateral():
-            correlation_tables = list(
-                filter(
-                    lambda tbl: tbl.in_from_or_lateral()
-                    and query.is_ancestor_of(tbl.get_nearest_parent_of_type(Query)),
-                    query.find_all(TableExpression),
-                ),
-            )
-            for table in correlation_tables:
-                if not namespace or table.alias_or_name.identifier(False) == namespace:
-                    if table.add_ref_column(self, ctx):
-                        found.append(table)
-
-        if found:
-            return found
+        # Go through the tables in the FROM clause of the column's select first and
+        # collect all possible origins for this column. There may be more than one
+        # if the column is not namespaced. Subqueries in expressions can also
+        # reference the tables of the selects enclosing them.
+        enclosing: Optional[Select] = select
+        while enclosing is not None:
+            found = enclosing.scope.find_table_sources(self, namespace, ctx)
+            if found:
+                return found
+            enclosing = enclosing.enclosing_select
 
         # If nothing was found in the initial AST, traverse through dimensions graph
         # to find another table in DJ that could be its origin
-        to_process = collections.deque(direct_tables)
+        to_process = collections.deque(select.scope.tables)
         while to_process:
             current_table = to_process.pop()
             if (
@@ -825,25 +1298,40 @@ class Column(Aliasable, Named, Expression):
         source_table.add_ref_column(self, ctx)
         self._is_compiled = True
 
-    def __str__(self) -> str:
-        as_ = " AS " if self.as_ else " "
-        alias = "" if not self.alias else f"{as_}{self.alias}"
+    def write_sql(self, out: SQLWriter):
+        self.write_reference(out, self.name)
+        if self.alias:
+            out.write(" AS " if self.as_ else " ")
+            self.alias.write_sql(out)
+
+    def write_reference(self, out: SQLWriter, name: Name):
+        """
+        Write the column referenced by a name, without its alias
+        """
+        if self.parenthesized:
+            out.write("(")
         if self.table is not None and not isinstance(self.table, FunctionTable):
-            ret = f"{self.table.alias_or_name.name}.{self.name.quote_style}{self.name.name}{self.name.quote_style}"
+            # formatted, as tables are sometimes aliased with names of names
+            out.write(str(self.table.alias_or_name.name))
+            out.write(".")
+            out.write(out.identifier(name.name, name.quote_style))
+        elif isinstance(name, str):
+            # grouping sets are parsed as columns named by their text
+            out.write(name)
         else:
-            ret = str(self.name)
+            name.write_sql(out)
         if self.parenthesized:
-            ret = f"({ret})"
-        return ret + alias
+            out.write(")")
 
 
+@slotted
 @dataclass(eq=False)
 class Wildcard(Named, Expression):
     """
     Wildcard or '*' expression
     """
 
-    name: Name = field(init=False, repr=False, default=Name("*"))
+    name: Name = field(init=False, repr=False, default_factory=lambda: Name("*"))
     _table: Optional["Table"] = field(repr=False, default=None)
 
     @property
@@ -861,14 +1349,15 @@ class Wildcard(Named, Expression):
             self._table = table
         return self
 
-    def __str__(self) -> str:
-        return "*"
+    def write_sql(self, out: SQLWriter):
+        out.write("*")
 
     @property
     def type(self) -> ColumnType:
         return WildcardType()
 
 
+@slotted
 @dataclass(eq=False)
 class TableExpression(Aliasable, Expression):
     """
@@ -971,6 +1460,7 @@ class TableExpression(Aliasable, Expression):
         return False
 
 
+@slotted
 @dataclass(eq=False)
 class Table(TableExpression, Named):
     """
@@ -993,12 +1483,11 @@ class Table(TableExpression, Named):
         self._dj_node = dj_node
         return self
 
-    def __str__(self) -> str:
-        table_str = str(self.name)
+    def write_sql(self, out: SQLWriter):
+        self.name.write_sql(out)
         if self.alias:
-            as_ = " AS " if self.as_ else " "
-            table_str += f"{as_}{self.alias}"
-        return table_str
+            out.write(" AS " if self.as_ else " ")
+            self.alias.write_sql(out)
 
     def is_compiled(self) -> bool:
         return super().is_compiled() and (self.dj_node is not None)
@@ -1034,6 +1523,8 @@ class Operation(Expression):
     A type to overarch types that operate on other expressions
     """
 
+    __slots__ = ()
+
 
 # pylint: disable=C0103
 class UnaryOpKind(DJEnum):
@@ -1048,6 +1539,7 @@ class UnaryOpKind(DJEnum):
         return self.value
 
 
+@slotted
 @dataclass(eq=False)
 class UnaryOp(Operation):
     """
@@ -1057,13 +1549,16 @@ class UnaryOp(Operation):
     op: UnaryOpKind
     expr: Expression
 
-    def __str__(self) -> str:
-        ret = f"{self.op} {self.expr}"
+    def write_sql(self, out: SQLWriter):
+        if self.parenthesized:
+            out.write("(")
+        out.write(self.op.value)
+        out.write(" ")
+        self.expr.write_sql(out)
         if self.parenthesized:
-            return f"({ret})"
-        return ret
+            out.write(")")
 
-    @property
+    @inferred_type
     def type(self) -> ColumnType:
         type_ = self.expr.type
 
@@ -1113,6 +1608,7 @@ class BinaryOpKind(DJEnum):
     Modulo = "%"
 
 
+@slotted
 @dataclass(eq=False)
 class BinaryOp(Operation):
     """
@@ -1164,20 +1660,22 @@ class BinaryOp(Operation):
             use_alias_as_name=use_alias_as_name,
         )
 
-    def __str__(self) -> str:
-        left, right = self.left, self.right
-        if self.use_alias_as_name:
-            if isinstance(self.right, Column) and self.right.alias:
-                right = self.right.copy().use_alias_as_name()
-            if isinstance(self.left, Column) and self.left.alias:
-                left = self.left.copy().use_alias_as_name()
-        ret = f"{left} {self.op.value} {right}"
-
+    def write_sql(self, out: SQLWriter):
         if self.parenthesized:
-            return f"({ret})"
-        return ret
+            out.write("(")
+        self._write_operand(out, self.left)
+        out.write(f" {self.op.value} ")
+        self._write_operand(out, self.right)
+        if self.parenthesized:
+            out.write(")")
 
-    @property
+    def _write_operand(self, out: SQLWriter, operand: Expression):
+        if self.use_alias_as_name and isinstance(operand, Column) and operand.alias:
+            operand.write_reference(out, operand.alias)
+        else:
+            operand.write_sql(out)
+
+    @inferred_type
     def type(self) -> ColumnType:
         kind = self.op
         left_type = self.left.type
@@ -1189,31 +1687,22 @@ class BinaryOp(Operation):
                 f"{self}. Got left {left_type}, right {right_type}.",
             )
 
-        numeric_types = {
-            type_: idx
-            for idx, type_ in enumerate(
-                [
-                    str(DoubleType()),
-                    str(FloatType()),
-                    str(BigIntType()),
-                    str(IntegerType()),
-                ],
-            )
-        }
-
         def resolve_numeric_types_binary_operations(
             left: ColumnType,
             right: ColumnType,
         ):
-            if not left.is_compatible(right):
+            result = promote_types(left, right)
+            if result is None:
                 raise_binop_exception()
-            if str(left) in numeric_types and str(right) in numeric_types:
-                if str(left) == str(right):
-                    return left
-                if numeric_types[str(left)] > numeric_types[str(right)]:
-                    return right
+            return result
+
+        def resolve_integer_binary_operations(
+            left: ColumnType,
+            right: ColumnType,
+        ):
+            if left is right is IntegerType():
                 return left
-            return left
+            return raise_binop_exception()
 
         BINOP_TYPE_COMBO_LOOKUP: Dict[  # pylint: disable=C0103
             BinaryOpKind,
@@ -1229,22 +1718,14 @@ class BinaryOp(Operation):
             BinaryOpKind.Lt: lambda left, right: BooleanType(),
             BinaryOpKind.GtEq: lambda left, right: BooleanType(),
             BinaryOpKind.LtEq: lambda left, right: BooleanType(),
-            BinaryOpKind.BitwiseOr: lambda left, right: IntegerType()
-            if str(left) == str(IntegerType()) and str(right) == str(IntegerType())
-            else raise_binop_exception(),
-            BinaryOpKind.BitwiseAnd: lambda left, right: IntegerType()
-            if str(left) == str(IntegerType()) and str(right) == str(IntegerType())
-            else raise_binop_exception(),
-            BinaryOpKind.BitwiseXor: lambda left, right: IntegerType()
-            if str(left) == str(IntegerType()) and str(right) == str(IntegerType())
-            else raise_binop_exception(),
+            BinaryOpKind.BitwiseOr: resolve_integer_binary_operations,
+            BinaryOpKind.BitwiseAnd: resolve_integer_binary_operations,
+            BinaryOpKind.BitwiseXor: resolve_integer_binary_operations,
             BinaryOpKind.Multiply: resolve_numeric_types_binary_operations,
             BinaryOpKind.Divide: resolve_numeric_types_binary_operations,
             BinaryOpKind.Plus: resolve_numeric_types_binary_operations,
             BinaryOpKind.Minus: resolve_numeric_types_binary_operations,
-            BinaryOpKind.Modulo: lambda left, right: IntegerType()
-            if str(left) == str(IntegerType()) and str(right) == str(IntegerType())
-            else raise_binop_exception(),
+            BinaryOpKind.Modulo: resolve_integer_binary_operations,
         }
         return BINOP_TYPE_COMBO_LOOKUP[kind](left_type, right_type)
 
@@ -1258,6 +1739,7 @@ class BinaryOp(Operation):
                 child._is_compiled = True
 
 
+@slotted
 @dataclass(eq=False)
 class FrameBound(Expression):
     """
@@ -1267,10 +1749,11 @@ class FrameBound(Expression):
     start: str
     stop: str
 
-    def __str__(self) -> str:
-        return f"{self.start} {self.stop}"
+    def write_sql(self, out: SQLWriter):
+        out.write(f"{self.start} {self.stop}")
 
 
+@slotted
 @dataclass(eq=False)
 class Frame(Expression):
     """
@@ -1281,12 +1764,18 @@ class Frame(Expression):
     start: FrameBound
     end: Optional[FrameBound] = None
 
-    def __str__(self) -> str:
-        end = f" AND {self.end}" if self.end else ""
-        between = " BETWEEN" if self.end else ""
-        return f"{self.frame_type}{between} {self.start}{end}"
+    def write_sql(self, out: SQLWriter):
+        out.write(self.frame_type)
+        if self.end:
+            out.write(" BETWEEN")
+        out.write(" ")
+        self.start.write_sql(out)
+        if self.end:
+            out.write(" AND ")
+            self.end.write_sql(out)
 
 
+@slotted
 @dataclass(eq=False)
 class Over(Expression):
     """
@@ -1297,24 +1786,23 @@ class Over(Expression):
     order_by: List["SortItem"] = field(default_factory=list)
     window_frame: Optional[Frame] = None
 
-    def __str__(self) -> str:
-        partition_by = (  # pragma: no cover
-            " PARTITION BY " + ", ".join(str(exp) for exp in self.partition_by)
-            if self.partition_by
-            else ""
-        )
-        order_by = (
-            " ORDER BY " + ", ".join(str(exp) for exp in self.order_by)
-            if self.order_by
-            else ""
-        )
-        consolidated_by = "\n".join(
-            po_by for po_by in (partition_by, order_by) if po_by
-        )
-        window_frame = f" {self.window_frame}" if self.window_frame else ""
-        return f"OVER ({consolidated_by}{window_frame})"
-
-
+    def write_sql(self, out: SQLWriter):
+        out.write("OVER (")
+        if self.partition_by:
+            out.space()
+            out.write("PARTITION BY ")
+            write_list(out, self.partition_by)
+        if self.order_by:
+            out.space("\n " if self.partition_by else " ")
+            out.write("ORDER BY ")
+            write_list(out, self.order_by)
+        if self.window_frame:
+            out.space()
+            self.window_frame.write_sql(out)
+        out.write(")")
+
+
+@slotted
 @dataclass(eq=False)
 class Function(Named, Operation):
     """
@@ -1344,22 +1832,40 @@ class Function(Named, Operation):
         return super().__new__(cls)
 
     def __deepcopy__(self, memodict):
-        return self
-
-    def __str__(self) -> str:
-        over = f" {self.over} " if self.over else ""
-        quantifier = f" {self.quantifier} " if self.quantifier else ""
-        ret = (
-            f"{self.name}({quantifier}{', '.join(str(arg) for arg in self.args)}){over}"
-        )
+        # ``__new__`` requires arguments, so the default ``copy.deepcopy`` protocol
+        # can't rebuild a function
+        copied = object.__new__(type(self))
+        memodict[id(self)] = copied
+        for key in slot_names(type(self)):
+            object.__setattr__(copied, key, deepcopy(getattr(self, key), memodict))
+        return copied
+
+    def __reduce__(self):
+        # for the same reason, pickle rebuilds functions from their fields
+        return Node.__new__, (type(self),), self.__getstate__()
+
+    def write_sql(self, out: SQLWriter):
+        if self.parenthesized:
+            out.write("(")
+        self.name.write_sql(out)
+        out.write("(")
+        if self.quantifier:
+            out.space()
+            out.write(self.quantifier)
+            out.space()
+        write_list(out, self.args)
+        out.write(")")
+        if self.over:
+            out.space()
+            self.over.write_sql(out)
+            out.space()
         if self.parenthesized:
-            ret = f"({ret})"
-        return ret
+            out.write(")")
 
     def is_aggregation(self) -> bool:
         return function_registry[self.name.name.upper()].is_aggregation
 
-    @property
+    @inferred_type
     def type(self) -> ColumnType:
         name = self.name.name.upper()
         dj_func = function_registry[name]
@@ -1371,24 +1877,28 @@ class Value(Expression):
     Base class for all values number, string, boolean
     """
 
+    __slots__ = ()
+
     def is_aggregation(self) -> bool:
         return True
 
 
+@slotted
 @dataclass(eq=False)
 class Null(Value):
     """
     Null value
     """
 
-    def __str__(self) -> str:
-        return "NULL"
+    def write_sql(self, out: SQLWriter):
+        out.write("NULL")
 
     @property
     def type(self) -> ColumnType:
         return NullType()
 
 
+@slotted
 @dataclass(eq=False)
 class Number(Value):
     """
@@ -1417,8 +1927,8 @@ class Number(Value):
             if len(cast_exceptions) >= len(numeric_types):
                 raise DJException(message="Not a valid number!")
 
-    def __str__(self) -> str:
-        return str(self.value)
+    def write_sql(self, out: SQLWriter):
+        out.write(str(self.value))
 
     @property
     def type(self) -> ColumnType:
@@ -1448,6 +1958,7 @@ class Number(Value):
         return FloatType()
 
 
+@slotted
 @dataclass(eq=False)
 class String(Value):
     """
@@ -1456,14 +1967,15 @@ class String(Value):
 
     value: str
 
-    def __str__(self) -> str:
-        return self.value
+    def write_sql(self, out: SQLWriter):
+        out.write(self.value)
 
     @property
     def type(self) -> ColumnType:
         return StringType()
 
 
+@slotted
 @dataclass(eq=False)
 class Boolean(Value):
     """
@@ -1472,14 +1984,15 @@ class Boolean(Value):
 
     value: bool
 
-    def __str__(self) -> str:
-        return str(self.value)
+    def write_sql(self, out: SQLWriter):
+        out.write(str(self.value))
 
     @property
     def type(self) -> ColumnType:
         return BooleanType()
 
 
+@slotted
 @dataclass(eq=False)
 class IntervalUnit(Value):
     """
@@ -1489,10 +2002,13 @@ class IntervalUnit(Value):
     unit: str
     value: Optional[Number] = None
 
-    def __str__(self) -> str:
-        return f"{self.value or ''} {self.unit}"
+    def write_sql(self, out: SQLWriter):
+        if self.value:
+            self.value.write_sql(out)
+        out.write(f" {self.unit}")
 
 
+@slotted
 @dataclass(eq=False)
 class Interval(Value):
     """
@@ -1502,9 +2018,13 @@ class Interval(Value):
     from_: List[IntervalUnit]
     to: Optional[IntervalUnit] = None
 
-    def __str__(self) -> str:
-        to = f"TO {self.to}" if self.to else ""
-        return f"INTERVAL {' '.join(str(interval) for interval in self.from_)} {to}"
+    def write_sql(self, out: SQLWriter):
+        out.write("INTERVAL ")
+        write_list(out, self.from_, " ")
+        out.space()
+        if self.to:
+            out.write("TO ")
+            self.to.write_sql(out)
 
     @property
     def type(self) -> ColumnType:
@@ -1532,6 +2052,7 @@ class Interval(Value):
         raise DJParseException(f"Invalid interval type specified in {self}.")
 
 
+@slotted
 @dataclass(eq=False)
 class Struct(Value):
     """
@@ -1540,11 +2061,13 @@ class Struct(Value):
 
     values: List[Aliasable]
 
-    def __str__(self):
-        inner = ", ".join(str(value) for value in self.values)
-        return f"STRUCT({inner})"
+    def write_sql(self, out: SQLWriter):
+        out.write("STRUCT(")
+        write_list(out, self.values)
+        out.write(")")
 
 
+@slotted
 @dataclass(eq=False)
 class Predicate(Operation):
     """
@@ -1558,6 +2081,7 @@ class Predicate(Operation):
         return BooleanType()
 
 
+@slotted
 @dataclass(eq=False)
 class Between(Predicate):
     """
@@ -1568,14 +2092,20 @@ class Between(Predicate):
     low: Expression = field(default_factory=Expression)
     high: Expression = field(default_factory=Expression)
 
-    def __str__(self) -> str:
-        not_ = "NOT " if self.negated else ""
-        between = f"{not_}{self.expr} BETWEEN {self.low} AND {self.high}"
+    def write_sql(self, out: SQLWriter):
         if self.parenthesized:
-            between = f"({between})"
-        return between
+            out.write("(")
+        if self.negated:
+            out.write("NOT ")
+        self.expr.write_sql(out)
+        out.write(" BETWEEN ")
+        self.low.write_sql(out)
+        out.write(" AND ")
+        self.high.write_sql(out)
+        if self.parenthesized:
+            out.write(")")
 
-    @property
+    @inferred_type
     def type(self) -> ColumnType:
         expr_type = self.expr.type
         low_type = self.low.type
@@ -1588,6 +2118,7 @@ class Between(Predicate):
         )
 
 
+@slotted
 @dataclass(eq=False)
 class In(Predicate):
     """
@@ -1597,16 +2128,18 @@ class In(Predicate):
     expr: Expression = field(default_factory=Expression)
     source: Union[List[Expression], "Select"] = field(default_factory=Expression)
 
-    def __str__(self) -> str:
-        not_ = "NOT " if self.negated else ""
-        source = (
-            str(self.source)
-            if isinstance(self.source, Select)
-            else "(" + ", ".join(str(exp) for exp in self.source) + ")"
-        )
-        return f"{self.expr} {not_}IN {source}"
+    def write_sql(self, out: SQLWriter):
+        self.expr.write_sql(out)
+        out.write(" NOT IN " if self.negated else " IN ")
+        if isinstance(self.source, Select):
+            self.source.write_sql(out)
+        else:
+            out.write("(")
+            write_list(out, self.source)
+            out.write(")")
 
 
+@slotted
 @dataclass(eq=False)
 class Rlike(Predicate):
     """
@@ -1616,11 +2149,15 @@ class Rlike(Predicate):
     expr: Expression = field(default_factory=Expression)
     pattern: Expression = field(default_factory=Expression)
 
-    def __str__(self) -> str:
-        not_ = "NOT " if self.negated else ""
-        return f"{not_}{self.expr} RLIKE {self.pattern}"
+    def write_sql(self, out: SQLWriter):
+        if self.negated:
+            out.write("NOT ")
+        self.expr.write_sql(out)
+        out.write(" RLIKE ")
+        self.pattern.write_sql(out)
 
 
+@slotted
 @dataclass(eq=False)
 class Like(Predicate):
     """
@@ -1633,18 +2170,22 @@ class Like(Predicate):
     escape_char: Optional[str] = None
     case_sensitive: Optional[bool] = True
 
-    def __str__(self) -> str:
-        not_ = "NOT " if self.negated else ""
+    def write_sql(self, out: SQLWriter):
+        if self.negated:
+            out.write("NOT ")
+        self.expr.write_sql(out)
+        out.write(" LIKE " if self.case_sensitive else " ILIKE ")
         if self.quantifier:  # quantifier means a pattern with multiple elements
-            pattern = f'({", ".join(str(p) for p in self.patterns)})'
+            out.write(f"{self.quantifier} (")
+            write_list(out, self.patterns)
+            out.write(")")
         else:
-            pattern = self.patterns
-        escape_char = f" ESCAPE '{self.escape_char}'" if self.escape_char else ""
-        quantifier = f"{self.quantifier} " if self.quantifier else ""
-        like_type = "LIKE" if self.case_sensitive else "ILIKE"
-        return f"{not_}{self.expr} {like_type} {quantifier}{pattern}{escape_char}"
+            # a single pattern
+            self.patterns.write_sql(out)
+        if self.escape_char:
+            out.write(f" ESCAPE '{self.escape_char}'")
 
-    @property
+    @inferred_type
     def type(self) -> ColumnType:
         expr_type = self.expr.type
         if expr_type == StringType():
@@ -1654,6 +2195,7 @@ class Like(Predicate):
         )
 
 
+@slotted
 @dataclass(eq=False)
 class IsNull(Predicate):
     """
@@ -1662,15 +2204,16 @@ class IsNull(Predicate):
 
     expr: Expression = field(default_factory=Expression)
 
-    def __str__(self) -> str:
-        not_ = "NOT " if self.negated else ""
-        return f"{self.expr} IS {not_}NULL"
+    def write_sql(self, out: SQLWriter):
+        self.expr.write_sql(out)
+        out.write(" IS NOT NULL" if self.negated else " IS NULL")
 
     @property
     def type(self) -> ColumnType:
         return BooleanType()
 
 
+@slotted
 @dataclass(eq=False)
 class IsBoolean(Predicate):
     """
@@ -1680,15 +2223,17 @@ class IsBoolean(Predicate):
     expr: Expression = field(default_factory=Expression)
     value: str = "UNKNOWN"
 
-    def __str__(self) -> str:
-        not_ = "NOT " if self.negated else ""
-        return f"{self.expr} IS {not_}{self.value}"
+    def write_sql(self, out: SQLWriter):
+        self.expr.write_sql(out)
+        out.write(" IS NOT " if self.negated else " IS ")
+        out.write(self.value)
 
     @property
     def type(self) -> ColumnType:
         return BooleanType()
 
 
+@slotted
 @dataclass(eq=False)
 class IsDistinctFrom(Predicate):
     """
@@ -1698,15 +2243,17 @@ class IsDistinctFrom(Predicate):
     expr: Expression = field(default_factory=Expression)
     right: Expression = field(default_factory=Expression)
 
-    def __str__(self) -> str:
-        not_ = "NOT " if self.negated else ""
-        return f"{self.expr} IS {not_}DISTINCT FROM {self.right}"
+    def write_sql(self, out: SQLWriter):
+        self.expr.write_sql(out)
+        out.write(" IS NOT DISTINCT FROM " if self.negated else " IS DISTINCT FROM ")
+        self.right.write_sql(out)
 
     @property
     def type(self) -> ColumnType:
         return BooleanType()
 
 
+@slotted
 @dataclass(eq=False)
 class Case(Expression):
     """
@@ -1719,27 +2266,40 @@ class Case(Expression):
     operand: Optional[Expression] = None
     results: List[Expression] = field(default_factory=list)
 
-    def __str__(self) -> str:
-        branches = "\n\tWHEN ".join(
-            f"{(cond)} THEN {(result)}"
-            for cond, result in zip(self.conditions, self.results)
-        )
-        else_ = f"ELSE {(self.else_result)}" if self.else_result else ""
-        expr = "" if self.expr is None else f" {self.expr} "
-        ret = f"""CASE {expr}
-        WHEN {branches}
-        {else_}
-    END"""
+    def write_sql(self, out: SQLWriter):
+        if self.parenthesized:
+            out.write("(")
+        out.write("CASE")
+        out.space()
+        if self.expr is not None:
+            out.space()
+            self.expr.write_sql(out)
+            out.space()
+        with out.indented():
+            for i, (cond, result) in enumerate(zip(self.conditions, self.results)):
+                out.newline("\n\t" if i else "\n        ")
+                out.write("WHEN ")
+                cond.write_sql(out)
+                out.write(" THEN ")
+                result.write_sql(out)
+            if not self.conditions:
+                out.newline("\n        ")
+                out.write("WHEN ")
+            out.newline("\n        ")
+            if self.else_result:
+                out.write("ELSE ")
+                self.else_result.write_sql(out)
+        out.newline("\n    ")
+        out.write("END")
         if self.parenthesized:
-            return f"({ret})"
-        return ret
+            out.write(")")
 
     def is_aggregation(self) -> bool:
         return all(result.is_aggregation() for result in self.results) and (
             self.else_result.is_aggregation() if self.else_result else True
         )
 
-    @property
+    @inferred_type
     def type(self) -> ColumnType:
         result_types = [
             res.type
@@ -1753,6 +2313,7 @@ class Case(Expression):
         return result_types[0]
 
 
+@slotted
 @dataclass(eq=False)
 class Subscript(Expression):
     """
@@ -1762,15 +2323,19 @@ class Subscript(Expression):
     expr: Expression
     index: Expression
 
-    def __str__(self) -> str:
-        return f"{self.expr}[{self.index}]"
+    def write_sql(self, out: SQLWriter):
+        self.expr.write_sql(out)
+        out.write("[")
+        self.index.write_sql(out)
+        out.write("]")
 
-    @property
+    @inferred_type
     def type(self) -> ColumnType:
         type_ = cast(MapType, self.expr.type)
         return type_.value.type
 
 
+@slotted
 @dataclass(eq=False)
 class Lambda(Expression):
     """
@@ -1780,14 +2345,18 @@ class Lambda(Expression):
     identifiers: List[Named]
     expr: Expression
 
-    def __str__(self) -> str:
+    def write_sql(self, out: SQLWriter):
         if len(self.identifiers) == 1:
-            id_str = self.identifiers[0]
+            self.identifiers[0].write_sql(out)
         else:
-            id_str = "(" + ", ".join(str(iden) for iden in self.identifiers) + ")"
-        return f"{id_str} -> {self.expr}"
+            out.write("(")
+            write_list(out, self.identifiers)
+            out.write(")")
+        out.write(" -> ")
+        self.expr.write_sql(out)
 
 
+@slotted
 @dataclass(eq=False)
 class JoinCriteria(Node):
     """
@@ -1797,14 +2366,17 @@ class JoinCriteria(Node):
     on: Optional[Expression] = None
     using: Optional[List[Named]] = None
 
-    def __str__(self) -> str:
+    def write_sql(self, out: SQLWriter):
         if self.on:
-            return f"ON {self.on}"
+            out.write("ON ")
+            self.on.write_sql(out)
         else:
-            id_list = ", ".join(str(iden) for iden in self.using)
-            return f"USING ({id_list})"
+            out.write("USING (")
+            write_list(out, self.using)
+            out.write(")")
 
 
+@slotted
 @dataclass(eq=False)
 class Join(Node):
     """
@@ -1817,21 +2389,22 @@ class Join(Node):
     lateral: bool = False
     natural: bool = False
 
-    def __str__(self) -> str:
-        parts = []
+    def write_sql(self, out: SQLWriter):
         if self.natural:
-            parts.append("NATURAL ")
+            out.write("NATURAL ")
         if self.join_type:
-            parts.append(f"{self.join_type} ")
-        parts.append("JOIN ")
+            out.write(self.join_type)
+            out.space()
+        out.write("JOIN ")
         if self.lateral:
-            parts.append("LATERAL ")
-        parts.append(str(self.right))
+            out.write("LATERAL ")
+        self.right.write_sql(out)
         if self.criteria:
-            parts.append(f" {self.criteria}")
-        return "".join(parts)
+            out.write(" ")
+            self.criteria.write_sql(out)
 
 
+@slotted
 @dataclass(eq=False)
 class FunctionTableExpression(TableExpression, Named, Operation):
     """
@@ -1847,17 +2420,26 @@ class FunctionTable(FunctionTableExpression):
     Represents a table-valued function used in a statement
     """
 
-    def __str__(self) -> str:
-        alias = f" {self.alias}" if self.alias else ""
-        as_ = " AS " if self.as_ else ""
-        cols = (
-            f" {', '.join(str(col) for col in self.column_list)}"
-            if self.column_list
-            else ""
-        )
-        column_list_str = f"({cols})" if alias else str(cols)
-        args_str = f"({', '.join(str(col) for col in self.args)})" if self.args else ""
-        return f"{self.name}{args_str}{alias}{as_}{column_list_str}"
+    __slots__ = ()
+
+    def write_sql(self, out: SQLWriter):
+        self.name.write_sql(out)
+        if self.args:
+            out.write("(")
+            write_list(out, self.args)
+            out.write(")")
+        if self.alias:
+            out.write(" ")
+            self.alias.write_sql(out)
+        if self.as_:
+            out.write(" AS ")
+        if self.alias:
+            out.write("(")
+        if self.column_list:
+            out.space()
+            write_list(out, self.column_list)
+        if self.alias:
+            out.write(")")
 
     def set_alias(self: TNode, alias: Name) -> TNode:
         self.alias = alias
@@ -1899,6 +2481,7 @@ class FunctionTable(FunctionTableExpression):
             self._columns.append(col)
 
 
+@slotted
 @dataclass(eq=False)
 class LateralView(Node):
     """
@@ -1908,14 +2491,12 @@ class LateralView(Node):
     outer: bool = False
     func: FunctionTableExpression = field(default_factory=FunctionTableExpression)
 
-    def __str__(self) -> str:
-        parts = ["LATERAL VIEW"]
-        if self.outer:
-            parts.append(" OUTER")
-        parts.append(f" {self.func}")
-        return "".join(parts)
+    def write_sql(self, out: SQLWriter):
+        out.write("LATERAL VIEW OUTER " if self.outer else "LATERAL VIEW ")
+        self.func.write_sql(out)
 
 
+@slotted
 @dataclass(eq=False)
 class Relation(Node):
     """
@@ -1925,14 +2506,15 @@ class Relation(Node):
     primary: Expression
     extensions: List[Join] = field(default_factory=list)
 
-    def __str__(self) -> str:
-        if self.extensions:
-            extensions = " " + "\n".join([str(ext) for ext in self.extensions])
-        else:
-            extensions = ""
-        return f"{self.primary}{extensions}"
+    def write_sql(self, out: SQLWriter):
+        self.primary.write_sql(out)
+        with out.indented():
+            for i, extension in enumerate(self.extensions):
+                out.newline("\n" if i else " ")
+                extension.write_sql(out)
 
 
+@slotted
 @dataclass(eq=False)
 class From(Node):
     """
@@ -1940,14 +2522,19 @@ class From(Node):
     """
 
     relations: List[Relation] = field(default_factory=list)
+    # lateral views following the relations, which the parser moves to the `Select`
+    laterals: List[LateralView] = field(default_factory=list)
 
-    def __str__(self) -> str:
-        parts = ["FROM "]
-        parts += ",\n".join([str(r) for r in self.relations])
-
-        return "".join(parts)
+    def write_sql(self, out: SQLWriter):
+        out.write("FROM ")
+        for i, relation in enumerate(self.relations):
+            if i:
+                out.write(",")
+                out.newline()
+            relation.write_sql(out)
 
 
+@slotted
 @dataclass(eq=False)
 class SetOp(TableExpression):
     """
@@ -1958,8 +2545,12 @@ class SetOp(TableExpression):
     left: Optional[TableExpression] = None
     right: Optional[TableExpression] = None
 
-    def __str__(self) -> str:
-        return f"{self.left}\n{self.kind}\n{self.right}"
+    def write_sql(self, out: SQLWriter):
+        self.left.write_sql(out)
+        out.newline()
+        out.write(self.kind)
+        out.newline()
+        self.right.write_sql(out)
 
     def compile(self, ctx: CompileContext):
         """
@@ -1977,6 +2568,7 @@ class SetOp(TableExpression):
             self._columns = left.columns[:]
 
 
+@slotted
 @dataclass(eq=False)
 class Cast(Expression):
     """
@@ -1986,8 +2578,10 @@ class Cast(Expression):
     data_type: ColumnType
     expression: Expression
 
-    def __str__(self) -> str:
-        return f"CAST({self.expression} AS {str(self.data_type).upper()})"
+    def write_sql(self, out: SQLWriter):
+        out.write("CAST(")
+        self.expression.write_sql(out)
+        out.write(f" AS {out.type_name(self.data_type)})")
 
     @property
     def type(self) -> ColumnType:
@@ -1997,6 +2591,7 @@ class Cast(Expression):
         return self.data_type
 
 
+@slotted
 @dataclass(eq=False)
 class SelectExpression(Aliasable, Expression):
     """
@@ -2027,47 +2622,104 @@ class SelectExpression(Aliasable, Expression):
         self.projection = projection
 
 
+@slotted
+@dataclass(eq=False)
 class Select(SelectExpression):
     """
     A single select statement type
     """
 
+    # whether the select was checked to be a valid metric query
+    _validated: bool = field(init=False, repr=False, default=False)
+    _scope: Optional["Scope"] = field(init=False, repr=False, default=None)
+
+    _subtree_caches = (*SelectExpression._subtree_caches, "_scope")
+
+    @property
+    def scope(self) -> "Scope":
+        """
+        The tables visible to the columns of this select. It is built once and reset
+        with the type index when the select changes.
+        """
+        if self._scope is None:
+            object.__setattr__(self, "_scope", Scope(self))
+        return self._scope  # type: ignore
+
+    @property
+    def enclosing_select(self) -> Optional["Select"]:
+        """
+        The select whose tables a subquery in an expression (e.g. ``IN (SELECT ...)``)
+        can reference, if this is one
+        """
+        query = self.parent if isinstance(self.parent, Query) else None
+        if query is not None and (
+            query.in_from_or_lateral() or query.parent_key == "ctes"
+        ):
+            return None
+        return get_nearest_select(query or self)
+
     def add_set_op(self, set_op: SetOp):
         """
         Add a set op such as UNION, UNION ALL or INTERSECT
         """
-        self.set_op.append(set_op)
+        self.set_op = [*self.set_op, set_op]
 
-    def __str__(self) -> str:
-        parts = ["SELECT "]
+    def write_sql(self, out: SQLWriter):
+        # the whitespace of the default layout is that of the parts of a select
+        # joined with spaces
+        if self.parenthesized:
+            out.write("((" if self.set_op else "(")
+        out.write("SELECT")
         if self.quantifier:
-            parts.append(f"{self.quantifier}\n")
-        parts.append(",\n\t".join(str(exp) for exp in self.projection))
+            out.space("  ")
+            out.write(self.quantifier)
+        with out.indented():
+            out.newline("\n " if self.quantifier else "  ", compact=" ")
+            for i, expression in enumerate(self.projection):
+                if i:
+                    out.write(",")
+                    out.newline("\n\t")
+                expression.write_sql(out)
+        separator = " "
         if self.from_ is not None:
-            parts.extend(("\n", str(self.from_), "\n"))
+            out.newline(separator + "\n ")
+            self.from_.write_sql(out)
+            separator = " \n "
         for view in self.lateral_views:
-            parts.append(f"\n{view}")
+            out.newline(separator + "\n")
+            view.write_sql(out)
+            separator = " "
         if self.where is not None:
-            parts.extend(("WHERE ", str(self.where), "\n"))
+            out.newline(separator)
+            out.write("WHERE")
+            out.space("  ")
+            self.where.write_sql(out)
+            separator = " \n "
         if self.group_by:
-            parts.extend(("GROUP BY ", ", ".join(str(exp) for exp in self.group_by)))
+            out.newline(separator)
+            out.write("GROUP BY")
+            out.space("  ")
+            write_list(out, self.group_by)
+            separator = " "
         if self.having is not None:
-            parts.extend(("HAVING ", str(self.having), "\n"))
-        select = " ".join(parts).strip()
+            out.newline(separator)
+            out.write("HAVING")
+            out.space("  ")
+            self.having.write_sql(out)
+        out.rstrip()
 
         # Add set operations
         if self.set_op:
             if self.parenthesized:
-                select = f"({select})"  # Add additional parentheses inclusive of set operations
-            select += "\n" + "\n".join([str(so) for so in self.set_op])
-
+                out.write(")")
+            for set_op in self.set_op:
+                out.newline()
+                set_op.write_sql(out)
         if self.parenthesized:
-            select = f"({select})"
-
+            out.write(")")
         if self.alias:
-            as_ = " AS " if self.as_ else " "
-            return f"{select}{as_}{self.alias}"
-        return select
+            out.write(" AS " if self.as_ else " ")
+            self.alias.write_sql(out)
 
     @property
     def type(self) -> ColumnType:
@@ -2094,6 +2746,7 @@ class Select(SelectExpression):
         super().compile(ctx)
 
 
+@slotted
 @dataclass(eq=False)
 class SortItem(Node):
     """
@@ -2104,10 +2757,20 @@ class SortItem(Node):
     asc: str
     nulls: str
 
-    def __str__(self) -> str:
-        return f"{self.expr} {self.asc} {self.nulls}".strip()
+    def write_sql(self, out: SQLWriter):
+        self.expr.write_sql(out)
+        if not (self.asc or self.nulls):
+            out.rstrip()
+            return
+        out.space()
+        if self.asc:
+            out.write(self.asc)
+        if self.nulls:
+            out.space()
+            out.write(self.nulls)
 
 
+@slotted
 @dataclass(eq=False)
 class Organization(Node):
     """
@@ -2117,15 +2780,17 @@ class Organization(Node):
     order: List[SortItem]
     sort: List[SortItem]
 
-    def __str__(self) -> str:
-        ret = ""
-        ret += f"ORDER BY {', '.join(str(i) for i in self.order)}" if self.order else ""
-        if ret:
-            ret += "\n"
-        ret += f"SORT BY {', '.join(str(i) for i in self.sort)}" if self.sort else ""
-        return ret
+    def write_sql(self, out: SQLWriter):
+        if self.order:
+            out.write("ORDER BY ")
+            write_list(out, self.order)
+            out.newline()
+        if self.sort:
+            out.write("SORT BY ")
+            write_list(out, self.sort)
 
 
+@slotted
 @dataclass(eq=False)
 class Query(TableExpression):
     """
@@ -2138,18 +2803,18 @@ class Query(TableExpression):
     organization: Optional[Organization] = None
 
     def is_compiled(self) -> bool:
-        return not any(
-            self.filter(lambda node: node is not self and not node.is_compiled()),
-        )
+        return not self.uncompiled_descendants
 
     def compile(self, ctx: CompileContext):
-        self.apply(
-            lambda node: node is not self
-            and not node.is_compiled()
-            and node.compile(ctx),
-        )
-        for expr in self.select.projection:
-            self._columns += expr.columns
+        def compile_descendants(node: Node):
+            for child in node.children:
+                if not child.is_compiled():
+                    child.compile(ctx)
+                if child.uncompiled_descendants:
+                    compile_descendants(child)
+
+        compile_descendants(self)
+        self._columns = [col for expr in self.select.projection for col in expr.columns]
 
     def bake_ctes(self) -> "Query":
         """
@@ -2163,27 +2828,45 @@ class Query(TableExpression):
             self.replace(table, cte)
         return self
 
-    def __str__(self) -> str:
+    def write_sql(self, out: SQLWriter):
         is_cte = self.parent is not None and self.parent_key == "ctes"
-        ctes = ",\n".join(str(cte) for cte in self.ctes)
-        with_ = f"WITH\n{ctes}" if ctes else ""
-
-        parts = [f"{with_}{self.select}\n"]
+        if self.alias and is_cte:
+            self.alias.write_sql(out)
+            out.write(" AS " if self.as_ else " ")
+        if self.parenthesized:
+            out.write("(")
+            with out.indented():
+                out.newline("", compact="")
+                self._write_body(out)
+            out.newline("", compact="")
+            out.write(")")
+        else:
+            self._write_body(out)
+        if self.alias and not is_cte:
+            out.write(" AS " if self.as_ else " ")
+            self.alias.write_sql(out)
+
+    def _write_body(self, out: SQLWriter):
+        if self.ctes:
+            out.write("WITH")
+            with out.indented():
+                for i, cte in enumerate(self.ctes):
+                    if i:
+                        out.write(",")
+                    out.newline()
+                    cte.write_sql(out)
+            out.newline("")
+        self.select.write_sql(out)
+        out.newline()
         if self.organization:
-            parts.append(str(self.organization))
+            self.organization.write_sql(out)
         if self.limit is not None:
-            limit = f"LIMIT {self.limit}"
-            parts.append(limit)
-        query = "".join(parts)
-        if self.parenthesized:
-            query = f"({query})"
-        if self.alias:
-            as_ = " AS " if self.as_ else " "
-            if is_cte:
-                query = f"{self.alias}{as_}{query}"
-            else:
-                query = f"{query}{as_}{self.alias}"
-        return query
+            if self.organization and self.organization.sort:
+                # unlike the ORDER BY clause, the SORT BY clause doesn't end with a
+                # line break
+                out.newline()
+            out.write("LIMIT ")
+            self.limit.write_sql(out)
 
     def set_alias(self: TNode, alias: "Name") -> TNode:
         self.alias = alias
@@ -2241,3 +2924,78 @@ class Query(TableExpression):
             self.select.projection,
             key=lambda x: str(x.alias_or_name),
         )[:]
+
+
+def get_nearest_select(node: Node) -> Optional[Select]:
+    """
+    The select whose tables are in scope for the node: the nearest one above it, or
+    the select of the query if the node is elsewhere in the query (e.g. ORDER BY)
+    """
+    select = node.get_nearest_parent_of_type(Select)
+    query = node.get_nearest_parent_of_type(Query)
+    if query is not None and (select is None or query.depth > select.depth):
+        return cast(Select, query.select)
+    return select
+
+
+class Scope:
+    """
+    The tables in the FROM clause and lateral views of a select, which its columns
+    can reference, indexed by their alias or name
+    """
+
+    __slots__ = ("tables", "tables_by_name", "compiled")
+
+    def __init__(self, select: Select):
+        self.compiled = False
+        self.tables: List[TableExpression] = [
+            table
+            for table in self._table_expressions(select)
+            if table.in_from_or_lateral()
+        ]
+        self.tables_by_name: Dict[str, List[TableExpression]] = {}
+        for table in self.tables:
+            try:
+                name = table.alias_or_name.identifier(False)
+            except DJParseException:
+                continue
+            self.tables_by_name.setdefault(name, []).append(table)
+
+    @classmethod
+    def _table_expressions(cls, node: Node) -> Iterator[TableExpression]:
+        """
+        Table expressions in the sub-ast of ``node`` that belong to the same select,
+        i.e. not to subqueries
+        """
+        for child in node.children:
+            if TableExpression not in child.subtree_types:
+                continue
+            if isinstance(child, TableExpression):
+                yield child
+            if not isinstance(child, (Query, Select)):
+                yield from cls._table_expressions(child)
+
+    def find_table_sources(
+        self,
+        column: Column,
+        namespace: str,
+        ctx: CompileContext,
+    ) -> List[TableExpression]:
+        """
+        Find the tables in scope named ``namespace`` (or any table if it's empty)
+        that have the column
+        """
+        if not self.compiled:
+            for table in self.tables:
+                if not table.is_compiled():
+                    table.compile(ctx)
+            self.compiled = True
+        tables = self.tables_by_name.get(namespace, []) if namespace else self.tables
+        return [table for table in tables if table.add_ref_column(column, ctx)]
+
+
+# the types of ancestors that nodes cache the nearest of (see `Node.ancestry`)
+CACHED_ANCESTOR_TYPES: Tuple[Type[Node], ...] = (Select, Query, From, LateralView)
+_CACHED_ANCESTOR_INDEX = {
+    type_: index for index, type_ in enumerate(CACHED_ANCESTOR_TYPES, start=1)
+}
@@ -1,11 +1,24 @@
 # pylint: skip-file
 # mypy: ignore-errors
+import hashlib
+import hmac
 import inspect
 import logging
-from typing import TYPE_CHECKING, List, Optional, Tuple, Union, cast
+import multiprocessing
+import os
+import pickle
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union, cast
 
 import antlr4
-from antlr4 import InputStream, RecognitionException
+from antlr4 import InputStream, PredictionMode, RecognitionException
+from antlr4.dfa.DFA import DFA
 from antlr4.error.ErrorListener import ErrorListener
 from antlr4.error.Errors import ParseCancellationException
 from antlr4.error.ErrorStrategy import BailErrorStrategy
@@ -14,6 +27,7 @@ import dj.sql.parsing.types as ct
 from dj.sql.parsing import ast
 from dj.sql.parsing.ast import UnaryOpKind
 from dj.sql.parsing.backends.exceptions import DJParseException
+from dj.sql.parsing.backends.grammar.generated import SqlBaseParser as sql_base_parser
 from dj.sql.parsing.backends.grammar.generated.SqlBaseLexer import SqlBaseLexer
 from dj.sql.parsing.backends.grammar.generated.SqlBaseParser import SqlBaseParser
 from dj.sql.parsing.backends.grammar.generated.SqlBaseParser import SqlBaseParser as sbp
@@ -53,28 +67,26 @@ class ParseErrorListener(ErrorListener):
         raise SqlSyntaxError(f"Parse error {line}:{column}:", msg)
 
 
-class UpperCaseCharStream:
+class CaseInsensitiveInputStream(InputStream):
     """
     Make SQL token detection case insensitive and allow identifier without
-    backticks to be seen as e.g. column names
-    """
-
-    def __init__(self, wrapped):
-        self.wrapped = wrapped
+    backticks to be seen as e.g. column names.
 
-    def getText(self, interval, *args):  # pylint: disable=invalid-name
-        if args or (self.size() > 0 and (interval.b - interval.a >= 0)):
-            return self.wrapped.getText(interval, *args)
-        return ""
-
-    def LA(self, i: int):  # pylint: disable=invalid-name
-        token = self.wrapped.LA(i)
-        if token in (0, -1):
-            return token
-        return ord(chr(token).upper())
+    The lexer only ever looks at the code points in ``data``, so those are
+    upper-cased once up front, while ``getText`` keeps returning slices of the
+    original string so that identifiers and literals retain their case.
+    """
 
-    def __getattr__(self, item):
-        return getattr(self.wrapped, item)
+    def _loadString(self):
+        super()._loadString()
+        upper = self.strdata.upper()
+        if len(upper) == self._size:
+            self.data = [ord(char) for char in upper]
+        else:  # some characters (e.g. "ß") upper-case to more than one character
+            self.data = [
+                ord(upper_char) if len(upper_char := char.upper()) == 1 else ord(char)
+                for char in self.strdata
+            ]
 
 
 class ExplicitBailErrorStrategy(BailErrorStrategy):
@@ -95,9 +107,14 @@ class EarlyBailSqlLexer(SqlBaseLexer):
         raise SqlLexicalError from recognition_exc
 
 
-def build_parser(stream, strict_mode=False, early_bail=True):
-    if not strict_mode:
-        stream = UpperCaseCharStream(stream)
+def build_parser(
+    stream,
+    strict_mode=False,
+    early_bail=True,
+    prediction_mode=PredictionMode.LL,
+):
+    if not strict_mode and not isinstance(stream, CaseInsensitiveInputStream):
+        stream = CaseInsensitiveInputStream(str(stream))
     if early_bail:
         lexer = EarlyBailSqlLexer(stream)
     else:
@@ -111,6 +128,7 @@ def build_parser(stream, strict_mode=False, early_bail=True):
     parser.addErrorListener(ParseErrorListener())
     if early_bail:
         parser._errHandler = ExplicitBailErrorStrategy()
+    parser._interp.predictionMode = prediction_mode
     return parser
 
 
@@ -126,17 +144,182 @@ class SqlSyntaxError(SqlParsingError):
     pass
 
 
+# The ANTLR prediction caches (the DFAs and the parser's prediction context cache) are
+# shared by all lexer and parser instances and grow with every new query shape that
+# is parsed. They are cleared once they get larger than this, checked every
+# ``DFA_CACHE_CHECK_INTERVAL`` parses.
+MAX_DFA_STATES = 100_000
+MAX_PREDICTION_CONTEXTS = 500_000
+DFA_CACHE_CHECK_INTERVAL = 100
+
+
+def dfa_cache_size() -> Tuple[int, int]:
+    """
+    The number of cached DFA states and prediction contexts.
+    """
+    states = sum(
+        len(dfa._states)
+        for recognizer in (SqlBaseLexer, SqlBaseParser)
+        for dfa in recognizer.decisionsToDFA
+    )
+    return states, len(SqlBaseParser.sharedContextCache.cache)
+
+
+# Parsers read and extend the prediction caches while they parse, so the caches are
+# only cleared when no parser is using them. ``_active_parses`` counts the parses
+# that are running, and a clear requested while there are any is done by the last
+# one to finish.
+_dfa_cache_lock = threading.Lock()
+_active_parses = 0
+_dfa_cache_clear_pending = False
+
+
+def _clear_dfa_cache():
+    global _dfa_cache_clear_pending
+    for recognizer in (SqlBaseLexer, SqlBaseParser):
+        decisions = recognizer.decisionsToDFA
+        for decision, dfa in enumerate(decisions):
+            decisions[decision] = DFA(dfa.atnStartState, decision)
+    SqlBaseParser.sharedContextCache.cache.clear()
+    _dfa_cache_clear_pending = False
+
+
+def clear_dfa_cache():
+    """
+    Reset the prediction caches shared by all lexers and parsers, right away if no
+    parser is using them, or else as soon as the parses using them finish.
+    """
+    global _dfa_cache_clear_pending
+    with _dfa_cache_lock:
+        _dfa_cache_clear_pending = True
+        if not _active_parses:
+            _clear_dfa_cache()
+
+
+@contextmanager
+def using_dfa_cache():
+    """
+    Mark the prediction caches as in use by a parse for the duration of the block.
+    """
+    global _active_parses
+    with _dfa_cache_lock:
+        _active_parses += 1
+    try:
+        yield
+    finally:
+        with _dfa_cache_lock:
+            _active_parses -= 1
+            if _dfa_cache_clear_pending and not _active_parses:
+                _clear_dfa_cache()
+
+
+def reset_parser(parser, stream, prediction_mode):
+    """
+    Point a parser built by ``build_parser``, and its lexer, at new input. This
+    relies on internals of the ANTLR runtime (the lexer of the token stream and the
+    prediction simulator of the parser), so it returns False if the parser doesn't
+    have them, and a new parser is built instead.
+    """
+    token_stream = parser.getTokenStream()
+    lexer = getattr(token_stream, "tokenSource", None)
+    interpreter = getattr(parser, "_interp", None)
+    if not isinstance(lexer, SqlBaseLexer) or interpreter is None:
+        return False
+    lexer.inputStream = stream
+    token_stream.setTokenSource(lexer)
+    # ``Parser.reset`` fails if there are parse listeners (it tries to remove a trace
+    # listener that was never added), so detach them while resetting
+    listeners = list(parser.getParseListeners())
+    parser.removeParseListeners()
+    parser.setTokenStream(token_stream)
+    for listener in listeners:
+        parser.addParseListener(listener)
+    interpreter.predictionMode = prediction_mode
+    return True
+
+
+class ParserPool(threading.local):
+    """
+    Lexers and parsers are costly to set up, so each thread keeps an idle parser per
+    error handling configuration and points it at new input for every parse. If the
+    idle parser is already in use (a parse started while another one is running on
+    the same thread) a new one is built instead.
+    """
+
+    def __init__(self):
+        self.idle = {}
+        self.parses = 0
+
+    @contextmanager
+    def parser(
+        self,
+        string,
+        strict_mode=False,
+        early_bail=True,
+        prediction_mode=PredictionMode.LL,
+    ):
+        stream = (
+            InputStream(string) if strict_mode else CaseInsensitiveInputStream(string)
+        )
+        with using_dfa_cache():
+            parser = self.idle.pop(early_bail, None)
+            if parser is None or not reset_parser(parser, stream, prediction_mode):
+                parser = build_parser(stream, strict_mode, early_bail, prediction_mode)
+            try:
+                yield parser
+            finally:
+                self.idle[early_bail] = parser
+                self.parses += 1
+                if self.parses % DFA_CACHE_CHECK_INTERVAL == 0:
+                    states, contexts = dfa_cache_size()
+                    if states > MAX_DFA_STATES or contexts > MAX_PREDICTION_CONTEXTS:
+                        clear_dfa_cache()
+
+
+parser_pool = ParserPool()
+
+# Number of parses that succeeded with each prediction mode
+prediction_mode_counter: Counter = Counter()
+
+
 def string_to_ast(string, rule, *, strict_mode=False, debug=False, early_bail=False):
-    parser = build_string_parser(string, strict_mode, early_bail)
-    tree = getattr(parser, rule)()
+    """
+    Parse a string with the two-stage strategy recommended for ANTLR grammars: try
+    the much faster SLL prediction first, bailing out on the first error, and only
+    re-parse with full LL prediction if that fails. SLL can reject valid input but
+    never produces a wrong tree, so errors are always reported by the LL parse.
+    """
+    with parser_pool.parser(
+        string,
+        strict_mode,
+        early_bail=True,
+        prediction_mode=PredictionMode.SLL,
+    ) as parser:
+        try:
+            tree = getattr(parser, rule)()
+        except (SqlParsingError, ParseCancellationException):
+            tree = None
+        else:
+            prediction_mode_counter["SLL"] += 1
+    if tree is None:
+        with parser_pool.parser(string, strict_mode, early_bail) as parser:
+            tree = getattr(parser, rule)()
+        prediction_mode_counter["LL"] += 1
     if debug:
         print_tree(tree, printer=logger.warning)
     return tree
 
 
-def build_string_parser(string, strict_mode=False, early_bail=True):
-    string_as_stream = InputStream(string)
-    parser = build_parser(string_as_stream, strict_mode, early_bail)
+def build_string_parser(
+    string,
+    strict_mode=False,
+    early_bail=True,
+    prediction_mode=PredictionMode.LL,
+):
+    string_as_stream = (
+        InputStream(string) if strict_mode else CaseInsensitiveInputStream(string)
+    )
+    parser = build_parser(string_as_stream, strict_mode, early_bail, prediction_mode)
     return parser
 
 
@@ -173,18 +356,322 @@ def parse_rule(sql: str, rule: str) -> Union[ast.Node, "ColumnType"]:
     return ast_tree
 
 
+# String literals, quoted identifiers and comments are kept as-is when normalizing
+# a query; any other run of whitespace is collapsed to a single space
+SQL_WHITESPACE_REGEX = re.compile(
+    r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`|--[^\n]*\n?|/\*.*?\*/)|\s+""",
+    re.DOTALL,
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Collapse insignificant whitespace in a query so that formatting-only differences
+    share a parse cache entry.
+    """
+    return SQL_WHITESPACE_REGEX.sub(
+        lambda match: match.group(1) or " ",
+        sql,
+    ).strip()
+
+
+class ParseCache:
+    """
+    A bounded LRU cache of parsed queries keyed by a hash of the normalized SQL.
+
+    The cache is bounded both by the number of entries and by the total length of
+    the cached SQL, which is a reasonable proxy for the size of the parsed trees.
+    Cached trees are never handed out: every lookup returns a private copy so that
+    callers are free to mutate it.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_size: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[ast.Query, int]]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(sql: str) -> str:
+        return hashlib.blake2b(
+            normalize_sql(sql).encode("utf-8"),
+            digest_size=16,
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[ast.Query]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry[0].copy()
+
+    def put(self, key: str, query: ast.Query, size: int):
+        if size > self.max_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (query, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size": self.size,
+                "max_entries": self.max_entries,
+                "max_size": self.max_size,
+            }
+
+
+parse_cache = ParseCache()
+
+
 def parse(sql: Optional[str]) -> ast.Query:
     """
-    Parse a string sql query into a DJ ast Query
+    Parse a string sql query into a DJ ast Query.
+
+    Parsed queries are cached in ``parse_cache``; the returned tree is always a
+    private copy that the caller may modify.
+    """
+    return load_or_parse(sql)
+
+
+def _parser_version() -> bytes:
+    """
+    A fingerprint of the grammar and of the code that turns its parse trees into DJ
+    ASTs, so that serialized ASTs can be discarded when either changes.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for path in (sql_base_parser.__file__, __file__, ast.__file__, ct.__file__):
+        with open(path, "rb") as source:
+            digest.update(source.read())
+    return digest.digest()
+
+
+PARSER_VERSION = _parser_version()
+
+
+def _query_ast_header(sql: str) -> bytes:
+    return PARSER_VERSION + hashlib.blake2b(sql.encode("utf-8"), digest_size=8).digest()
+
+
+def _query_ast_mac(secret: str, header: bytes, payload: bytes) -> bytes:
+    return hmac.new(secret.encode("utf-8"), header + payload, hashlib.sha256).digest()
+
+
+def dump_query_ast(query: ast.Query, sql: str, secret: str) -> bytes:
+    """
+    Serialize a parsed (not yet compiled) query into a compact blob. The blob is
+    stamped with the parser version and a digest of the SQL it was parsed from, and
+    signed with the secret, since loading it unpickles it.
+    """
+    header = _query_ast_header(sql)
+    payload = zlib.compress(pickle.dumps(query, protocol=pickle.HIGHEST_PROTOCOL))
+    return header + _query_ast_mac(secret, header, payload) + payload
+
+
+def _query_ast_payload(blob: Optional[bytes], sql: str, secret: str) -> Optional[bytes]:
+    """
+    The serialized query in a blob, if the blob was built from this SQL by the
+    current parser and signed with the secret.
+    """
+    header = _query_ast_header(sql)
+    if not blob or not blob.startswith(header):
+        return None
+    mac = blob[len(header) : len(header) + hashlib.sha256().digest_size]
+    payload = blob[len(header) + len(mac) :]
+    if not hmac.compare_digest(mac, _query_ast_mac(secret, header, payload)):
+        return None
+    return payload
+
+
+def is_query_ast_current(blob: Optional[bytes], sql: str, secret: str) -> bool:
+    """
+    Whether a blob was built from this SQL by the current parser, and signed with
+    the secret.
+    """
+    return _query_ast_payload(blob, sql, secret) is not None
+
+
+def load_query_ast(
+    blob: Optional[bytes],
+    sql: str,
+    secret: str,
+) -> Optional[ast.Query]:
+    """
+    Load a query serialized with ``dump_query_ast``, or return None if the blob is
+    missing, stale or not signed with the secret.
+    """
+    payload = _query_ast_payload(blob, sql, secret)
+    if payload is None:
+        return None
+    try:
+        return pickle.loads(zlib.decompress(payload))
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Could not load serialized query AST", exc_info=True)
+        return None
+
+
+def load_or_parse(
+    sql: Optional[str],
+    blob: Optional[bytes] = None,
+    secret: Optional[str] = None,
+) -> ast.Query:
+    """
+    Parse a string sql query into a DJ ast Query, using the query serialized in the
+    blob with ``dump_query_ast`` if there is one.
+
+    ``parse_cache`` is checked first, since copying a cached tree is cheaper than
+    loading a serialized one. On a miss the blob is loaded if it is current and
+    signed with the secret, and the query is parsed otherwise; either way the tree
+    is added to the cache. The returned tree is always a private copy.
     """
     if not sql:
         raise DJParseException("Empty query provided!")
-    return cast(ast.Query, parse_rule(sql, "singleStatement"))
+    key = parse_cache.key(sql)
+    query = parse_cache.get(key)
+    if query is None:
+        query = load_query_ast(blob, sql, secret) if secret else None
+        if query is None:
+            query = cast(ast.Query, parse_rule(sql, "singleStatement"))
+        parse_cache.put(key, query.copy(), len(sql))
+    return query
+
+
+# Batches with fewer uncached queries than this are parsed in the calling process:
+# for them, starting the workers and shipping the trees back costs more than it saves
+PARSE_MANY_MIN_BATCH_SIZE = 32
+
+_parse_executor: Optional[ProcessPoolExecutor] = None
+_parse_executor_lock = threading.Lock()
+
+
+def get_parse_executor(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    The process pool used by ``parse_many``, created on first use. Workers are
+    spawned rather than forked, since the server process may be running threads.
+    """
+    global _parse_executor
+    with _parse_executor_lock:
+        if _parse_executor is None:
+            _parse_executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_executor
+
+
+def shutdown_parse_executor():
+    """
+    Stop the ``parse_many`` worker processes.
+    """
+    global _parse_executor
+    with _parse_executor_lock:
+        if _parse_executor is not None:
+            _parse_executor.shutdown(cancel_futures=True)
+            _parse_executor = None
+
+
+def _parse_or_error(sql: str) -> Union[ast.Query, Exception]:
+    try:
+        return cast(ast.Query, parse_rule(sql, "singleStatement"))
+    except Exception as exc:  # pylint: disable=broad-except
+        return exc
+
+
+def parse_many(
+    queries: Iterable[Optional[str]],
+    max_workers: Optional[int] = None,
+) -> List[Union[ast.Query, Exception]]:
+    """
+    Parse a batch of queries, returning for each one either its DJ ast Query or the
+    exception raised while parsing it.
+
+    Queries that are already in ``parse_cache`` are served from it. The rest are
+    spread across a pool of worker processes, unless there are too few of them to
+    be worth it (or only one CPU), in which case they are parsed sequentially.
+    Either way the results are added to the cache and, as with ``parse``, every
+    returned tree is a private copy.
+    """
+    queries = list(queries)
+    results: List[Union[ast.Query, Exception, None]] = [None] * len(queries)
+    pending: Dict[str, List[int]] = {}
+    for index, sql in enumerate(queries):
+        if not sql:
+            results[index] = DJParseException("Empty query provided!")
+            continue
+        key = parse_cache.key(sql)
+        if (query := parse_cache.get(key)) is not None:
+            results[index] = query
+        else:
+            pending.setdefault(key, []).append(index)
+
+    to_parse = [queries[indexes[0]] for indexes in pending.values()]
+    workers = max_workers or os.cpu_count() or 1
+    parsed: Optional[List[Union[ast.Query, Exception]]] = None
+    if len(to_parse) >= PARSE_MANY_MIN_BATCH_SIZE and workers > 1:
+        try:
+            parsed = list(
+                get_parse_executor(workers).map(
+                    _parse_or_error,
+                    to_parse,
+                    chunksize=max(1, len(to_parse) // (workers * 4)),
+                ),
+            )
+        except BrokenProcessPool:  # pragma: no cover
+            logger.exception("Parser worker died, parsing sequentially instead")
+            shutdown_parse_executor()
+    if parsed is None:
+        parsed = [_parse_or_error(sql) for sql in to_parse]
+
+    for (key, indexes), sql, result in zip(pending.items(), to_parse, parsed):
+        if isinstance(result, ast.Query):
+            parse_cache.put(key, result.copy(), len(sql))
+        for position, index in enumerate(indexes):
+            results[index] = (
+                result.copy() if position and isinstance(result, ast.Query) else result
+            )
+    return cast(List[Union[ast.Query, Exception]], results)
 
 
 TERMINAL_NODE = antlr4.tree.Tree.TerminalNodeImpl
 
 
+def is_parenthesized(ctx) -> bool:
+    """
+    Whether a context starts with ``(`` and ends with ``)``
+    """
+    start, stop = ctx.start, ctx.stop
+    return (
+        start is not None
+        and stop is not None
+        and start.tokenIndex < stop.tokenIndex
+        and start.type == sbp.LEFT_PAREN
+        and stop.type == sbp.RIGHT_PAREN
+    )
+
+
 class Visitor:
     def __init__(self):
         self.registry = {}
@@ -217,21 +704,16 @@ class Visitor:
         if result is None:
             line, col = ctx.start.line, ctx.start.column
             raise DJParseException(f"{line}:{col} Could not parse {ctx.getText()}")
+        # Parentheses and ``AS`` are detected from the tokens bounding the context
+        # rather than its text: ``getText`` concatenates the whole subtree, which
+        # makes converting deeply nested expressions quadratic
         if (
-            hasattr(result, "parenthesized")
-            and result.parenthesized is None
+            getattr(result, "parenthesized", False) is None
             and hasattr(ctx, "LEFT_PAREN")
+            and is_parenthesized(ctx)
         ):
-            if text := ctx.getText():
-                text = text.strip()
-                if (text[0] == "(") and (text[-1] == ")"):
-                    result.parenthesized = True
-        if (
-            hasattr(ctx, "AS")
-            and ctx.AS()
-            and hasattr(result, "as_")
-            and result.as_ is None
-        ):
+            result.parenthesized = True
+        if getattr(result, "as_", False) is None and hasattr(ctx, "AS") and ctx.AS():
             result = result.set_as(True)
         return result
 
@@ -447,7 +929,7 @@ def _(ctx: sbp.RegularQuerySpecificationContext):
     )
     if from_ and from_.laterals:
         select.lateral_views += from_.laterals
-        del from_.laterals
+        from_.laterals = []
     return select
 
 
@@ -778,9 +1260,7 @@ def _(ctx: sbp.FromClauseContext):
     laterals = visit(ctx.lateralView())
     if ctx.pivotClause() or ctx.unpivotClause():
         return
-    from_ = ast.From(relations)
-    from_.laterals = laterals
-    return from_
+    return ast.From(relations, laterals=laterals)
 
 
 @visit.register
@@ -0,0 +1,234 @@
+"""
+Code generation of SQL from DJ ASTs.
+
+Nodes write their SQL as tokens to a single ``SQLWriter`` in one traversal of the
+tree, instead of each level building and joining the strings of its children. The
+writer owns everything that varies between outputs: the quoting of identifiers and
+the names of types for each ``Dialect``, and the whitespace of each ``SQLLayout``.
+"""
+from contextlib import contextmanager
+from enum import Enum
+from typing import Dict, Iterator, List, Optional, Type
+
+from dj.models.engine import Dialect
+from dj.sql.parsing.types import (
+    BigIntType,
+    BinaryType,
+    BooleanType,
+    ColumnType,
+    DateType,
+    DecimalType,
+    DoubleType,
+    FloatType,
+    IntegerType,
+    ListType,
+    LongType,
+    MapType,
+    SmallIntType,
+    StringType,
+    StructType,
+    TimestampType,
+    TimestamptzType,
+    TimeType,
+    TinyIntType,
+    VarcharType,
+)
+
+
+class SQLLayout(str, Enum):
+    """
+    The whitespace of generated SQL
+    """
+
+    # the layout SQL has always been generated with
+    DEFAULT = "default"
+    # everything on a single line
+    COMPACT = "compact"
+    # one clause per line, with nested queries and projections indented
+    PRETTY = "pretty"
+
+
+# the quote character for quoted identifiers in each dialect
+IDENTIFIER_QUOTES: Dict[Dialect, str] = {
+    Dialect.SPARK: "`",
+    Dialect.TRINO: '"',
+    Dialect.DRUID: '"',
+}
+
+# the names of primitive types in each dialect, where they differ from the DJ names
+TYPE_NAMES: Dict[Dialect, Dict[Type[ColumnType], str]] = {
+    Dialect.TRINO: {
+        StringType: "VARCHAR",
+        VarcharType: "VARCHAR",
+        TinyIntType: "TINYINT",
+        SmallIntType: "SMALLINT",
+        IntegerType: "INTEGER",
+        BigIntType: "BIGINT",
+        LongType: "BIGINT",
+        FloatType: "REAL",
+        DoubleType: "DOUBLE",
+        BooleanType: "BOOLEAN",
+        DateType: "DATE",
+        TimeType: "TIME",
+        TimestampType: "TIMESTAMP",
+        TimestamptzType: "TIMESTAMP WITH TIME ZONE",
+        BinaryType: "VARBINARY",
+    },
+    Dialect.DRUID: {
+        StringType: "VARCHAR",
+        VarcharType: "VARCHAR",
+        TinyIntType: "BIGINT",
+        SmallIntType: "BIGINT",
+        IntegerType: "BIGINT",
+        BigIntType: "BIGINT",
+        LongType: "BIGINT",
+        FloatType: "FLOAT",
+        DoubleType: "DOUBLE",
+        BooleanType: "BOOLEAN",
+        DateType: "DATE",
+        TimestampType: "TIMESTAMP",
+        TimestamptzType: "TIMESTAMP",
+    },
+}
+
+# tokens that attach to the preceding token without a space
+_CLOSING = frozenset(",)]")
+
+
+class SQLWriter:
+    """
+    Collects the tokens of generated SQL.
+
+    Nodes write their tokens with ``write``, and the whitespace between them with
+    ``space`` and ``newline``, which take the whitespace of the default layout. The
+    compact and pretty layouts hold whitespace back until the next token is written,
+    so that runs of whitespace collapse and whitespace before closing tokens and at
+    the end of the SQL is dropped.
+    """
+
+    def __init__(
+        self,
+        dialect: Optional[Dialect] = None,
+        layout: SQLLayout = SQLLayout.DEFAULT,
+    ):
+        self.dialect = dialect
+        self.layout = layout
+        self._tokens: List[str] = []
+        self._pending = ""
+        self._depth = 0
+
+    def write(self, text: str):
+        """
+        Write a token. Whitespace is only held back in the layouts other than the
+        default, so in the default layout this just appends the token.
+        """
+        if self._pending:
+            if self._tokens and not text[:1].isspace():
+                if self._pending != " " or text[:1] not in _CLOSING:
+                    self._tokens.append(self._pending)
+            self._pending = ""
+        self._tokens.append(text)
+
+    def space(self, default: str = " "):
+        """
+        Whitespace between tokens on the same line. The layouts other than the
+        default collapse it to a single space, which is dropped after an opening
+        parenthesis.
+        """
+        if self.layout == SQLLayout.DEFAULT:
+            self._tokens.append(default)
+        elif not self._pending and self._tokens:
+            last = self._tokens[-1][-1:]
+            if last not in ("(", "[", "") and not last.isspace():
+                self._pending = " "
+
+    def newline(self, default: str = "\n", compact: str = " "):
+        """
+        A line break, which the compact layout replaces with ``compact`` and the
+        pretty layout with a new line at the current indentation
+        """
+        if self.layout == SQLLayout.DEFAULT:
+            self._tokens.append(default)
+        elif self.layout == SQLLayout.COMPACT:
+            self._pending = ""
+            if compact:
+                self.space()
+        else:
+            self._pending = "\n" + "    " * self._depth
+
+    @contextmanager
+    def indented(self) -> Iterator["SQLWriter"]:
+        """
+        Indent the lines written in the block in the pretty layout
+        """
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+
+    def rstrip(self):
+        """
+        Remove the whitespace at the end of the SQL written so far
+        """
+        self._pending = ""
+        tokens = self._tokens
+        while tokens:
+            stripped = tokens[-1].rstrip()
+            if stripped:
+                tokens[-1] = stripped
+                return
+            tokens.pop()
+
+    def identifier(self, name: str, quote_style: str = "") -> str:
+        """
+        An identifier, quoted the way the dialect quotes identifiers if it was
+        quoted in the original SQL
+        """
+        if quote_style:
+            quote_style = IDENTIFIER_QUOTES.get(self.dialect, quote_style)  # type: ignore
+        return f"{quote_style}{name}{quote_style}"
+
+    def type_name(self, type_: ColumnType) -> str:
+        """
+        The name of a type in the dialect
+        """
+        name = TYPE_NAMES.get(self.dialect, {}).get(type(type_))  # type: ignore
+        if name is not None:
+            return name
+        if self.dialect == Dialect.TRINO:
+            if isinstance(type_, ListType):
+                return f"ARRAY({self.type_name(type_.element.type)})"
+            if isinstance(type_, MapType):
+                return (
+                    f"MAP({self.type_name(type_.key.type)}, "
+                    f"{self.type_name(type_.value.type)})"
+                )
+            if isinstance(type_, StructType):
+                fields = ", ".join(
+                    f"{field.name.name} {self.type_name(field.type)}"
+                    for field in type_.fields
+                )
+                return f"ROW({fields})"
+        if self.dialect == Dialect.DRUID and isinstance(type_, DecimalType):
+            return "DECIMAL"
+        return str(type_).upper()
+
+    def getvalue(self) -> str:
+        """
+        The SQL written
+        """
+        return "".join(self._tokens)
+
+
+def render(
+    node,
+    dialect: Optional[Dialect] = None,
+    layout: SQLLayout = SQLLayout.DEFAULT,
+) -> str:
+    """
+    Generate the SQL of an AST node
+    """
+    out = SQLWriter(dialect, layout)
+    node.write_sql(out)
+    return out.getvalue()
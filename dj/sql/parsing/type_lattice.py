@@ -0,0 +1,93 @@
+"""
+The lattice of column types: which types are compatible, and the type of the
+result of arithmetic between two types.
+
+Both are looked up in tables computed once for the primitive types, rather than
+worked out from the class hierarchy for every expression that is type checked.
+Nested types fall back to the class hierarchy.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from dj.sql.parsing.types import (
+    TYPE_COMPATIBILITY,
+    BigIntType,
+    ColumnType,
+    DoubleType,
+    FloatType,
+    IntegerType,
+    PrimitiveType,
+    Singleton,
+    has_common_ancestor,
+)
+
+
+def _subclasses(cls: type) -> List[type]:
+    """
+    All subclasses of `cls`
+    """
+    return [
+        subclass
+        for direct in cls.__subclasses__()
+        for subclass in (direct, *_subclasses(direct))
+    ]
+
+
+# The compatibility of all pairs of primitive types is computed once, so only the
+# pairs involving nested types are filled in on first use
+TYPE_COMPATIBILITY.update(
+    {
+        (type1, type2): has_common_ancestor(type1, type2)
+        for type1 in _subclasses(PrimitiveType)
+        for type2 in _subclasses(PrimitiveType)
+    },
+)
+
+# The numeric types that arithmetic promotes to the wider of, narrowest first
+NUMERIC_PROMOTION_ORDER: Tuple[ColumnType, ...] = (
+    IntegerType(),
+    BigIntType(),
+    FloatType(),
+    DoubleType(),
+)
+
+
+def _promote(left: ColumnType, right: ColumnType) -> Optional[ColumnType]:
+    """
+    Work out the result type of arithmetic between values of the two types
+    """
+    if not left.is_compatible(right):
+        return None
+    if left in NUMERIC_PROMOTION_ORDER and right in NUMERIC_PROMOTION_ORDER:
+        return max(left, right, key=NUMERIC_PROMOTION_ORDER.index)
+    return left
+
+
+# The primitive types that don't take parameters
+_SINGLETON_TYPES = [cls() for cls in _subclasses(Singleton) if "__init__" in vars(cls)]
+
+# The result types of arithmetic between pairs of primitive types, or None if the
+# types are not compatible
+TYPE_PROMOTIONS: Dict[Tuple[ColumnType, ColumnType], Optional[ColumnType]] = {
+    (left, right): _promote(left, right)
+    for left in _SINGLETON_TYPES
+    for right in _SINGLETON_TYPES
+}
+
+
+def promote_types(left: ColumnType, right: ColumnType) -> Optional[ColumnType]:
+    """
+    The type of the result of arithmetic between values of the two types, or None
+    if the types are not compatible.
+
+    Example:
+        >>> promote_types(IntegerType(), DoubleType())
+        DoubleType()
+        >>> promote_types(StringType(), IntegerType()) is None
+        True
+    """
+    try:
+        return TYPE_PROMOTIONS[left, right]
+    except KeyError:
+        # parametrized and nested types keep the type of the left operand
+        return _promote(left, right)
@@ -0,0 +1,200 @@
+"""
+A fast parser for column type strings.
+
+Column types are stored as the strings that ``str(ColumnType)`` renders, and are
+parsed again every time they are loaded. This parses those strings without going
+through the ANTLR grammar, and interns the results.
+"""
+
+import re
+from functools import lru_cache
+from typing import List, Optional, cast
+
+from dj.sql.parsing.types import (
+    PRIMITIVE_TYPES,
+    ColumnType,
+    DecimalType,
+    FixedType,
+    ListType,
+    MapType,
+    NestedField,
+    StructType,
+)
+
+TYPE_TOKEN_REGEX = re.compile(
+    r"\s*(?:(?P<quoted>`[^`]*`)|(?P<word>[A-Za-z_][A-Za-z0-9_]*)"
+    r"|(?P<number>\d+)|(?P<symbol><>|[<>(),:]))",
+)
+
+
+class UnsupportedTypeString(Exception):
+    """
+    Raised when a type string is not handled by the fast type string parser
+    """
+
+
+class TypeStringParser:
+    """
+    A small recursive descent parser for the column type strings produced by
+    ``str(ColumnType)``: primitives, decimal(p, s), fixed(n), array<>, map<> and
+    struct<>. Anything else (intervals, comments, etc.) is left to the ANTLR parser.
+
+    Example:
+        >>> TypeStringParser("map<string, array<decimal(10, 2)>>").parse()
+        map<string, array<decimal(10, 2)>>
+    """
+
+    def __init__(self, type_string: str):
+        self.tokens = self.tokenize(type_string)
+        self.position = 0
+
+    @staticmethod
+    def tokenize(type_string: str) -> List[str]:
+        """
+        Split the type string into tokens
+        """
+        tokens = []
+        type_string = type_string.rstrip()
+        position = 0
+        while position < len(type_string):
+            match = TYPE_TOKEN_REGEX.match(type_string, position)
+            if not match:
+                raise UnsupportedTypeString(type_string)
+            tokens.append(cast(str, match.group(match.lastgroup)))
+            position = match.end()
+        return tokens
+
+    def peek(self) -> Optional[str]:
+        """
+        The next token, if there is one
+        """
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def next(self) -> str:
+        """
+        Consume the next token
+        """
+        token = self.peek()
+        if token is None:
+            raise UnsupportedTypeString("Unexpected end of type string")
+        self.position += 1
+        return token
+
+    def expect(self, expected: str) -> None:
+        """
+        Consume the next token, which must be `expected`
+        """
+        if self.next() != expected:
+            raise UnsupportedTypeString(f"Expected `{expected}`")
+
+    def number(self) -> int:
+        """
+        Consume an integer token
+        """
+        token = self.next()
+        if not token.isdigit():
+            raise UnsupportedTypeString(f"Expected a number, got `{token}`")
+        return int(token)
+
+    def parse(self) -> ColumnType:
+        """
+        Parse the full type string
+        """
+        column_type = self.parse_type()
+        if self.peek() is not None:
+            raise UnsupportedTypeString(f"Unexpected token `{self.peek()}`")
+        return column_type
+
+    def parse_type(self) -> ColumnType:  # pylint: disable=too-many-return-statements
+        """
+        Parse a single (possibly nested) type
+        """
+        keyword = self.next().lower()
+        if keyword == "array":
+            self.expect("<")
+            element_type = self.parse_type()
+            self.expect(">")
+            return ListType(element_type)
+        if keyword == "map":
+            self.expect("<")
+            key_type = self.parse_type()
+            self.expect(",")
+            value_type = self.parse_type()
+            self.expect(">")
+            return MapType(key_type, value_type)
+        if keyword == "struct":
+            return self.parse_struct()
+        if keyword == "decimal" and self.peek() == "(":
+            self.expect("(")
+            precision = self.number()
+            self.expect(",")
+            scale = self.number()
+            self.expect(")")
+            return DecimalType(precision, scale)
+        if keyword == "fixed" and self.peek() == "(":
+            self.expect("(")
+            length = self.number()
+            self.expect(")")
+            return FixedType(length)
+        if keyword in PRIMITIVE_TYPES:
+            return PRIMITIVE_TYPES[keyword]
+        raise UnsupportedTypeString(f"Unsupported type `{keyword}`")
+
+    def parse_struct(self) -> "StructType":
+        """
+        Parse the fields of a struct type
+        """
+        from dj.sql.parsing.ast import Name  # pylint: disable=import-outside-toplevel
+
+        if self.peek() == "<>":
+            self.next()
+            return StructType()
+        self.expect("<")
+        fields = []
+        while self.peek() != ">":
+            token = self.next()
+            if token.startswith("`"):
+                name = Name(token[1:-1], quote_style="`")
+            elif token[0].isalpha() or token[0] == "_":
+                name = Name(token)
+            else:
+                raise UnsupportedTypeString(f"Invalid field name `{token}`")
+            if self.peek() == ":":
+                self.next()
+            field_type = self.parse_type()
+            is_optional = True
+            if (self.peek() or "").upper() == "NOT":
+                self.next()
+                if self.next().upper() != "NULL":
+                    raise UnsupportedTypeString("Expected `NULL`")
+                is_optional = False
+            fields.append(NestedField(name, field_type, is_optional))
+            if self.peek() != ">":
+                self.expect(",")
+        self.expect(">")
+        return StructType(*fields)
+
+
+@lru_cache(maxsize=4096)
+def parse_column_type(type_string: str) -> ColumnType:
+    """
+    Parse a column type string into a ``ColumnType``.
+
+    Results are interned, so the same type string always returns the same
+    instance. Type strings that the fast parser doesn't handle are parsed
+    with the ANTLR backend instead.
+
+    Example:
+        >>> parse_column_type("int") is parse_column_type("int")
+        True
+    """
+    try:
+        return TypeStringParser(type_string).parse()
+    except UnsupportedTypeString:
+        from dj.sql.parsing.backends.antlr4 import (  # pylint: disable=import-outside-toplevel
+            parse_rule,
+        )
+
+        return cast(ColumnType, parse_rule(type_string, "dataType"))
@@ -14,7 +14,7 @@ field_type=IntegerType(), is_optional=True, doc='an optional field'))
 
 import re
 from enum import Enum
-from typing import TYPE_CHECKING, Any, ClassVar, Dict, Generator, Optional, Tuple, cast
+from typing import TYPE_CHECKING, Any, ClassVar, Dict, Generator, Optional, Tuple
 
 from pydantic import BaseModel, Extra
 from pydantic.class_validators import AnyCallable
@@ -43,6 +43,9 @@ class Singleton:  # pylint: disable=too-few-public-methods
 class ColumnType(BaseModel):
     """
     Base type for all Column Types
+
+    Types are hash-consed: constructing a type returns the canonical instance for its
+    arguments, so types are equal only if they are the same instance.
     """
 
     _initialized = False
@@ -59,6 +62,8 @@ class ColumnType(BaseModel):
         *args,
         **kwargs,
     ):
+        if self._initialized:
+            return
         super().__init__(*args, **kwargs)
         self._type_string = type_string
         self._repr_string = repr_string if repr_string else self._type_string
@@ -73,6 +78,13 @@ class ColumnType(BaseModel):
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        # Types are interned, so they are unpickled through their constructors
+        return type(self), self.__getnewargs__()
+
+    def __getnewargs__(self) -> tuple:
+        return ()
+
     @classmethod
     def __get_validators__(cls) -> Generator[AnyCallable, None, None]:
         """
@@ -90,56 +102,67 @@ class ColumnType(BaseModel):
         """
         Parses the column type
         """
-        from dj.sql.parsing.backends.antlr4 import (  # pylint: disable=import-outside-toplevel
-            parse_rule,
+        from dj.sql.parsing.type_parser import (  # pylint: disable=C0415,R0401
+            parse_column_type,
         )
 
-        return cast(ColumnType, parse_rule(str(v), "dataType"))
+        if isinstance(v, ColumnType):
+            return v
+        return parse_column_type(str(v))
 
     def __eq__(self, other: "ColumnType"):  # type: ignore
         """
-        Equality is dependent on the string representation of the column type.
+        Types are interned, so equal types are the same instance.
         """
-        return str(other) == str(self)
+        return self is other
 
     def __hash__(self):
         """
-        Equality is dependent on the string representation of the column type.
+        Types are interned, so they are hashed by identity.
         """
-        return hash(str(self))
+        return id(self)
 
     def is_compatible(self, other: "ColumnType") -> bool:
         """
-        Returns whether the two types are compatible with each other by
-        checking their ancestors.
+        Returns whether the two types are compatible with each other, which is
+        whether their classes have a common ancestor (see `TYPE_COMPATIBILITY`).
         """
-        if self == other:
+        if self is other:
             return True  # quick return
+        key = (self.__class__, other.__class__)
+        compatible = TYPE_COMPATIBILITY.get(key)
+        if compatible is None:
+            # nested types, or types defined after the table was filled in
+            compatible = TYPE_COMPATIBILITY[key] = has_common_ancestor(*key)
+        return compatible
+
+
+def has_common_ancestor(type1: type, type2: type) -> bool:
+    """
+    Helper function to check whether two column types have common ancestors,
+    other than the highest-level ancestor types like ColumnType itself. This
+    determines whether they're part of the same type group and are compatible
+    with each other when performing type compatibility checks.
+    """
+    base_types = (ColumnType, Singleton, PrimitiveType)
+    if type1 in base_types or type2 in base_types:
+        return False
+    if type1 == type2:
+        return True
+    current_has = False
+    for ancestor in type1.__bases__:
+        for ancestor2 in type2.__bases__:
+            current_has = current_has or has_common_ancestor(
+                ancestor,
+                ancestor2,
+            )
+            if current_has:
+                return current_has
+    return False
 
-        def has_common_ancestor(type1, type2) -> bool:
-            """
-            Helper function to check whether two column types have common ancestors,
-            other than the highest-level ancestor types like ColumnType itself. This
-            determines whether they're part of the same type group and are compatible
-            with each other when performing type compatibility checks.
-            """
-            base_types = (ColumnType, Singleton, PrimitiveType)
-            if type1 in base_types or type2 in base_types:
-                return False
-            if type1 == type2:
-                return True
-            current_has = False
-            for ancestor in type1.__bases__:
-                for ancestor2 in type2.__bases__:
-                    current_has = current_has or has_common_ancestor(
-                        ancestor,
-                        ancestor2,
-                    )
-                    if current_has:
-                        return current_has
-            return False
-
-        return has_common_ancestor(self.__class__, other.__class__)
+
+# Whether the types of pairs of classes are compatible, see `ColumnType.is_compatible`
+TYPE_COMPATIBILITY: Dict[Tuple[type, type], bool] = {}
 
 
 class PrimitiveType(ColumnType):  # pylint: disable=too-few-public-methods
@@ -183,6 +206,9 @@ class FixedType(PrimitiveType):
             super().__init__(f"fixed({length})", f"FixedType(length={length})")
             self._length = length
 
+    def __getnewargs__(self) -> tuple:
+        return (self._length,)
+
     @property
     def length(self) -> int:  # pragma: no cover
         """
@@ -216,12 +242,17 @@ class DecimalType(NumberType):
     def __init__(self, precision: int, scale: int):
 
         if not self._initialized:
+            precision = min(precision, DecimalType.max_precision)
+            scale = min(scale, DecimalType.max_scale)
             super().__init__(
                 f"decimal({precision}, {scale})",
                 f"DecimalType(precision={precision}, scale={scale})",
             )
-            self._precision = min(precision, DecimalType.max_precision)
-            self._scale = min(scale, DecimalType.max_scale)
+            self._precision = precision
+            self._scale = scale
+
+    def __getnewargs__(self) -> tuple:
+        return (self._precision, self._scale)
 
     @property
     def precision(self) -> int:  # pragma: no cover
@@ -245,7 +276,7 @@ class NestedField(ColumnType):
     """
 
     _instances: Dict[
-        Tuple[bool, str, ColumnType, Optional[str]],
+        Tuple[bool, str, str, ColumnType, Optional[str]],
         "NestedField",
     ] = {}
 
@@ -263,7 +294,7 @@ class NestedField(ColumnType):
 
             name = Name(name)
 
-        key = (is_optional, name.name, field_type, doc)
+        key = (is_optional, name.name, name.quote_style, field_type, doc)
         cls._instances[key] = cls._instances.get(key) or object.__new__(cls)
         return cls._instances[key]
 
@@ -298,6 +329,9 @@ class NestedField(ColumnType):
             self._type = field_type
             self._doc = doc
 
+    def __getnewargs__(self) -> tuple:
+        return (self._name, self._type, self._is_optional, self._doc)
+
     @property
     def is_optional(self) -> bool:
         """
@@ -362,6 +396,9 @@ field_type=IntegerType(), is_optional=True, doc='an optional field'))
             )
             self._fields = fields
 
+    def __getnewargs__(self) -> tuple:
+        return self._fields
+
     @property
     def fields(self) -> Tuple[NestedField, ...]:
         """
@@ -404,6 +441,9 @@ class ListType(ColumnType):
                 is_optional=False,  # type: ignore
             )
 
+    def __getnewargs__(self) -> tuple:
+        return (self._element_field.type,)
+
     @property
     def element(self) -> NestedField:
         """
@@ -447,6 +487,9 @@ class MapType(ColumnType):
                 is_optional=False,  # type: ignore
             )
 
+    def __getnewargs__(self) -> tuple:
+        return (self._key_field.type, self._value_field.type)
+
     @property
     def key(self) -> NestedField:
         """
@@ -602,10 +645,9 @@ class LongType(BigIntType):  # pylint: disable=R0901
           in Java (returns `-9223372036854775808`)
     """
 
-    def __new__(cls, *args, **kwargs):
-        self = super().__new__(BigIntType, *args, **kwargs)
-        super(BigIntType, self).__init__("long", "LongType()")
-        return self
+    def __new__(cls, *args, **kwargs):  # pylint: disable=unused-argument
+        # an alias of bigint, so it is the same (interned) type
+        return BigIntType()
 
 
 class FloatingBase(NumberType, Singleton):
@@ -762,6 +804,9 @@ class DayTimeIntervalType(IntervalTypeBase):
             self._from = from_
             self._to = to_
 
+    def __getnewargs__(self) -> tuple:
+        return (self._from, self._to)
+
     @property
     def from_(self) -> str:  # pylint: disable=missing-function-docstring
         return self._from  # pragma: no cover
@@ -809,6 +854,9 @@ class YearMonthIntervalType(IntervalTypeBase):
             self._from = from_
             self._to = to_
 
+    def __getnewargs__(self) -> tuple:
+        return (self._from, self._to)
+
     @property
     def from_(self) -> str:  # pylint: disable=missing-function-docstring
         return self._from  # pragma: no cover
@@ -0,0 +1,107 @@
+"""
+Similarity signatures of node queries.
+
+A query is summarized as the set of fingerprints of all of its subtrees. The
+``SIGNATURE_SIZE`` smallest fingerprints (a bottom-k MinHash) are stored on each
+node revision and estimate the Jaccard similarity of two queries without parsing
+or comparing their ASTs.
+"""
+import hashlib
+import heapq
+import struct
+from enum import Enum
+from typing import Iterable, Set
+
+from dj.sql.parsing import ast
+
+SIGNATURE_SIZE = 128
+
+# Top-k lookups estimate the similarity of this many candidates per node returned,
+# taking the candidates that share the most fingerprints with the query
+CANDIDATES_PER_RESULT = 4
+
+
+def _value_key(value) -> bytes:
+    """
+    A stable representation of a field that isn't a node. Like ``Node.__eq__``,
+    only primitives (and enums) are compared by value.
+    """
+    if isinstance(value, Enum):
+        return f"{type(value).__name__}.{value.name}".encode("utf-8")
+    if type(value) in ast.PRIMITIVES:  # pylint: disable=C0123
+        return repr(value).encode("utf-8")
+    return type(value).__name__.encode("utf-8")
+
+
+def _fingerprint(node: ast.Node, fingerprints: Set[int]) -> bytes:
+    """
+    Compute a fingerprint of a subtree from the fingerprints of its children, and
+    collect the fingerprints of all subtrees.
+    """
+    digest = hashlib.blake2b(type(node).__name__.encode("utf-8"), digest_size=8)
+    for value in node.fields(flat=True, nodes_only=False, nones=True):
+        digest.update(b"\x00")
+        if isinstance(value, ast.Node):
+            digest.update(_fingerprint(value, fingerprints))
+        else:
+            digest.update(_value_key(value))
+    fingerprint = digest.digest()
+    fingerprints.add(int.from_bytes(fingerprint, "little"))
+    return fingerprint
+
+
+def subtree_fingerprints(tree: ast.Node) -> Set[int]:
+    """
+    Fingerprints of every subtree of an AST. Unlike ``hash(node)``, they are
+    stable across processes, so they can be stored.
+    """
+    fingerprints: Set[int] = set()
+    _fingerprint(tree, fingerprints)
+    return fingerprints
+
+
+def pack_signature(fingerprints: Iterable[int]) -> bytes:
+    """
+    Serialize the smallest ``SIGNATURE_SIZE`` fingerprints.
+    """
+    smallest = heapq.nsmallest(SIGNATURE_SIZE, set(fingerprints))
+    return struct.pack(f"<{len(smallest)}Q", *smallest)
+
+
+def unpack_signature(signature: bytes) -> Set[int]:
+    """
+    Deserialize a signature into its set of fingerprints.
+    """
+    return set(struct.unpack(f"<{len(signature) // 8}Q", signature))
+
+
+def fingerprint_key(fingerprint: int) -> int:
+    """
+    A fingerprint as a signed 64-bit integer, the way databases store them.
+    """
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def query_signature(tree: ast.Node) -> bytes:
+    """
+    The similarity signature of a query.
+    """
+    return pack_signature(subtree_fingerprints(tree))
+
+
+def estimate_similarity(
+    signature: Set[int],
+    other: Set[int],
+) -> float:
+    """
+    Estimate the Jaccard similarity of two queries from their unpacked signatures.
+    The smallest fingerprints of the union are a sample of it, and the share of
+    those in both signatures estimates the share of subtrees the queries have in
+    common. The estimate is exact for queries with fewer than ``SIGNATURE_SIZE``
+    distinct subtrees.
+    """
+    sample = heapq.nsmallest(SIGNATURE_SIZE, signature | other)
+    if not sample:
+        return 0.0
+    shared = signature & other
+    return sum(1 for fingerprint in sample if fingerprint in shared) / len(sample)
@@ -4,15 +4,20 @@ Utility functions.
 import logging
 import os
 import re
+import threading
+import time
 from enum import Enum
 from functools import lru_cache
 
 # pylint: disable=line-too-long
-from typing import Iterator, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 from dotenv import load_dotenv
 from rich.logging import RichHandler
+from sqlalchemy import event
 from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
 from sqlmodel import Session, create_engine
 from yarl import URL
 
@@ -49,16 +54,149 @@ def get_settings() -> Settings:
     return Settings()
 
 
+class PoolStatistics:
+    """
+    Running counters for the metadata engine's connection pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Zero all counters.
+        """
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.wait_time = 0.0
+            self.max_wait_time = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        """
+        Record the time spent waiting for a connection from the pool.
+        """
+        with self._lock:
+            self.wait_time += seconds
+            self.max_wait_time = max(  # pylint: disable=W0201
+                self.max_wait_time,
+                seconds,
+            )
+
+    def increment(self, counter: str) -> None:
+        """
+        Increment one of the event counters.
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Snapshot of the counters.
+        """
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "wait_time": self.wait_time,
+                "max_wait_time": self.max_wait_time,
+            }
+
+
+pool_statistics = PoolStatistics()
+
+
+class TimedQueuePool(QueuePool):  # pylint: disable=too-few-public-methods
+    """
+    A ``QueuePool`` that records how long checkouts wait for a free connection.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_statistics.record_wait(time.perf_counter() - start)
+
+
+def get_engine_kwargs(settings: Settings) -> Dict[str, Any]:
+    """
+    Build the ``create_engine`` arguments for the metadata database.
+    """
+    url = make_url(settings.index)
+    kwargs: Dict[str, Any] = {"pool_pre_ping": settings.index_pool_pre_ping}
+    if settings.index_pool_recycle is not None:
+        kwargs["pool_recycle"] = int(settings.index_pool_recycle.total_seconds())
+
+    # SQLite picks its own pool implementation depending on the database file
+    if url.get_backend_name() != "sqlite":
+        kwargs.update(
+            poolclass=TimedQueuePool,
+            pool_size=settings.index_pool_size,
+            max_overflow=settings.index_max_overflow,
+            pool_timeout=settings.index_pool_timeout.total_seconds(),
+        )
+
+    if (
+        settings.index_statement_timeout is not None
+        and url.get_backend_name() == "postgresql"
+    ):
+        timeout = int(settings.index_statement_timeout.total_seconds() * 1000)
+        kwargs["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+
+    return kwargs
+
+
+@lru_cache
 def get_engine() -> Engine:
     """
     Create the metadata engine.
+
+    The engine, and its connection pool, is created once per process and reused
+    by every request.
     """
     settings = get_settings()
-    engine = create_engine(settings.index)
+    engine = create_engine(settings.index, **get_engine_kwargs(settings))
+
+    event.listen(
+        engine,
+        "connect",
+        lambda *args: pool_statistics.increment("connects"),
+    )
+    event.listen(
+        engine,
+        "checkout",
+        lambda *args: pool_statistics.increment("checkouts"),
+    )
+    event.listen(
+        engine,
+        "checkin",
+        lambda *args: pool_statistics.increment("checkins"),
+    )
 
     return engine
 
 
+def get_pool_statistics() -> Dict[str, Any]:
+    """
+    Return checkout and wait statistics for the metadata engine's connection pool.
+    """
+    pool = get_engine().pool
+    stats = pool_statistics.to_dict()
+    stats["pool"] = type(pool).__name__
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return stats
+
+
 def get_session() -> Iterator[Session]:
     """
     Per-request session.
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# pylint: skip-file
+"""
+Benchmarks for the ANTLR SQL parser.
+"""
+
+import argparse
+import os
+import resource
+import sys
+import threading
+import timeit
+import tracemalloc
+
+from antlr4 import PredictionMode
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dj.sql.parsing.backends.antlr4 import (  # noqa: E402
+    build_string_parser,
+    prediction_mode_counter,
+    string_to_ast,
+    visit,
+)
+from tests.examples import EXAMPLES  # noqa: E402
+
+
+def example_queries():
+    return [
+        data["query"]
+        for _, data in EXAMPLES
+        if isinstance(data, dict) and data.get("query")
+    ]
+
+
+def parse_ll(query):
+    return build_string_parser(query, early_bail=False).singleStatement()
+
+
+def parse_two_stage(query):
+    return string_to_ast(query, "singleStatement")
+
+
+def benchmark_prediction_modes(queries, repeat):
+    results = {}
+    for name, func in (("LL", parse_ll), ("SLL, falling back to LL", parse_two_stage)):
+        elapsed = min(
+            timeit.repeat(
+                lambda: [func(query) for query in queries],
+                number=1,
+                repeat=repeat,
+            ),
+        )
+        results[name] = elapsed
+        print(f"{name:>25}: {elapsed * 1000:8.1f} ms for {len(queries)} queries")
+    print(
+        f"{'speedup':>25}: {results['LL'] / results['SLL, falling back to LL']:8.2f}x",
+    )
+    print(f"{'modes used':>25}: {dict(prediction_mode_counter)}")
+
+
+def nested_arithmetic(depth):
+    expression = "a"
+    for i in range(depth):
+        expression = f"({expression} + {i})"
+    return f"SELECT {expression} FROM t"
+
+
+def nested_case(depth):
+    expression = "0"
+    for i in range(depth):
+        expression = f"CASE WHEN a > {i} THEN ({expression}) ELSE {i} END"
+    return f"SELECT {expression} FROM t"
+
+
+def benchmark_nesting(depths, repeat):
+    """
+    Time converting parse trees of deeply nested expressions into DJ ASTs, which
+    should grow linearly with the nesting depth.
+    """
+    for name, build_query in (
+        ("arithmetic", nested_arithmetic),
+        ("CASE", nested_case),
+    ):
+        for depth in depths:
+            tree = string_to_ast(build_query(depth), "singleStatement")
+            elapsed = min(timeit.repeat(lambda: visit(tree), number=1, repeat=repeat))
+            print(
+                f"{name:>10} depth {depth:>4}: {elapsed * 1000:8.1f} ms, "
+                f"{elapsed * 1e6 / depth:6.1f} us per level",
+            )
+
+
+def metric_query(depth, width):
+    """
+    A metric query aggregating ``width`` deeply nested expressions
+    """
+    aggregations = []
+    for i in range(width):
+        expression = f"a{i}"
+        for level in range(depth):
+            expression = (
+                f"CASE WHEN b > {level} THEN COALESCE({expression}, {level}) "
+                f"ELSE {level} END"
+                if level % 2
+                else f"({expression} + {level})"
+            )
+        aggregations.append(f"SUM({expression}) AS m{i}")
+    return f"SELECT {', '.join(aggregations)} FROM metrics"
+
+
+def benchmark_memory(depth, width):
+    """
+    Report the memory retained per DJ AST node and the peak RSS for building the
+    AST of a deep metric query
+    """
+    tree = string_to_ast(metric_query(depth, width), "singleStatement")
+    tracemalloc.start()
+    query = visit(tree)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = sum(1 for _ in query.flatten())
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{'nodes':>20}: {nodes:10d}")
+    print(f"{'retained':>20}: {retained / 2**20:10.1f} MiB")
+    print(f"{'bytes per node':>20}: {retained / nodes:10.1f}")
+    print(f"{'peak while building':>20}: {peak / 2**20:10.1f} MiB")
+    # kilobytes on linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    print(f"{'peak RSS':>20}: {max_rss * scale / 2**20:10.1f} MiB")
+
+
+def run_with_deep_stack(func, *args):
+    """
+    Nested expressions recurse deeply in both the parser and the visitor
+    """
+    sys.setrecursionlimit(100_000)
+    threading.stack_size(512 * 1024 * 1024)
+    thread = threading.Thread(target=func, args=args)
+    thread.start()
+    thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the SQL parser")
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        dest="repeat",
+        type=int,
+        default=5,
+        help="number of times to repeat each measurement (the best is reported)",
+    )
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    subparsers.add_parser(
+        "prediction-modes",
+        help="compare LL and SLL prediction on the example node queries",
+    )
+    nesting = subparsers.add_parser(
+        "nesting",
+        help="convert deeply nested CASE and arithmetic expressions",
+    )
+    nesting.add_argument(
+        "-d",
+        "--depths",
+        dest="depths",
+        type=int,
+        nargs="+",
+        default=[25, 50, 100, 200],
+    )
+    memory = subparsers.add_parser(
+        "memory",
+        help="measure the memory used by the AST of a deep metric query",
+    )
+    memory.add_argument("-d", "--depth", dest="depth", type=int, default=50)
+    memory.add_argument("-w", "--width", dest="width", type=int, default=50)
+    args = parser.parse_args()
+    if args.benchmark == "prediction-modes":
+        benchmark_prediction_modes(example_queries(), args.repeat)
+    elif args.benchmark == "memory":
+        run_with_deep_stack(benchmark_memory, args.depth, args.width)
+    else:
+        run_with_deep_stack(benchmark_nesting, args.depths, args.repeat)
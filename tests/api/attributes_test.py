@@ -4,6 +4,10 @@ Tests for the attributes API.
 from unittest.mock import ANY
 
 from fastapi.testclient import TestClient
+from sqlmodel import Session, delete, select
+
+from dj.api.attributes import attribute_type_registry, get_default_attribute_types
+from dj.models import AttributeType
 
 
 def test_adding_new_attribute(
@@ -122,3 +126,69 @@ def test_list_attributes(
             "description": "Points to a dimension attribute column",
         },
     }
+
+
+def test_attribute_type_registry_seeds_defaults(session: Session) -> None:
+    """
+    Test that the attribute type registry seeds the defaults without committing the
+    caller's session.
+    """
+    session.exec(delete(AttributeType))  # type: ignore
+    session.commit()
+    assert not session.exec(select(AttributeType)).all()
+
+    attribute_type_registry.invalidate()
+    pending = AttributeType(
+        namespace="custom",
+        name="pending",
+        description="Never committed",
+        allowed_node_types=["source"],
+    )
+    session.add(pending)
+    dimension = attribute_type_registry.get(session, "dimension")
+    assert dimension.allowed_node_types == ["source", "transform"]
+    assert dimension in session
+
+    session.rollback()
+    assert {type_.name for type_ in session.exec(select(AttributeType))} == {
+        type_.name for type_ in get_default_attribute_types()
+    }
+
+
+def test_attribute_type_registry(session: Session, client: TestClient) -> None:
+    """
+    Test that the attribute type registry picks up new types.
+    """
+    attribute_type_registry.invalidate()
+    assert attribute_type_registry.get(session, "dimension") is not None
+    assert attribute_type_registry.get(session, "internal", "custom") is None
+
+    response = client.post(
+        "/attributes/",
+        json={
+            "namespace": "custom",
+            "name": "internal",
+            "description": "Column for internal use only",
+            "allowed_node_types": ["source"],
+        },
+    )
+    assert response.status_code == 201
+    internal = attribute_type_registry.get(session, "internal", "custom")
+    assert internal.id == response.json()["id"]
+    assert len(attribute_type_registry.all(session)) == 6
+
+    # Types added by another process are picked up on a lookup miss, even after
+    # earlier misses
+    assert attribute_type_registry.get(session, "external", "custom") is None
+    with Session(session.get_bind()) as other_session:
+        other_session.add(
+            AttributeType(
+                namespace="custom",
+                name="external",
+                description="Column for external use",
+                allowed_node_types=["source"],
+            ),
+        )
+        other_session.commit()
+    assert attribute_type_registry.get(session, "external", "custom").id is not None
+    assert len(attribute_type_registry.all(session)) == 7
@@ -5,6 +5,9 @@ Tests for the healthcheck API.
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
+from dj.sql.parsing.backends.antlr4 import parse, parse_cache
+from dj.utils import get_engine
+
 
 def test_successful_health(client: TestClient) -> None:
     """
@@ -24,3 +27,31 @@ def test_failed_health(session: Session, client: TestClient) -> None:
     response = client.get("/health/")
     data = response.json()
     assert data == [{"name": "database", "status": "failed"}]
+
+
+def test_pool_status(client: TestClient) -> None:
+    """
+    Test ``GET /health/pool/``.
+    """
+    get_engine.cache_clear()
+    response = client.get("/health/pool/")
+    data = response.json()
+    assert response.ok
+    assert data["pool"] == "SingletonThreadPool"
+    assert data["size"] is None
+    get_engine.cache_clear()
+
+
+def test_parse_cache_status(client: TestClient) -> None:
+    """
+    Test ``GET /health/parse-cache/``.
+    """
+    parse_cache.clear()
+    parse("SELECT 1")
+    parse("SELECT  1")
+    response = client.get("/health/parse-cache/")
+    data = response.json()
+    assert response.ok
+    assert data["hits"] == 1
+    assert data["misses"] == 1
+    assert data["entries"] == 1
@@ -4,12 +4,14 @@ Tests for API helpers.
 
 import pytest
 from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
 from sqlmodel import Session
 
 from dj.api import helpers
 from dj.errors import DJException
 from dj.models import NodeRevision
-from dj.models.node import NodeStatus
+from dj.models.node import Node, NodeStatus, NodeType
+from dj.sql.parsing.backends.antlr4 import is_query_ast_current
 
 
 def test_get_dj_query(
@@ -50,3 +52,35 @@ def test_propagate_valid_status(session: Session):
     assert "Cannot propagate valid status: Node `foo` is not valid" in str(
         exc_info.value,
     )
+
+
+@pytest.mark.usefixtures("settings")
+def test_store_query_asts(session: Session, mocker: MockerFixture):
+    """
+    Test that the query ASTs built by another version of the parser are replaced
+    """
+    revision = NodeRevision(
+        name="a",
+        version="1",
+        node=Node(name="a", current_version="1"),
+        type=NodeType.TRANSFORM,
+        query="SELECT a FROM t",
+    )
+    draft = NodeRevision(
+        name="b",
+        version="1",
+        node=Node(name="b", current_version="1"),
+        type=NodeType.TRANSFORM,
+        query="SELECT a FROM (",
+    )
+    session.add_all([revision, draft])
+    session.commit()
+    assert helpers.store_query_asts(session, "a-test-secret") == 0
+
+    mocker.patch("dj.sql.parsing.backends.antlr4.PARSER_VERSION", b"upgraded")
+    mocker.patch("dj.api.helpers.PARSER_VERSION", b"upgraded")
+    assert not is_query_ast_current(revision.query_ast, revision.query, "a-test-secret")
+    assert helpers.store_query_asts(session, "a-test-secret") == 1
+    assert is_query_ast_current(revision.query_ast, revision.query, "a-test-secret")
+    assert draft.query_ast is None
+    assert helpers.store_query_asts(session, "a-test-secret") == 0
@@ -2,15 +2,19 @@
 """
 Tests for the nodes API.
 """
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from pytest_mock import MockerFixture
+from sqlalchemy import event
+from sqlmodel import Session, select
 
+from dj.api import helpers
 from dj.models import Database, Table
 from dj.models.column import Column
 from dj.models.node import Node, NodeRevision, NodeStatus, NodeType
+from dj.sql.parsing import ast
 from dj.sql.parsing.types import IntegerType, StringType, TimestampType
 
 
@@ -1689,7 +1693,92 @@ def test_node_similarity(session: Session, client: TestClient):
     }
 
 
-def test_resolving_downstream_status(client_with_examples: TestClient) -> None:
+def test_list_similar_nodes(session: Session, client: TestClient):
+    """
+    Test finding the nodes with the most similar queries
+    """
+    source_data = Node(name="source_data", type=NodeType.SOURCE, current_version="1")
+    session.add(
+        NodeRevision(
+            node=source_data,
+            version="1",
+            name=source_data.name,
+            type=source_data.type,
+        ),
+    )
+    for name, type_, query in (
+        ("a_transform", NodeType.TRANSFORM, "SELECT 1 as num"),
+        ("another_transform", NodeType.TRANSFORM, "SELECT 1 as num"),
+        ("yet_another_transform", NodeType.TRANSFORM, "SELECT 2 as num"),
+        ("a_metric", NodeType.METRIC, "SELECT COUNT(num) FROM a_transform"),
+        ("a_dimension", NodeType.DIMENSION, "SELECT 1 as num"),
+    ):
+        node = Node(name=name, type=type_, current_version="1")
+        session.add(
+            NodeRevision(
+                node=node,
+                version="1",
+                name=name,
+                query=query,
+                type=type_,
+                columns=[Column(name="num", type=IntegerType())],
+            ),
+        )
+    session.commit()
+
+    response = client.get("/nodes/a_transform/similar/")
+    assert response.status_code == 200
+    assert response.json() == [
+        {"name": "another_transform", "type": "transform", "similarity": 1.0},
+        {"name": "yet_another_transform", "type": "transform", "similarity": 0.2},
+        {"name": "a_metric", "type": "metric", "similarity": 0.13333333333333333},
+    ]
+
+    response = client.get("/nodes/a_transform/similar/?limit=1")
+    assert response.status_code == 200
+    assert response.json() == [
+        {"name": "another_transform", "type": "transform", "similarity": 1.0},
+    ]
+
+    # listing similar nodes doesn't write anything
+    statements: List[str] = []
+
+    def record(*args: Any) -> None:
+        statements.append(args[2])
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/nodes/a_transform/similar/")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert statements
+    assert all(statement.lstrip().startswith("SELECT") for statement in statements)
+
+    # the fingerprints of a revision are indexed again when its signature changes
+    another_transform = session.exec(
+        select(NodeRevision).where(NodeRevision.name == "another_transform"),
+    ).unique().one()
+    another_transform.query = "SELECT 2 as num"
+    session.commit()
+    response = client.get("/nodes/a_transform/similar/")
+    assert response.json() == [
+        {"name": "another_transform", "type": "transform", "similarity": 0.2},
+        {"name": "yet_another_transform", "type": "transform", "similarity": 0.2},
+        {"name": "a_metric", "type": "metric", "similarity": 0.13333333333333333},
+    ]
+
+    # Check that the proper error is raised when using a source node
+    response = client.get("/nodes/source_data/similar/")
+    assert response.status_code == 409
+    assert response.json()["message"] == "Cannot determine similarity of source nodes"
+
+
+def test_resolving_downstream_status(  # pylint: disable=too-many-locals
+    client_with_examples: TestClient,
+    mocker: MockerFixture,
+) -> None:
     """
     Test creating and updating a source node
     """
@@ -1792,6 +1881,7 @@ def test_resolving_downstream_status(client_with_examples: TestClient) -> None:
         "table": "comments",
     }
 
+    validate_node_data = mocker.spy(helpers, "validate_node_data")
     response = client_with_examples.post(
         "/nodes/source/",
         json=missing_parent_node,
@@ -1801,6 +1891,15 @@ def test_resolving_downstream_status(client_with_examples: TestClient) -> None:
     assert data["name"] == missing_parent_node["name"]
     assert data["mode"] == missing_parent_node["mode"]
 
+    # The downstream nodes are validated with queries parsed in one batch
+    query_asts = [
+        call.kwargs["query_ast"]
+        for call in validate_node_data.call_args_list
+        if "query_ast" in call.kwargs
+    ]
+    assert len(query_asts) >= 6
+    assert all(isinstance(query_ast, ast.Query) for query_ast in query_asts)
+
     # Check that downstream nodes have now been switched to a "valid" status
     for node in [transform1, transform2, transform3, metric1, metric2, metric3]:
         response = client_with_examples.get(f"/nodes/{node['name']}/")
@@ -48,6 +48,16 @@ def test_sql(
         "columns": [{"name": "col0", "type": "bigint"}],
         "dialect": None,
     }
+    assert int(response.headers["X-DJ-Type-Inferences"]) > 0
+
+    response = client.get("/sql/a-metric/", params={"layout": "compact"})
+    assert response.json()["sql"] == (
+        "SELECT COUNT(*) col0 FROM rev.my_table AS my_table"
+    )
+    response = client.get("/sql/a-metric/", params={"layout": "pretty"})
+    assert response.json()["sql"] == (
+        "SELECT\n    COUNT(*) col0\nFROM rev.my_table AS my_table"
+    )
 
 
 @pytest.mark.parametrize(
@@ -820,3 +830,30 @@ def test_get_sql_for_metrics(client_with_examples: TestClient):
         {"name": "num_repair_orders", "type": "bigint"},
         {"name": "discounted_orders_rate", "type": "double"},
     ]
+
+
+def test_get_sql_for_metrics_with_engine_and_layout(
+    client_with_examples: TestClient,
+):
+    """
+    Test getting sql for metrics in the layout and dialect of an engine.
+    """
+    params = {
+        "metrics": ["num_repair_orders"],
+        "dimensions": ["hard_hat.country"],
+    }
+    default = client_with_examples.get("/sql/", params=params).json()
+    response = client_with_examples.get(
+        "/sql/",
+        params={
+            **params,
+            "engine_name": "spark",
+            "engine_version": "3.1.1",
+            "layout": "compact",
+        },
+    )
+    data = response.json()
+    assert data["dialect"] == "spark"
+    assert "\n" not in data["sql"]
+    assert "  " not in data["sql"]
+    assert compare_query_strings(data["sql"], default["sql"])
@@ -37,6 +37,7 @@ def settings(mocker: MockerFixture) -> Iterator[Settings]:
         celery_broker=None,
         redis_cache=None,
         query_service=None,
+        secret="a-test-secret",
     )
 
     mocker.patch(
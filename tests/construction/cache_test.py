@@ -0,0 +1,166 @@
+"""
+Tests for ``dj.construction.cache``.
+"""
+
+from typing import Any, List
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from dj.construction.cache import BuildCache, LRUCache, dag_state, get_build_cache
+from dj.models.node import Node, NodeType
+
+
+def test_lru_cache() -> None:
+    """
+    Test that the in-process store evicts the least recently used entries.
+    """
+    store = LRUCache(max_entries=2)
+    store.set("a", 1)
+    store.set("b", 2)
+    assert store.get("a") == 1
+    store.set("c", 3)
+    assert store.get("b") is None
+    assert store.has("a") and store.has("c")
+    assert not store.add("a", 4)
+    assert store.delete("a")
+    assert len(store) == 1
+
+
+@pytest.mark.usefixtures("client_with_examples")
+def test_build_cache_key(session: Session) -> None:
+    """
+    Test that the key of a build changes with the state of the DAG upstream of it.
+    """
+    cache = BuildCache(LRUCache())
+    metric = session.exec(select(Node).where(Node.name == "num_repair_orders")).one()
+    key = cache.key(
+        session, [metric.current], ["hard_hat.state = 'CA'"], ["hard_hat.city"]
+    )
+
+    # whitespace in filters doesn't matter, unlike the extra arguments
+    assert key == cache.key(
+        session,
+        [metric.current],
+        ["hard_hat.state  =\n 'CA'"],
+        [" hard_hat.city"],
+    )
+    assert key != cache.key(session, [metric.current], [], ["hard_hat.city"])
+    assert key != cache.key(
+        session,
+        [metric.current],
+        ["hard_hat.state = 'CA'"],
+        ["hard_hat.city"],
+        extra=("pretty",),
+    )
+
+    # the dimension nodes linked to upstream columns are part of the state
+    state = dag_state(session, [metric.current])
+    names = [revision[1] for revision in state]
+    assert {"num_repair_orders", "repair_orders", "hard_hat"} <= set(names)
+
+    # a dimension link changes
+    repair_orders = session.exec(select(Node).where(Node.name == "repair_orders")).one()
+    column = next(
+        column
+        for column in repair_orders.current.columns
+        if column.dimension is not None
+    )
+    column.dimension_column = "other_id"
+    assert key != cache.key(
+        session,
+        [metric.current],
+        ["hard_hat.state = 'CA'"],
+        ["hard_hat.city"],
+    )
+
+
+@pytest.mark.usefixtures("client_with_examples")
+def test_dag_state_queries(session: Session) -> None:
+    """
+    Test that the DAG state is loaded a level at a time, not a revision at a time.
+    """
+    metrics = session.exec(select(Node).where(Node.type == NodeType.METRIC)).all()
+    revisions = [metric.current for metric in metrics]
+    statements: List[str] = []
+
+    def count(*args: Any) -> None:
+        statements.append(args[2])
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        state = dag_state(session, revisions)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert len(state) > len(revisions)
+    assert len(statements) < len(state)
+
+
+@pytest.mark.usefixtures("client_with_examples")
+def test_build_cache_key_reads_version(session: Session) -> None:
+    """
+    Test that the DAG state is only read again for a key once the DAG changes.
+    """
+    cache = BuildCache(LRUCache())
+    metric = session.exec(select(Node).where(Node.name == "num_repair_orders")).one()
+    key = cache.key(session, [metric.current])
+    statements: List[str] = []
+
+    def count(*args: Any) -> None:
+        statements.append(args[2])
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        assert cache.key(session, [metric.current]) == key
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert len(statements) == 1
+    assert "dagversion" in statements[0]
+
+    # a dimension link committed by another session changes the key
+    with Session(engine) as other:
+        repair_orders = other.exec(
+            select(Node).where(Node.name == "repair_orders"),
+        ).one()
+        column = next(
+            column
+            for column in repair_orders.current.columns
+            if column.dimension is not None
+        )
+        column.dimension_column = "other_id"
+        other.commit()
+    session.expire_all()
+    assert cache.key(session, [metric.current]) != key
+
+
+def test_build_cache_for_sql(client_with_examples: TestClient) -> None:
+    """
+    Test that SQL is read from the build cache until an upstream node changes.
+    """
+    cache = get_build_cache()
+    node = "large_revenue_payments_and_business_only"
+    response = client_with_examples.get(f"/sql/{node}/")
+    assert response.status_code == 200
+    hits, misses = cache.hits, cache.misses
+    assert client_with_examples.get(f"/sql/{node}/").json() == response.json()
+    assert (cache.hits, cache.misses) == (hits + 1, misses)
+
+    # a new availability state for the node invalidates its SQL
+    client_with_examples.post(
+        f"/data/{node}/availability/",
+        json={
+            "catalog": "default",
+            "schema_": "accounting",
+            "table": "pmts",
+            "valid_through_ts": 20230125,
+            "max_partition": ["2023", "01", "25"],
+            "min_partition": ["2022", "01", "01"],
+        },
+    )
+    response = client_with_examples.get(f"/sql/{node}/")
+    assert (cache.hits, cache.misses) == (hits + 1, misses + 1)
+    assert "accounting.pmts" in response.json()["sql"]
@@ -7,7 +7,9 @@ Tests for ``dj.models.node``.
 import pytest
 from sqlmodel import Session
 
+from dj.config import Settings
 from dj.models.node import Node, NodeRevision, NodeType
+from dj.sql.parsing.backends import antlr4
 
 
 def test_node_relationship(session: Session) -> None:
@@ -109,3 +111,70 @@ def test_extra_validation() -> None:
     with pytest.raises(Exception) as excinfo:
         node_revision.extra_validation()
     assert str(excinfo.value) == "Node A of type cube node needs cube elements"
+
+
+def test_parsed_query(session: Session, settings: Settings, mocker) -> None:
+    """
+    Test that the parsed query is stored with a node revision and reused.
+    """
+    node = Node(name="A", current_version="1")
+    node_rev = NodeRevision(
+        name="A",
+        version="1",
+        node=node,
+        type=NodeType.TRANSFORM,
+        query="SELECT a, SUM(b) FROM t GROUP BY a",
+    )
+    session.add(node_rev)
+    session.commit()
+    assert node_rev.query_ast is not None
+
+    # the parse cache is checked first, then the stored AST is loaded, and the
+    # query is only parsed if neither has it
+    antlr4.parse_cache.clear()
+    load_query_ast = mocker.patch(
+        "dj.sql.parsing.backends.antlr4.load_query_ast",
+        wraps=antlr4.load_query_ast,
+    )
+    parse_rule = mocker.patch(
+        "dj.sql.parsing.backends.antlr4.parse_rule",
+        wraps=antlr4.parse_rule,
+    )
+    query = node_rev.parsed_query()
+    assert str(query) == str(node_rev.parsed_query())
+    assert query is not node_rev.parsed_query()
+    load_query_ast.assert_called_once()
+    parse_rule.assert_not_called()
+
+    # a changed query replaces the stored AST when the revision is saved
+    node_rev.query = "SELECT a FROM t"
+    session.commit()
+    antlr4.parse_cache.clear()
+    parse_rule.reset_mock()
+    assert "SUM" not in str(node_rev.parsed_query())
+    parse_rule.assert_not_called()
+
+    # ASTs signed with another secret are parsed again, and reading the revision
+    # doesn't replace them
+    stored_ast = node_rev.query_ast
+    antlr4.parse_cache.clear()
+    settings.secret = "another-secret"
+    assert "SUM" not in str(node_rev.parsed_query())
+    parse_rule.assert_called_once()
+    assert node_rev.query_ast == stored_ast
+    assert node_rev not in session.dirty
+
+    # the AST isn't stored without a secret to sign it with
+    settings.secret = None
+    node_rev.query = "SELECT b FROM t"
+    session.commit()
+    assert node_rev.query_ast is None
+    assert node_rev.query_signature is not None
+
+    # queries that don't parse are not stored
+    node_rev.query = "SELECT a FROM ("
+    session.commit()
+    assert node_rev.query_ast is None
+    node_rev.query = None
+    session.commit()
+    assert node_rev.query_ast is None
@@ -178,6 +178,25 @@ def test_bad_combo_types() -> None:
     assert "got an invalid combination of types" in str(exc)
 
 
+def test_dispatch_resolution_cache() -> None:
+    """
+    Tests that overloads are resolved once per combination of argument types
+    """
+    resolved = F.Dispatch.resolved[(Coalesce, "infer_type")]
+    resolved.pop((DateType, DateType), None)
+    columns = [ast.Column(ast.Name("x"), _type=DateType()) for _ in range(2)]
+    assert Coalesce.infer_type(*columns) == DateType()
+    overload = resolved[(DateType, DateType)]
+    assert Coalesce.dispatch("infer_type", *columns) is overload
+
+    # overloads with a fixed number of arguments are resolved when registered
+    assert (DecimalType,) in F.Dispatch.resolved[(Avg, "infer_type")]
+
+    # other attributes are plain class attributes
+    assert Avg.is_aggregation
+    assert Coalesce.infer_type is Coalesce.__dict__["infer_type"].__func__
+
+
 @pytest.mark.parametrize(
     "types, expected",
     [
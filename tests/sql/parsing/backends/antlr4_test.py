@@ -3,9 +3,45 @@ Tests for custom antlr4 parser
 """
 # mypy: ignore-errors
 
+import pickle
+import threading
+from contextlib import contextmanager
+
 import pytest
+from antlr4 import CommonTokenStream, ParserRuleContext, PredictionMode
+from antlr4.error.Errors import ParseCancellationException
 
-from dj.sql.parsing.backends.antlr4 import parse
+import dj.sql.parsing.types as ct
+from dj.sql.parsing import ast
+from dj.sql.parsing.backends.antlr4 import (
+    PARSER_VERSION,
+    CaseInsensitiveInputStream,
+    EarlyBailSqlLexer,
+    ParseCache,
+    ParserPool,
+    SqlParsingError,
+    SqlSyntaxError,
+    clear_dfa_cache,
+    dfa_cache_size,
+    dump_query_ast,
+    is_parenthesized,
+    is_query_ast_current,
+    load_query_ast,
+    normalize_sql,
+    parse,
+    parse_cache,
+    parse_many,
+    parse_rule,
+    parse_statement,
+    prediction_mode_counter,
+    shutdown_parse_executor,
+    string_to_ast,
+    visit,
+)
+from dj.sql.parsing.backends.exceptions import DJParseException
+from dj.sql.parsing.backends.grammar.generated.SqlBaseLexer import SqlBaseLexer
+from dj.sql.parsing.backends.grammar.generated.SqlBaseParser import SqlBaseParser as sbp
+from dj.sql.parsing.type_parser import parse_column_type
 
 
 @pytest.mark.parametrize(
@@ -119,3 +155,337 @@ def test_antlr4_lambda_function():
     assert "FOO('a', 'b', c -> d) AS e" in str(query)
     query = parse("SELECT FOO('a', 'b', (c, c2, c3) -> d) AS e;")
     assert "FOO('a', 'b', (c, c2, c3) -> d) AS e" in str(query)
+
+
+def test_normalize_sql():
+    """
+    Test that only insignificant whitespace is collapsed
+    """
+    assert (
+        normalize_sql("SELECT  'a   b',\n\t`c  d` -- e  f\n  FROM /* g\n h */ t  ")
+        == "SELECT 'a   b', `c  d` -- e  f\n FROM /* g\n h */ t"
+    )
+
+
+def test_parse_cache():
+    """
+    Test that parsed queries are cached and each caller gets a private copy
+    """
+    parse_cache.clear()
+    first = parse("SELECT a, SUM(b) FROM t GROUP BY a")
+    second = parse("SELECT a,\n    SUM(b)\nFROM t\nGROUP BY a")
+    assert parse_cache.info()["hits"] == 1
+    assert parse_cache.info()["misses"] == 1
+    assert first is not second
+    assert first.compare(second)
+
+    # mutating a returned tree doesn't affect the cached one
+    function = next(second.find_all(ast.Function))
+    assert function is not next(first.find_all(ast.Function))
+    function.args[0].name.name = "c"
+    assert "SUM(b)" in str(parse("SELECT a, SUM(b) FROM t GROUP BY a"))
+
+    # parse errors aren't cached
+    with pytest.raises(SqlSyntaxError):
+        parse("SELECT a FROM (")
+    assert parse_cache.info()["entries"] == 1
+
+
+def test_parse_cache_eviction():
+    """
+    Test that the cache is bounded by entries and by size
+    """
+    cache = ParseCache(max_entries=2, max_size=40)
+    for sql in ("SELECT 1", "SELECT 2", "SELECT 3"):
+        cache.put(cache.key(sql), parse(sql), len(sql))
+    assert cache.get(cache.key("SELECT 1")) is None
+    assert cache.get(cache.key("SELECT 3")).compare(parse("SELECT 3"))
+    assert cache.info()["evictions"] == 1
+
+    sql = "SELECT a, b, c, d FROM some_table"
+    cache.put(cache.key(sql), parse(sql), len(sql))
+    assert cache.info()["entries"] == 1
+    assert cache.info()["size"] == len(sql)
+    assert cache.info()["evictions"] == 3
+
+    cache.put("too-big", parse(sql), 41)
+    assert cache.get("too-big") is None
+
+
+def test_two_stage_parsing(mocker):
+    """
+    Test that queries are parsed with SLL prediction, falling back to LL if it fails
+    """
+    prediction_mode_counter.clear()
+    string_to_ast("SELECT a FROM t", "singleStatement")
+    assert prediction_mode_counter == {"SLL": 1}
+
+    class SLLFailsParserPool(ParserPool):  # pylint: disable=too-few-public-methods
+        """
+        A parser pool where SLL prediction always fails
+        """
+
+        @contextmanager
+        def parser(
+            self, string, strict_mode=False, early_bail=True, prediction_mode=None
+        ):
+            with super().parser(string, strict_mode, early_bail) as parser:
+                if prediction_mode == PredictionMode.SLL:
+                    parser.singleStatement = mocker.MagicMock(
+                        side_effect=ParseCancellationException("SLL failed"),
+                    )
+                yield parser
+
+    mocker.patch(
+        "dj.sql.parsing.backends.antlr4.parser_pool",
+        SLLFailsParserPool(),
+    )
+    tree = string_to_ast("SELECT a FROM t", "singleStatement")
+    assert tree.getText() == "SELECTaFROMt<EOF>"
+    assert prediction_mode_counter == {"SLL": 1, "LL": 1}
+
+    # errors are raised by the LL parser
+    with pytest.raises(SqlSyntaxError):
+        string_to_ast("SELECT a FROM (", "singleStatement")
+    assert prediction_mode_counter == {"SLL": 1, "LL": 1}
+
+
+@pytest.mark.parametrize("lexer_class", [EarlyBailSqlLexer, SqlBaseLexer])
+def test_case_insensitive_input_stream(lexer_class):
+    """
+    Test that the lexer sees upper-cased input while token text keeps its case
+    """
+    stream = CaseInsensitiveInputStream("select Foo, 'Bar' from baz")
+    assert stream.LA(1) == ord("S")
+    assert stream.getText(7, 9) == "Foo"
+    assert str(stream) == "select Foo, 'Bar' from baz"
+
+    tokens = CommonTokenStream(lexer_class(stream))
+    tokens.fill()
+    assert [token.text for token in tokens.tokens if token.channel == 0] == [
+        "select",
+        "Foo",
+        ",",
+        "'Bar'",
+        "from",
+        "baz",
+        "<EOF>",
+    ]
+    assert tokens.tokens[0].type == SqlBaseLexer.SELECT
+
+
+def test_parser_pool():
+    """
+    Test that parsers are reused within a thread, but not across threads or by
+    nested parses
+    """
+    pool = ParserPool()
+    with pool.parser("SELECT a FROM t") as parser:
+        first_tree = parser.singleStatement()
+        with pool.parser("SELECT b FROM u") as nested_parser:
+            assert nested_parser is not parser
+            assert nested_parser.singleStatement().getText() == "SELECTbFROMu<EOF>"
+    with pool.parser("select C from V", early_bail=True) as reused_parser:
+        assert reused_parser in (parser, nested_parser)
+        assert reused_parser.singleStatement().getText() == "selectCfromV<EOF>"
+    assert first_tree.getText() == "SELECTaFROMt<EOF>"
+
+    # the failing parse doesn't break the next one
+    with pytest.raises(SqlParsingError):
+        with pool.parser("SELECT a FROM (") as parser:
+            parser.singleStatement()
+    with pool.parser("SELECT a FROM t") as parser:
+        assert parser.singleStatement().getText() == "SELECTaFROMt<EOF>"
+
+    other_thread_parsers = []
+
+    def parse_in_thread():
+        with pool.parser("SELECT a FROM t") as thread_parser:
+            other_thread_parsers.append(thread_parser)
+
+    thread = threading.Thread(target=parse_in_thread)
+    thread.start()
+    thread.join()
+    assert other_thread_parsers[0] is not parser
+
+
+def test_dfa_cache_bounded(mocker):
+    """
+    Test that the prediction caches are cleared once they get too large
+    """
+    parse_statement("SELECT a, b FROM t WHERE c > 1")
+    assert dfa_cache_size() > (0, 0)
+    clear_dfa_cache()
+    assert dfa_cache_size() == (0, 0)
+
+    # the caches aren't cleared while a parser is using them
+    pool = ParserPool()
+    with pool.parser("SELECT a FROM t") as parser:
+        parser.singleStatement()
+        clear_dfa_cache()
+        assert dfa_cache_size() > (0, 0)
+    assert dfa_cache_size() == (0, 0)
+
+    mocker.patch("dj.sql.parsing.backends.antlr4.DFA_CACHE_CHECK_INTERVAL", 1)
+    mocker.patch("dj.sql.parsing.backends.antlr4.MAX_DFA_STATES", 10)
+    tree = parse_statement("SELECT a, b FROM t WHERE c > 1")
+    assert dfa_cache_size() == (0, 0)
+    assert tree.getText() == "SELECTa,bFROMtWHEREc>1<EOF>"
+
+
+def test_parenthesized_detection(mocker):
+    """
+    Test that parentheses and ``AS`` are detected without concatenating subtree text
+    """
+    mocker.patch.object(
+        sbp.ParenthesizedExpressionContext,
+        "getText",
+        side_effect=AssertionError("getText should not be called"),
+    )
+    query = parse_rule(
+        "SELECT ((a + 1) * 2) AS x, (b), c - (d) AS y, "
+        "CASE WHEN (a > 1) THEN (CASE WHEN b THEN (1) ELSE 2 END) END FROM t",
+        "singleStatement",
+    )
+    x_col, b_col, y_col, case = query.select.projection
+    assert str(x_col) == "((a + 1) * 2) AS x"
+    assert x_col.child.parenthesized
+    assert x_col.child.left.parenthesized
+    assert x_col.as_
+    assert b_col.parenthesized
+    assert not y_col.child.parenthesized
+    assert y_col.child.right.parenthesized
+    assert case.conditions[0].parenthesized
+    assert case.results[0].parenthesized
+    assert not case.parenthesized
+
+
+def nested_expressions(depth):
+    """
+    A query with nested arithmetic, nested CASE and long expressions
+    """
+    arithmetic, case = "a", "0"
+    for i in range(depth):
+        arithmetic = f"({arithmetic} + {i})"
+        case = f"CASE WHEN (a > {i}) THEN ({case}) ELSE f({i}, (b)) END"
+    total = " + ".join(f"(c{i})" for i in range(depth))
+    return f"SELECT {arithmetic} AS x, {case}, {total} AS y FROM t"
+
+
+@pytest.mark.parametrize("depth", [5, 20])
+def test_parenthesized_detection_is_linear(mocker, depth):
+    """
+    Test that parentheses are detected like the text-based check did, while reading
+    text linear in the size of the query
+    """
+    sql = nested_expressions(depth)
+    tree = string_to_ast(sql, "singleStatement")
+
+    contexts, stack = [], [tree]
+    while stack:
+        ctx = stack.pop()
+        if isinstance(ctx, ParserRuleContext):
+            contexts.append(ctx)
+            stack.extend(ctx.getChildren())
+    with_parens = [ctx for ctx in contexts if hasattr(ctx, "LEFT_PAREN")]
+    assert sum(is_parenthesized(ctx) for ctx in with_parens) >= 3 * depth
+    for ctx in with_parens:
+        text = ctx.getText().strip()
+        assert is_parenthesized(ctx) == (text[0] == "(" and text[-1] == ")")
+
+    get_text = ParserRuleContext.getText
+    read = []
+
+    def counting_get_text(ctx):
+        text = get_text(ctx)
+        read.append(len(text))
+        return text
+
+    mocker.patch.object(ParserRuleContext, "getText", counting_get_text)
+    query = visit(tree)
+    assert str(query.select.projection[0]).startswith("(((")
+    # only the leaves (names, numbers, ...) are read, while reading the text of
+    # every parenthesized context reads the nested ones over and over
+    assert sum(read) <= len(sql) // 2
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_parse_many(mocker, max_workers):
+    """
+    Test parsing a batch of queries, both sequentially and with worker processes
+    """
+    mocker.patch("dj.sql.parsing.backends.antlr4.PARSE_MANY_MIN_BATCH_SIZE", 2)
+    parse_cache.clear()
+    parse("SELECT cached FROM t")
+    queries = [
+        "SELECT a, SUM(b) FROM t GROUP BY a",
+        "SELECT a FROM (",
+        None,
+        "SELECT cached FROM t",
+        "SELECT CAST(a AS DECIMAL(10, 2)), STRUCT(b) FROM u",
+        "SELECT a,  SUM(b) FROM t GROUP BY a",
+    ]
+    try:
+        results = parse_many(queries, max_workers=max_workers)
+    finally:
+        shutdown_parse_executor()
+
+    assert [type(result) for result in results] == [
+        ast.Query,
+        SqlSyntaxError,
+        DJParseException,
+        ast.Query,
+        ast.Query,
+        ast.Query,
+    ]
+    for sql, result in zip(queries, results):
+        if isinstance(result, ast.Query):
+            assert result.compare(parse_rule(sql, "singleStatement"))
+    assert results[0] is not results[5]
+    assert next(results[0].find_all(ast.Function)) is not next(
+        results[5].find_all(ast.Function),
+    )
+    assert next(results[4].find_all(ast.Cast)).data_type is ct.DecimalType(10, 2)
+    assert parse_cache.info()["entries"] == 3
+    assert parse_cache.info()["hits"] == 1
+
+
+def test_pickle_ast():
+    """
+    Test that parsed queries survive pickling and types remain interned
+    """
+    query = parse(
+        "SELECT CAST(a AS MAP<STRING, ARRAY<DECIMAL(10, 2)>>), "
+        "CAST(b AS STRUCT<x: INT NOT NULL>), COUNT(DISTINCT c) FROM t",
+    )
+    unpickled = pickle.loads(pickle.dumps(query))
+    assert unpickled.compare(query)
+    assert str(unpickled) == str(query)
+    assert [cast.data_type for cast in unpickled.find_all(ast.Cast)] == [
+        cast.data_type for cast in query.find_all(ast.Cast)
+    ]
+    for cast in unpickled.find_all(ast.Cast):
+        assert cast.data_type is parse_column_type(str(cast.data_type))
+
+
+def test_dump_and_load_query_ast(mocker):
+    """
+    Test serializing parsed queries
+    """
+    sql = "SELECT a, SUM(b) FROM t GROUP BY a"
+    blob = dump_query_ast(parse(sql), sql, "secret")
+    assert blob.startswith(PARSER_VERSION)
+    assert is_query_ast_current(blob, sql, "secret")
+    assert load_query_ast(blob, sql, "secret").compare(parse(sql))
+
+    assert not is_query_ast_current(blob, "SELECT a FROM t", "secret")
+    assert load_query_ast(blob, "SELECT a FROM t", "secret") is None
+    assert load_query_ast(None, sql, "secret") is None
+
+    # blobs that weren't signed with the secret are never unpickled
+    loads = mocker.patch("dj.sql.parsing.backends.antlr4.pickle.loads")
+    assert not is_query_ast_current(blob, sql, "other secret")
+    assert load_query_ast(blob, sql, "other secret") is None
+    assert load_query_ast(blob[:-4], sql, "secret") is None
+    assert load_query_ast(blob[:-4] + b"evil", sql, "secret") is None
+    loads.assert_not_called()
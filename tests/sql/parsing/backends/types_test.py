@@ -1,7 +1,17 @@
 """
 Tests for types
 """
+import pytest
+
 import dj.sql.parsing.types as ct
+from dj.sql.parsing.backends.antlr4 import parse_rule
+from dj.sql.parsing.backends.exceptions import DJParseException
+from dj.sql.parsing.type_lattice import promote_types
+from dj.sql.parsing.type_parser import (
+    TypeStringParser,
+    UnsupportedTypeString,
+    parse_column_type,
+)
 
 
 def test_types_compatible():
@@ -23,3 +33,97 @@ def test_types_compatible():
     assert not ct.StringType().is_compatible(ct.BinaryType())
     assert not ct.StringType().is_compatible(ct.BigIntType())
     assert not ct.StringType().is_compatible(ct.DateType())
+
+
+def test_types_interned():
+    """
+    Checks that constructing a type returns its canonical instance
+    """
+    from dj.sql.parsing.ast import Name  # pylint: disable=import-outside-toplevel
+
+    assert ct.IntegerType() is ct.IntegerType()
+    assert ct.LongType() is ct.BigIntType()
+    assert str(ct.LongType()) == "bigint"
+    assert ct.DecimalType(40, 2) is ct.DecimalType(38, 2)
+    assert str(ct.DecimalType(40, 2)) == "decimal(38, 2)"
+    assert ct.MapType(ct.StringType(), ct.ListType(ct.DateType())) is ct.MapType(
+        ct.StringType(),
+        ct.ListType(ct.DateType()),
+    )
+    assert ct.StructType(
+        ct.NestedField(Name("a"), ct.IntegerType()),
+    ) is parse_column_type("struct<a: int>")
+    assert ct.NestedField(Name("a", quote_style="`"), ct.IntegerType()) != (
+        ct.NestedField(Name("a"), ct.IntegerType())
+    )
+    assert ct.StringType() != ct.VarcharType()
+    assert ct.StringType() != "string"
+    assert len({ct.ListType(ct.IntegerType()), parse_column_type("array<int>")}) == 1
+
+    # compatibility is cached for each pair of type classes
+    assert ct.FloatType().is_compatible(ct.DoubleType())
+    assert ct.TYPE_COMPATIBILITY[ct.FloatType, ct.DoubleType]
+
+
+def test_type_lattice():
+    """
+    Checks the precomputed compatibility and numeric promotion of types
+    """
+    assert ct.TYPE_COMPATIBILITY[ct.FloatType, ct.DoubleType]
+    assert not ct.TYPE_COMPATIBILITY[ct.StringType, ct.IntegerType]
+    assert promote_types(ct.IntegerType(), ct.BigIntType()) is ct.BigIntType()
+    assert promote_types(ct.DoubleType(), ct.IntegerType()) is ct.DoubleType()
+    assert promote_types(ct.FloatType(), ct.BigIntType()) is ct.FloatType()
+    assert promote_types(ct.StringType(), ct.IntegerType()) is None
+
+    # nested types fall back to the class hierarchy
+    list_type = ct.ListType(ct.IntegerType())
+    assert list_type.is_compatible(ct.ListType(ct.StringType()))
+    assert not list_type.is_compatible(ct.MapType(ct.StringType(), ct.IntegerType()))
+    assert promote_types(list_type, ct.ListType(ct.StringType())) is list_type
+    assert promote_types(list_type, ct.IntegerType()) is None
+
+
+@pytest.mark.parametrize(
+    "type_string",
+    [
+        "int",
+        "BIGINT",
+        "long",
+        "decimal(10, 2)",
+        "decimal(38,3)",
+        "fixed(8)",
+        "array<string>",
+        "map<string, array<decimal(10, 2)>>",
+        "struct<a: int, `b c`: string NOT NULL>",
+        "struct<a int>",
+        "struct<>",
+        "array<struct<x: map<string,double>>>",
+    ],
+)
+def test_parse_column_type(type_string):
+    """
+    Checks that the fast type string parser matches the ANTLR parser and interns results
+    """
+    column_type = parse_column_type(type_string)
+    assert column_type is parse_rule(type_string, "dataType")
+    assert column_type is parse_column_type(type_string)
+    assert ct.ColumnType.validate(column_type) is column_type
+    assert ct.ColumnType.validate(str(column_type)) is column_type
+
+
+def test_parse_column_type_fallback():
+    """
+    Checks that type strings the fast parser doesn't handle go through ANTLR
+    """
+    assert parse_column_type("interval day to second") == ct.DayTimeIntervalType(
+        "DAY",
+        "SECOND",
+    )
+    with pytest.raises(UnsupportedTypeString):
+        TypeStringParser("interval day").parse()
+    with pytest.raises(UnsupportedTypeString):
+        TypeStringParser("map<int>").parse()
+    with pytest.raises(DJParseException) as exc_info:
+        parse_column_type("varchar(25)")
+    assert "DJ does not recognize the type `varchar(25)`" in str(exc_info.value)
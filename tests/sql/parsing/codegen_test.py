@@ -0,0 +1,149 @@
+"""
+Tests for ``dj.sql.parsing.codegen``.
+"""
+
+import pytest
+
+from dj.models.engine import Dialect
+from dj.sql.parsing.backends.antlr4 import parse
+from dj.sql.parsing.codegen import SQLLayout, SQLWriter, render
+from dj.sql.parsing.types import (
+    DecimalType,
+    IntegerType,
+    ListType,
+    MapType,
+    StringType,
+    TimestamptzType,
+)
+
+QUERY = """
+WITH c AS (SELECT a, b FROM t WHERE a > 1)
+SELECT DISTINCT
+  c.a,
+  `Weird Col`,
+  COUNT(DISTINCT c.b) OVER (PARTITION BY c.a ORDER BY c.b) AS n,
+  CASE WHEN a = 1 THEN 'x' ELSE 'y' END AS k,
+  CAST(b AS INT) AS b2
+FROM c
+LEFT JOIN (SELECT a FROM u) u ON c.a = u.a
+WHERE a IN (1, 2) AND b IS NOT NULL
+GROUP BY c.a
+HAVING COUNT(*) > 1
+ORDER BY c.a DESC
+LIMIT 10
+"""
+
+
+@pytest.mark.parametrize("layout", list(SQLLayout))
+def test_render_layouts(layout: SQLLayout) -> None:
+    """
+    Test that every layout renders the same query.
+    """
+    query = parse(QUERY)
+    sql = render(query, layout=layout)
+    assert parse(sql) == query
+    assert sql == sql.strip()
+
+
+def test_render_default_layout() -> None:
+    """
+    Test that the default layout is the one of ``str``.
+    """
+    query = parse(QUERY)
+    assert render(query) == str(query)
+    assert str(parse("SELECT a FROM t")) == "SELECT  a \n FROM t\n"
+
+
+def test_render_compact_layout() -> None:
+    """
+    Test rendering a query on a single line.
+    """
+    sql = render(parse(QUERY), layout=SQLLayout.COMPACT)
+    assert sql == (
+        "WITH c AS (SELECT a, b FROM t WHERE a > 1) SELECT DISTINCT c.a, `Weird Col`, "
+        "COUNT(DISTINCT c.b) OVER (PARTITION BY c.a ORDER BY c.b) AS n, "
+        "CASE WHEN a = 1 THEN 'x' ELSE 'y' END AS k, CAST(b AS INT) AS b2 FROM c "
+        "LEFT JOIN (SELECT a FROM u) u ON c.a = u.a "
+        "WHERE a IN (1, 2) AND b IS NOT NULL GROUP BY c.a HAVING COUNT(*) > 1 "
+        "ORDER BY c.a DESC LIMIT 10"
+    )
+
+
+def test_render_pretty_layout() -> None:
+    """
+    Test rendering a query with a clause per line.
+    """
+    sql = render(parse(QUERY), layout=SQLLayout.PRETTY)
+    assert sql == (
+        "WITH\n"
+        "    c AS (\n"
+        "        SELECT\n"
+        "            a,\n"
+        "            b\n"
+        "        FROM t\n"
+        "        WHERE a > 1\n"
+        "    )\n"
+        "SELECT DISTINCT\n"
+        "    c.a,\n"
+        "    `Weird Col`,\n"
+        "    COUNT(DISTINCT c.b) OVER (PARTITION BY c.a ORDER BY c.b) AS n,\n"
+        "    CASE\n"
+        "        WHEN a = 1 THEN 'x'\n"
+        "        ELSE 'y'\n"
+        "    END AS k,\n"
+        "    CAST(b AS INT) AS b2\n"
+        "FROM c\n"
+        "    LEFT JOIN (\n"
+        "        SELECT\n"
+        "            a\n"
+        "        FROM u\n"
+        "    ) u ON c.a = u.a\n"
+        "WHERE a IN (1, 2) AND b IS NOT NULL\n"
+        "GROUP BY c.a\n"
+        "HAVING COUNT(*) > 1\n"
+        "ORDER BY c.a DESC\n"
+        "LIMIT 10"
+    )
+
+
+def test_render_dialects() -> None:
+    """
+    Test quoting identifiers and naming types the way each dialect does.
+    """
+    query = parse("SELECT `a b`, db.tbl.`c`, CAST(d AS INT) AS e FROM t")
+    assert render(query, dialect=Dialect.SPARK, layout=SQLLayout.COMPACT) == (
+        "SELECT `a b`, db.tbl.`c`, CAST(d AS INT) AS e FROM t"
+    )
+    assert render(query, dialect=Dialect.TRINO, layout=SQLLayout.COMPACT) == (
+        'SELECT "a b", db.tbl."c", CAST(d AS INTEGER) AS e FROM t'
+    )
+    assert render(query, dialect=Dialect.DRUID, layout=SQLLayout.COMPACT) == (
+        'SELECT "a b", db.tbl."c", CAST(d AS BIGINT) AS e FROM t'
+    )
+
+
+def test_type_names() -> None:
+    """
+    Test the names of types in each dialect.
+    """
+    trino = SQLWriter(Dialect.TRINO)
+    assert trino.type_name(StringType()) == "VARCHAR"
+    assert trino.type_name(ListType(IntegerType())) == "ARRAY(INTEGER)"
+    assert trino.type_name(MapType(StringType(), TimestamptzType())) == (
+        "MAP(VARCHAR, TIMESTAMP WITH TIME ZONE)"
+    )
+    assert trino.type_name(DecimalType(10, 2)) == "DECIMAL(10, 2)"
+    druid = SQLWriter(Dialect.DRUID)
+    assert druid.type_name(StringType()) == "VARCHAR"
+    assert druid.type_name(DecimalType(10, 2)) == "DECIMAL"
+    assert SQLWriter().type_name(MapType(StringType(), IntegerType())) == (
+        "MAP<STRING, INT>"
+    )
+
+
+def test_render_sort_by_with_limit() -> None:
+    """
+    Test that a SORT BY clause is separated from the limit.
+    """
+    sql = render(parse("SELECT a FROM t SORT BY a LIMIT 1"))
+    assert "SORT BY a\nLIMIT 1" in sql
@@ -0,0 +1,406 @@
+"""
+testing the caches that AST nodes keep about their sub-ast and ancestors, and the
+methods built on them
+"""
+
+import pickle
+from typing import Dict
+
+from sqlmodel import Session
+
+from dj.errors import DJException
+from dj.sql.parsing import ast, types
+from dj.sql.parsing.backends.antlr4 import parse
+
+
+def test_slotted_nodes():
+    """
+    Test that nodes keep their attributes in slots rather than a ``__dict__``
+    """
+    query = parse(
+        "SELECT a.x, SUM(b.y) AS y, * FROM a JOIN b ON a.id = b.id "
+        "LATERAL VIEW EXPLODE(a.z) t AS z WHERE (a.x > 1) GROUP BY a.x",
+    )
+    nodes = list(query.flatten())
+    assert {type(node) for node in nodes} >= {
+        ast.Alias,
+        ast.BinaryOp,
+        ast.Column,
+        ast.Function,
+        ast.FunctionTable,
+        ast.Select,
+        ast.Wildcard,
+    }
+    assert not [node for node in nodes if hasattr(node, "__dict__")]
+
+    # defaults of fields that are not initialized by ``__init__``
+    wildcard = ast.Wildcard()
+    assert wildcard.name.name == "*"
+    assert wildcard.name is not ast.Wildcard().name
+    assert wildcard.parenthesized is None
+    assert wildcard.parent is None
+    assert query.select.where.parenthesized  # type: ignore
+    assert query.select.lateral_views and not query.select.from_.laterals  # type: ignore
+
+    # zero-argument ``super()`` still works in the rebuilt classes
+    func = ast.Function(ast.Name("SUM"), args=[ast.Column(ast.Name("x"))])
+    assert isinstance(func, ast.Function)
+    assert func.args[0].parent is func
+    assert str(query.copy()) == str(query)
+
+
+def test_find_all_type_index():
+    """
+    Test that ``find_all`` uses the subtree type index and keeps it up to date
+    """
+    query = parse(
+        "SELECT a.x, SUM(b.y) AS y FROM a JOIN (SELECT y, id FROM b) b ON a.id = b.id "
+        "WHERE a.x > 1 GROUP BY a.x",
+    )
+
+    def expected(node, node_type):
+        return list(node.filter(lambda n: isinstance(n, node_type)))
+
+    for node_type in (ast.Table, ast.Column, ast.TableExpression, ast.Expression):
+        assert list(query.find_all(node_type)) == expected(query, node_type)
+    where = query.select.where
+    assert ast.Table not in where.subtree_types  # type: ignore
+    assert ast.BinaryOp in query.subtree_types
+    assert not list(where.find_all(ast.Table))  # type: ignore
+
+    # setting a child with `.` syntax
+    where.right = parse("SELECT MAX(x) FROM c").select  # type: ignore
+    assert ast.Table in query.subtree_types
+    tables = [str(table) for table in query.find_all(ast.Table)]
+    assert tables == ["a", "b", "c"]
+
+    # swapping and replacing nodes
+    table_c = next(where.find_all(ast.Table))  # type: ignore
+    table_c.swap(ast.Table(ast.Name("d")))
+    assert [str(table) for table in query.find_all(ast.Table)] == ["a", "b", "d"]
+    query.replace(
+        next(query.find_all(ast.Select)).where,
+        ast.Boolean(True),
+        copy=False,
+    )
+    assert [str(table) for table in query.find_all(ast.Table)] == ["a", "b"]
+    assert list(query.find_all(ast.Boolean))
+    for node_type in (ast.Table, ast.Column, ast.Boolean):
+        assert list(query.find_all(node_type)) == expected(query, node_type)
+
+
+def test_select_scope(session: Session):
+    """
+    Test resolving columns through the tables in scope of each select
+    """
+    query = parse(
+        "SELECT t.x, y FROM (SELECT 1 AS x, 2 AS id) t "
+        "CROSS JOIN (SELECT 3 AS y) "
+        "WHERE t.x IN (SELECT u.z FROM (SELECT 1 AS z, 2 AS id) u WHERE u.id = t.id) "
+        "ORDER BY x",
+    )
+    scope = query.select.scope  # type: ignore
+    outer_t, outer_unaliased = scope.tables
+    assert scope.tables_by_name == {"t": [outer_t]}
+    subquery = query.select.where.source  # type: ignore
+    (inner_u,) = subquery.scope.tables
+    assert subquery.scope.tables_by_name == {"u": [inner_u]}
+    assert subquery.enclosing_select is query.select
+    assert query.select.enclosing_select is None  # type: ignore
+    assert outer_t.select.enclosing_select is None
+
+    exc = DJException()
+    query.compile(ast.CompileContext(session=session, exception=exc))
+    assert not exc.errors
+    columns = [
+        (column.identifier(False), column.table)
+        for column in query.find_all(ast.Column)
+        if ast.get_nearest_select(column) in (query.select, subquery)
+    ]
+    assert columns == [
+        ("t.x", outer_t),
+        ("y", outer_unaliased),
+        ("t.x", outer_t),
+        ("u.z", inner_u),
+        ("u.id", inner_u),
+        ("t.id", outer_t),  # correlated with the outer select
+        ("x", outer_t),  # ORDER BY
+    ]
+
+    # the scope is rebuilt when the select changes
+    outer_t.set_alias(ast.Name("v"))
+    assert query.select.scope is not scope  # type: ignore
+    assert query.select.scope.tables_by_name == {"v": [outer_t]}  # type: ignore
+
+
+def test_cached_structural_hash():
+    """
+    Test that subtree hashes are cached, reset on changes and used by ``compare``
+    """
+    query = parse("SELECT a + 1 AS b FROM t WHERE c > 2")
+    same = parse("SELECT a + 1 AS b FROM t WHERE c > 2")
+    other = parse("SELECT a + 1 AS b FROM t WHERE c > 3")
+    assert hash(query) == hash(same) != hash(other)
+    assert query.compare(same) and not query.compare(other)
+    where = query.select.where
+    assert where._hash is not None  # pylint: disable=protected-access
+
+    # changing a descendant resets the hashes of its ancestors only
+    number = where.right  # type: ignore
+    number.value = 3
+    assert where._hash is None  # pylint: disable=protected-access
+    assert query._hash is None  # pylint: disable=protected-access
+    assert query.select.projection[0]._hash is not None  # pylint: disable=W0212
+    assert hash(query) == hash(other)
+    assert query.compare(other)
+
+    # hashes of strings depend on the process, so they aren't pickled
+    assert pickle.loads(pickle.dumps(query))._hash is None  # pylint: disable=W0212
+
+
+def test_similarity_score():
+    """
+    Test scoring the similarity of two trees by their top level equal nodes
+    """
+    query = parse("SELECT a, a + 1 FROM t")
+    assert query.similarity_score(parse("SELECT a, a + 1 FROM t")) == 1.0
+    assert query.similarity_score(parse("SELECT b FROM t WHERE b > 1")) == 0.625
+    assert parse("SELECT b FROM t WHERE b > 1").similarity_score(query) == 0.625
+    assert (
+        parse("SELECT 1 as num").similarity_score(
+            parse("SELECT 2 as num"),
+        )
+        == 5 / 7
+    )
+    assert (
+        parse("SELECT 1 as num").top_level_key()
+        == parse("SELECT 2 as num").top_level_key()
+    )
+    assert ast.Number(1).top_level_key() != ast.Number(2).top_level_key()
+
+
+def test_replace_all():
+    """
+    Test replacing several nodes in one traversal
+    """
+    query = parse("SELECT x.a, y.b FROM t x JOIN t y ON x.id = y.id")
+    first, second = query.find_all(ast.Table)
+    first_replacement = ast.Table(ast.Name("u"))
+    second_replacement = ast.Table(ast.Name("v"))
+    query.replace_all(
+        [(first, first_replacement), (second, second_replacement)],
+        copy=False,
+    )
+    assert [table.identifier() for table in query.find_all(ast.Table)] == ["u", "v"]
+    assert first_replacement.parent is not None
+    assert first.parent is None
+
+    # shared replacements are copied by default
+    query = parse("SELECT a FROM t WHERE a IN (SELECT a FROM t)")
+    replacement = ast.Table(ast.Name("u"))
+    query.replace_all([(table, replacement) for table in query.find_all(ast.Table)])
+    assert [table.identifier() for table in query.find_all(ast.Table)] == ["u", "u"]
+    assert replacement.parent is None
+
+
+def test_copy(session: Session):
+    """
+    Test copying a sub-ast without the rest of the tree
+    """
+    query = parse("SELECT t.x, COUNT(y) FROM (SELECT 1 AS x, 2 AS y) t GROUP BY t.x")
+    query.compile(
+        ast.CompileContext(session=session, exception=DJException()),
+    )
+    scope = query.select.scope  # type: ignore
+    copied = query.copy()
+    assert copied is not query
+    assert copied.compare(query)
+    assert str(copied) == str(query)
+
+    # references within the sub-ast point to the copies
+    column = next(copied.find_all(ast.Column))
+    assert column.table is copied.select.from_.relations[0].primary  # type: ignore
+    assert all(
+        child.parent is node for node in copied.flatten() for child in node.children
+    )
+    assert not any(
+        node is other for node in copied.flatten() for other in query.flatten()
+    )
+    assert copied.select.scope is not scope  # type: ignore
+
+    # changing the copy doesn't change the original
+    copied.select.group_by = []  # type: ignore
+    assert query.select.group_by  # type: ignore
+
+    # the copy is detached, while nodes outside of the sub-ast are shared
+    projection = query.select.projection[1]  # type: ignore
+    copied_projection = projection.copy()
+    assert copied_projection.parent is None
+    assert copied_projection.parent_key is None
+    assert copied_projection.depth == 0
+    assert copied_projection.compare(projection)
+    assert copied_projection.type == projection.type
+
+
+def reachable_nodes(root: ast.Node) -> Dict[int, ast.Node]:
+    """
+    The nodes that can be reached from a node through any of its slots, including
+    the private ones holding compilation state
+    """
+    nodes: Dict[int, ast.Node] = {}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if id(node) in nodes:
+            continue
+        nodes[id(node)] = node
+        for key in ast.slot_names(type(node)):
+            for value in ast.flatten([getattr(node, key, None)]):
+                if ast.is_node_type(type(value)):
+                    stack.append(value)
+    return nodes
+
+
+def test_copy_compiled(construction_session: Session):
+    """
+    Test that no node of the copy of a compiled AST refers to the original tree,
+    including the columns that compiling tables creates
+    """
+    query = parse(
+        "SELECT u.id, COUNT(*) FROM (SELECT id, age FROM basic.source.users) u "
+        "GROUP BY u.id",
+    )
+    exc = DJException()
+    query.compile(ast.CompileContext(session=construction_session, exception=exc))
+    assert not exc.errors
+    print(
+        "ORIG",
+        query.is_compiled(),
+        [type(n).__name__ for n in query.flatten() if not n.is_compiled()],
+    )
+    copied = query.copy()
+    print("COPY", [type(n).__name__ for n in copied.flatten() if not n.is_compiled()])
+    assert not reachable_nodes(query).keys() & reachable_nodes(copied).keys()
+
+    table = next(copied.find_all(ast.Table))
+    assert table.columns
+    assert all(column.table is table for column in table.columns)
+    assert table.is_compiled()
+    assert copied.is_compiled() == query.is_compiled()
+    assert str(copied) == str(query)
+
+
+def test_swap_on_copy():
+    """
+    Test that swapping a node in a copy doesn't change the original
+    """
+    query = parse("SELECT a FROM t WHERE a > 1")
+    original = str(query)
+    copied = query.select.where.copy()  # type: ignore
+    assert copied.swap(ast.Boolean(True)) is copied
+    assert query.select.where.parent is query.select  # type: ignore
+    assert str(query.select.where) == "a > 1"  # type: ignore
+    assert str(query) == original
+
+
+def test_uncompiled_descendants(session: Session):
+    """
+    Test counting the uncompiled nodes of a sub-ast
+    """
+    query = parse("SELECT a + 1 AS x, b FROM (SELECT 1 AS a, 2 AS b) t")
+    projection = query.select.projection  # type: ignore
+    assert projection[0].uncompiled_descendants == 3  # the sum, a, 1
+    assert not query.is_compiled()
+
+    query.compile(ast.CompileContext(session=session, exception=DJException()))
+    assert projection[0].uncompiled_descendants == 0
+    assert all(column.is_compiled() for column in query.find_all(ast.Column))
+    assert query.uncompiled_descendants == sum(
+        1 for node in query.flatten() if node is not query and not node.is_compiled()
+    )
+
+    # the counts are updated when a descendant is compiled
+    column = ast.Column(ast.Name("c"))
+    projection[0].child.right = column
+    assert projection[0].uncompiled_descendants == 1
+    column.add_table(projection[1].table)
+    column.add_type(types.IntegerType())
+    assert projection[0].uncompiled_descendants == 0
+
+
+def test_inferred_types(session: Session):
+    """
+    Test caching the types inferred for compiled expressions
+    """
+    query = parse("SELECT a + 1 AS x, b FROM (SELECT 1 AS a, 2 AS b) t")
+    projection = query.select.projection  # type: ignore
+    query.compile(ast.CompileContext(session=session, exception=DJException()))
+    binary_op = projection[0].child
+
+    with ast.count_type_inferences() as inferences:
+        assert binary_op.type == types.IntegerType()
+        assert binary_op.type == types.IntegerType()
+    assert inferences.count == 1
+
+    # the type is inferred again when a child is replaced
+    binary_op.right = ast.Number(1.5)
+    with ast.count_type_inferences() as inferences:
+        assert binary_op.type == types.FloatType()
+    assert inferences.count == 1
+
+    # or when the compilation state of a descendant changes, and it's only cached
+    # once the sub-ast is compiled again
+    column = ast.Column(ast.Name("c"))
+    binary_op.right = column
+    column.add_type(types.BigIntType())
+    with ast.count_type_inferences() as inferences:
+        assert binary_op.type == types.BigIntType()
+        column.add_table(projection[1].table)
+        assert binary_op.type == types.BigIntType()
+        column.add_type(types.DoubleType())
+        assert binary_op.type == types.DoubleType()
+        assert binary_op.type == types.DoubleType()
+    assert inferences.count == 3
+
+
+def test_ancestry():
+    """
+    Test the cached depth and nearest ancestors of nodes
+    """
+
+    def ancestors(node):
+        while node.parent is not None:
+            node = node.parent
+            yield node
+
+    query = parse("SELECT a FROM (SELECT b FROM t WHERE b IN (SELECT c FROM u)) s")
+    subquery = query.select.from_.relations[0].primary  # type: ignore
+    table_u = next(
+        table for table in query.find_all(ast.Table) if table.name.name == "u"
+    )
+    assert table_u.depth == len(list(ancestors(table_u)))
+    for node_type in (ast.Select, ast.Query, ast.From, ast.In, ast.Relation):
+        assert table_u.get_nearest_parent_of_type(node_type) is next(
+            node for node in ancestors(table_u) if isinstance(node, node_type)
+        )
+    assert table_u.in_from_or_lateral()
+    assert ast.get_nearest_select(subquery.select.where.expr) is subquery.select
+
+    # the ancestry is refreshed when a subtree is moved
+    where = subquery.select.where
+    subquery.select.where = None
+    query.select.where = where
+    assert table_u.depth == len(list(ancestors(table_u)))
+    assert table_u.get_nearest_parent_of_type(ast.In) is where
+    select_u = table_u.get_nearest_parent_of_type(ast.Select)
+    assert select_u.get_nearest_parent_of_type(ast.Select) is query.select
+    assert ast.get_nearest_select(where.expr) is query.select
+
+    # copies are the roots of their own trees
+    copied = query.select.copy()
+    copied_u = next(
+        table for table in copied.find_all(ast.Table) if table.name.name == "u"
+    )
+    assert copied_u.depth == table_u.depth - query.select.depth
+    assert copied.parent is None and copied.depth == 0
+    assert copied_u.get_nearest_parent_of_type(ast.In) is copied.where
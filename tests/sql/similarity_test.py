@@ -0,0 +1,60 @@
+"""
+Tests for ``dj.sql.similarity``.
+"""
+
+from dj.sql.parsing.backends.antlr4 import parse
+from dj.sql.similarity import (
+    SIGNATURE_SIZE,
+    estimate_similarity,
+    fingerprint_key,
+    query_signature,
+    subtree_fingerprints,
+    unpack_signature,
+)
+
+
+def test_subtree_fingerprints() -> None:
+    """
+    Test that equal subtrees have equal fingerprints.
+    """
+    fingerprints = subtree_fingerprints(parse("SELECT a + 1 AS x FROM t"))
+    other = subtree_fingerprints(parse("SELECT a + 1 AS y FROM u"))
+    shared = fingerprints & other
+    assert shared
+    assert shared < fingerprints
+    assert subtree_fingerprints(parse("SELECT a + 1 AS x FROM t")) == fingerprints
+    assert subtree_fingerprints(parse("SELECT a + 1.0 AS x FROM t")) != fingerprints
+
+
+def test_query_signature() -> None:
+    """
+    Test estimating the similarity of queries from their signatures.
+    """
+    small = unpack_signature(query_signature(parse("SELECT 1 AS num")))
+    assert estimate_similarity(small, small) == 1.0
+    assert estimate_similarity(small, set()) == 0.0
+    assert estimate_similarity(set(), set()) == 0.0
+
+    def wide_query(offset: int) -> str:
+        return "SELECT " + ", ".join(f"a{i} + {i + offset} AS c{i}" for i in range(200))
+
+    wide = parse(wide_query(0))
+    signature = unpack_signature(query_signature(wide))
+    assert len(signature) == SIGNATURE_SIZE
+    other = unpack_signature(query_signature(parse(wide_query(100))))
+    fingerprints = subtree_fingerprints(wide)
+    other_fingerprints = subtree_fingerprints(parse(wide_query(100)))
+    jaccard = len(fingerprints & other_fingerprints) / len(
+        fingerprints | other_fingerprints,
+    )
+    assert abs(estimate_similarity(signature, other) - jaccard) < 0.15
+
+
+def test_fingerprint_key() -> None:
+    """
+    Test that fingerprints are mapped one to one onto signed 64-bit integers.
+    """
+    assert fingerprint_key(0) == 0
+    assert fingerprint_key((1 << 63) - 1) == (1 << 63) - 1
+    assert fingerprint_key(1 << 63) == -(1 << 63)
+    assert fingerprint_key((1 << 64) - 1) == -1
@@ -3,21 +3,27 @@ Tests for ``dj.utils``.
 """
 
 import logging
+from datetime import timedelta
 
 import pytest
 from pytest_mock import MockerFixture
+from sqlalchemy import select
 from sqlalchemy.engine.url import make_url
 from yarl import URL
 
 from dj.config import Settings
 from dj.errors import DJException
 from dj.utils import (
+    TimedQueuePool,
     Version,
     get_engine,
+    get_engine_kwargs,
     get_issue_url,
+    get_pool_statistics,
     get_query_service_client,
     get_session,
     get_settings,
+    pool_statistics,
     setup_logging,
 )
 
@@ -83,9 +89,67 @@ def test_get_engine(mocker: MockerFixture, settings: Settings) -> None:
     Test ``get_engine``.
     """
     mocker.patch("dj.utils.get_settings", return_value=settings)
+    get_engine.cache_clear()
     engine = get_engine()
     assert engine.url == make_url("sqlite://")
 
+    # the engine is only created once per process
+    assert get_engine() is engine
+    get_engine.cache_clear()
+
+
+def test_get_engine_kwargs(settings: Settings) -> None:
+    """
+    Test ``get_engine_kwargs``.
+    """
+    assert get_engine_kwargs(settings) == {
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+
+    settings.index = "postgresql://dj:dj@postgres:5432/dj"
+    settings.index_pool_recycle = None
+    settings.index_statement_timeout = timedelta(seconds=5)
+    assert get_engine_kwargs(settings) == {
+        "pool_pre_ping": True,
+        "poolclass": TimedQueuePool,
+        "pool_size": 20,
+        "max_overflow": 10,
+        "pool_timeout": 30.0,
+        "connect_args": {"options": "-c statement_timeout=5000"},
+    }
+
+
+def test_get_pool_statistics(mocker: MockerFixture, settings: Settings) -> None:
+    """
+    Test ``get_pool_statistics``.
+    """
+    mocker.patch("dj.utils.get_settings", return_value=settings)
+    get_engine.cache_clear()
+    pool_statistics.reset()
+
+    with get_engine().connect() as connection:
+        connection.execute(select(1))
+    stats = get_pool_statistics()
+    assert stats["checkouts"] == 1
+    assert stats["checkins"] == 1
+    assert "size" not in stats
+
+    settings.index = "sqlite:///:memory:"
+    mocker.patch(
+        "dj.utils.get_engine_kwargs",
+        return_value={"poolclass": TimedQueuePool, "pool_size": 2},
+    )
+    get_engine.cache_clear()
+    with get_engine().connect() as connection:
+        connection.execute(select(1))
+        stats = get_pool_statistics()
+    assert stats["pool"] == "TimedQueuePool"
+    assert stats["checked_out"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["wait_time"] >= 0
+    get_engine.cache_clear()
+
 
 def test_get_query_service_client(mocker: MockerFixture, settings: Settings) -> None:
     """